@@ -1,10 +1,18 @@
 import os
-import subprocess
+import time
 import base64
+import numpy as np
+import pandas as pd
 import streamlit as st
-import io, zipfile
+import json
+import hashlib
+import zipfile
 from datetime import datetime
 import re
+import jobs
+from downloaders import file_catalog
+from bank_etl_v3.etl.excel_out import write_xlsx
+from arrangers.arrange import ARRANGERS, run_arrangers, plan_lines
 
 # ---- CONFIG ----
 st.set_page_config(
@@ -28,14 +36,6 @@ BANKS = [
     ("Bank of Baku", "bank_of_baku"),
     ("CBAR", "cbar"),
 ]
-ARRANGERS = [
-    ("pasha_bank", "arrangers/pasha_arrange.py"),
-    ("kapital_bank", "arrangers/kapital_arrange.py"),
-    ("yelobank", "arrangers/yelobank_arrange.py"),
-    ("access_bank", "arrangers/accessbank_arrange.py"),
-    ("xalq_bank", "arrangers/xalq_arrange.py"),
-    ("abb_bank", "arrangers/abb_arrange.py"),
-]
 SCRAPERS = [
     "downloaders/abb_scrap.py",
     "downloaders/kapital_scrap.py",
@@ -50,20 +50,78 @@ SCRAPERS = [
     "downloaders/cbar_scrap.py",
 ]
 
-def zip_processed_data():
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zipf:
-        for root, _, files in os.walk("processed_data"):
-            for file in files:
-                fpath = os.path.join(root, file)
-                arcname = os.path.relpath(fpath, "processed_data")
-                zipf.write(fpath, arcname)
-    zip_buffer.seek(0)
-    return zip_buffer
-
-def all_banks_fully_arranged():
+# ---- EXPORT UTILS ----
+# The ZIP lives on disk next to a manifest {arcname: size, mtime_ns, md5}. A rebuild only
+# hashes files whose size/mtime moved; new files are appended, and a full repack happens
+# only when something was changed or deleted. Excels are already compressed, so entries are stored.
+EXPORT_SRC = "processed_data"
+EXPORT_DIR = "exports"
+EXPORT_ZIP = os.path.join(EXPORT_DIR, "processed_data.zip")
+EXPORT_MANIFEST = EXPORT_ZIP + ".manifest.json"
+
+def _file_md5(path, chunk=1 << 20):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _load_export_manifest():
+    if not os.path.exists(EXPORT_ZIP):
+        return {}
+    try:
+        with open(EXPORT_MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+        with zipfile.ZipFile(EXPORT_ZIP) as z:
+            if set(z.namelist()) != set(manifest):   # interrupted append -> start over
+                return {}
+        return manifest
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return {}
+
+def build_export_zip(src=EXPORT_SRC):
+    """Bring exports/processed_data.zip up to date with src. Returns the number of files written."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    old = _load_export_manifest()
+    new = {}
+    for root, _, files in os.walk(src):
+        for file in files:
+            if file.endswith((".part", ".part.json")):   # downloads still in progress
+                continue
+            fpath = os.path.join(root, file)
+            arcname = os.path.relpath(fpath, src).replace(os.sep, "/")
+            stat = os.stat(fpath)
+            prev = old.get(arcname)
+            if prev and prev["size"] == stat.st_size and prev["mtime_ns"] == stat.st_mtime_ns:
+                new[arcname] = prev
+            else:
+                new[arcname] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": _file_md5(fpath)}
+
+    added = [a for a in new if a not in old]
+    changed = [a for a in new if a in old and old[a]["md5"] != new[a]["md5"]]
+    removed = [a for a in old if a not in new]
+    if changed or removed or not old:
+        tmp = EXPORT_ZIP + ".part"
+        with zipfile.ZipFile(tmp, "w") as zipf:
+            for arcname in sorted(new):
+                zipf.write(os.path.join(src, arcname), arcname)
+        os.replace(tmp, EXPORT_ZIP)
+        written = len(new)
+    else:
+        with zipfile.ZipFile(EXPORT_ZIP, "a") as zipf:
+            for arcname in sorted(added):
+                zipf.write(os.path.join(src, arcname), arcname)
+        written = len(added)
+
+    tmp = EXPORT_MANIFEST + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(new, f)
+    os.replace(tmp, EXPORT_MANIFEST)
+    return written
+
+def all_banks_fully_arranged(status):
     for _, folder in BANKS:
-        if needs_acrobat(folder) or needs_arrange(folder) or not is_fully_arranged(folder):
+        if needs_acrobat(status, folder) or needs_arrange(status, folder) or not is_fully_arranged(status, folder):
             return False
     return True
 
@@ -76,7 +134,9 @@ def load_logo_b64(path):
 # logo_b64 = load_logo_b64("Pasha_Holding_logo.png")
 
 # ---- BANK LOGO UTILS ----
-def get_bank_logo_b64(folder_key):
+# Resolved and base64-encoded once per server process; every row and rerun reuses the data URI.
+@st.cache_resource(show_spinner=False)
+def bank_logo_uri(folder_key):
     if not os.path.exists("logos"):
         return None
     patterns = [
@@ -87,22 +147,27 @@ def get_bank_logo_b64(folder_key):
         f"{folder_key.replace('_', '')}.png",
         f"{folder_key.replace('_', '').capitalize()}.png"
     ]
-    for pattern in patterns:
-        path = os.path.join("logos", pattern)
+    candidates = [os.path.join("logos", p) for p in patterns]
+    candidates += [os.path.join("logos", f) for f in sorted(os.listdir("logos"))
+                   if folder_key.replace("_", "").lower() in f.lower() and f.lower().endswith(".png")]
+    for path in candidates:
         if os.path.exists(path):
             with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-    for fname in os.listdir("logos"):
-        if folder_key.replace("_", "").lower() in fname.lower() and fname.lower().endswith(".png"):
-            path = os.path.join("logos", fname)
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
+                return "data:image/png;base64," + base64.b64encode(f.read()).decode()
     return None
 
-def render_bank_row(badge_html, folder, name):
-    logo_b64 = get_bank_logo_b64(folder)
-    logo_html = f"<img src='data:image/png;base64,{logo_b64}' style='height:25px;vertical-align:middle;margin-right:10px;border-radius:5px;'>" if logo_b64 else ""
-    return f"{badge_html} {logo_html}<b>{name}</b>"
+def bank_name_html(folder, name):
+    logo_uri = bank_logo_uri(folder)
+    logo_html = (
+        f"<img src='{logo_uri}' "
+        "style='height:27px;width:auto;margin-right:10px;border-radius:5px;display:inline-block;'>"
+        if logo_uri else ""
+    )
+    return f"""
+            <div style="display:flex;align-items:center;min-height:54px;">
+                {logo_html}<b style="font-size:1.08em;display:inline-block;vertical-align:middle;">{name}</b>
+            </div>
+            """
 
 # ---- NEON DARK CSS ----
 st.markdown("""
@@ -235,98 +300,81 @@ with col1:
 st.markdown("<hr>", unsafe_allow_html=True)
 
 # ---- STATUS UTILS ----
-def has_any_data(bank_folder):
-    raw = os.path.join("raw_data", bank_folder)
-    processed = os.path.join("processed_data", bank_folder)
-    return (
-        (os.path.exists(raw) and any(os.scandir(raw)))
-        or (os.path.exists(processed) and any(os.scandir(processed)))
-    )
-
-def needs_acrobat(bank_folder):
-    raw = os.path.join("raw_data", bank_folder)
-    processed = os.path.join("processed_data", bank_folder)
-    if not os.path.exists(raw):
-        return []
-    periods_needed = []
-    for period in os.listdir(raw):
-        raw_p = os.path.join(raw, period)
-        processed_p = os.path.join(processed, period)
-        if os.path.isdir(raw_p):
-            pdfs = [f for f in os.listdir(raw_p) if f.lower().endswith('.pdf')]
-            has_excel = os.path.exists(processed_p) and any(f.lower().endswith(('.xlsx', '.xls')) for f in os.listdir(processed_p)) if os.path.exists(processed_p) else False
-            if pdfs and not has_excel:
-                periods_needed.append(period)
-    return periods_needed
-
-def needs_arrange(bank_folder):
-    raw = os.path.join("raw_data", bank_folder)
-    if not os.path.exists(raw):
-        return []
-    periods_needed = []
-    for period in os.listdir(raw):
-        raw_p = os.path.join(raw, period)
-        if os.path.isdir(raw_p):
-            excels = [f for f in os.listdir(raw_p) if f.lower().endswith(('.xlsx', '.xls'))]
-            if excels:
-                periods_needed.append(period)
-    return periods_needed
-
-def is_fully_arranged(bank_folder):
-    if needs_acrobat(bank_folder):
-        return False
-    if needs_arrange(bank_folder):
-        return False
-    processed = os.path.join("processed_data", bank_folder)
-    return os.path.exists(processed) and any(os.scandir(processed))
-
-def list_quarters_status(bank_folder):
-
-    # CBAR special handling: only display the latest available period (from filename)
-    if bank_folder.lower() == "cbar":
-        processed = os.path.join("processed_data", bank_folder)
-        if os.path.exists(processed):
-            files = [f for f in os.listdir(processed) if f.startswith("CBAR_") and f.endswith(".xlsx")]
-            if files:
-                # Sort by modified time, most recent first
-                files = sorted(files, key=lambda f: os.path.getmtime(os.path.join(processed, f)), reverse=True)
-                latest = files[0]
-                # Extract period (e.g., July_2024 → July 2024)
-                m = re.match(r"CBAR_(\w+_\d{4})\.xlsx", latest)
-                period = m.group(1).replace("_", " ") if m else "Latest"
-                return [(period, "ready")]
-        # If nothing found, show no quarters
-        return []
-    
-    raw = os.path.join("raw_data", bank_folder)
-    processed = os.path.join("processed_data", bank_folder)
-    # Get all unique period folders (union of both dirs)
-    period_set = set()
-    if os.path.exists(raw):
-        period_set.update([d for d in os.listdir(raw) if os.path.isdir(os.path.join(raw, d))])
-    if os.path.exists(processed):
-        period_set.update([d for d in os.listdir(processed) if os.path.isdir(os.path.join(processed, d))])
-    quarters = []
-    for period in sorted(period_set):
-        raw_p = os.path.join(raw, period)
-        processed_p = os.path.join(processed, period)
-        # PDF detection in raw, Excel detection in processed, fallback logic
-        pdfs = []
-        excels = []
-        if os.path.isdir(raw_p):
-            pdfs = [f for f in os.listdir(raw_p) if f.lower().endswith('.pdf')]
-        if os.path.isdir(processed_p):
-            excels = [f for f in os.listdir(processed_p) if f.lower().endswith(('.xlsx','.xls'))]
-        if pdfs and not excels:
-            quarters.append((period, "acrobat"))
-        elif not excels:
-            quarters.append((period, "arrange"))
-        else:
-            quarters.append((period, "ready"))
-    return quarters
-
-def render_quarters_expander(bank_folder, key):
-    quarters = list_quarters_status(bank_folder)
+# Every badge and quarter list reads one snapshot of raw_data/processed_data. It is rebuilt
+# only when a bank or period folder mtime changes (files added, removed or renamed), from the
+# file catalog (downloaders/file_catalog.py) after syncing just the folders that changed.
+# The snapshot is taken once per full run and passed to the fragments; files only change
+# through jobs, and a finished job reruns the whole page (render_jobs_panel).
+
+def status_signature():
+    sig = []
+    for root in ("raw_data", "processed_data"):
+        for _, folder in BANKS:
+            bank_dir = os.path.join(root, folder)
+            try:
+                sig.append((bank_dir, os.stat(bank_dir).st_mtime_ns))
+                with os.scandir(bank_dir) as it:
+                    sig.extend((e.path, e.stat().st_mtime_ns) for e in it if e.is_dir())
+            except (FileNotFoundError, NotADirectoryError):
+                sig.append((bank_dir, None))
+    return tuple(sig)
+
+def _bank_status(folder):
+    raw, raw_any, _ = file_catalog.folder_counts(folder, "raw_data")
+    proc, proc_any, proc_files = file_catalog.folder_counts(folder, "processed_data")
+    acrobat = [p for p in sorted(raw) if raw[p][0] and not proc.get(p, (0, 0))[1]]
+    arrange = [p for p in sorted(raw) if raw[p][1]]
+
+    if folder.lower() == "cbar":
+        # CBAR special handling: only display the latest available period (from filename)
+        files = sorted((f for f in proc_files if f[0].startswith("CBAR_") and f[0].endswith(".xlsx")),
+                       key=lambda f: f[1], reverse=True)
+        quarters = []
+        if files:
+            m = re.match(r"CBAR_(\w+_\d{4})\.xlsx", files[0][0])   # July_2024 -> July 2024
+            quarters = [(m.group(1).replace("_", " ") if m else "Latest", "ready")]
+    else:
+        quarters = []
+        for period in sorted(set(raw) | set(proc)):
+            has_pdf = raw.get(period, (0, 0))[0] > 0
+            has_xl = proc.get(period, (0, 0))[1] > 0
+            quarters.append((period, "acrobat" if has_pdf and not has_xl else "arrange" if not has_xl else "ready"))
+
+    return {
+        "acrobat": acrobat,
+        "arrange": arrange,
+        "has_data": raw_any or proc_any,
+        "fully_arranged": not acrobat and not arrange and proc_any,
+        "quarters": quarters,
+    }
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_status_snapshot(signature):
+    return {folder: _bank_status(folder) for _, folder in BANKS}
+
+def status_snapshot():
+    # sync outside the cache: it must run even when the signature is a cache hit (a cached
+    # function body only runs on a miss); it only re-lists folders whose mtime changed
+    file_catalog.sync([folder for _, folder in BANKS])
+    return _build_status_snapshot(status_signature())
+
+def has_any_data(status, bank_folder):
+    return status[bank_folder]["has_data"]
+
+def needs_acrobat(status, bank_folder):
+    return status[bank_folder]["acrobat"]
+
+def needs_arrange(status, bank_folder):
+    return status[bank_folder]["arrange"]
+
+def is_fully_arranged(status, bank_folder):
+    return status[bank_folder]["fully_arranged"]
+
+def list_quarters_status(status, bank_folder):
+    return status[bank_folder]["quarters"]
+
+def render_quarters_expander(status, bank_folder, key):
+    quarters = list_quarters_status(status, bank_folder)
     with st.expander("View Quarters", expanded=False):
         if quarters:
             badges = ""
@@ -344,218 +392,386 @@ def render_quarters_expander(bank_folder, key):
                 unsafe_allow_html=True
             )
 
-# ---- SCRAPE LOCK STATE ----
-if 'scraping_any' not in st.session_state:
-    st.session_state['scraping_any'] = False
+# ---- MASTER STORE ----
+# The ETL master is parsed once per file version (mtime/size) into a frame with categorical
+# key columns plus {value: row positions} indexes; every filter, page and pivot reads those.
+MASTER_CSV = os.path.join("bank_etl_v3", "output", "master.csv")
+MASTER_KEYS = ["Bank", "Period", "Indicator table", "Element"]
+MASTER_TEXT_COLS = MASTER_KEYS + ["Sub-element", "FS Line", "Item", "Currency", "Amount vs Share"]
+MASTER_NUM_COLS = ["AZN", "Total", "31-60 days", "61-90 days", "91+ days",
+                   "31-60 days_share%inLP", "61-90 days_share%inLP", "91+ days_share%inLP"]
+
+def master_version(path=MASTER_CSV):
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (path, info.st_mtime_ns, info.st_size)
+
+def _element_key(code):
+    return tuple(int(p) if p.isdigit() else 9999 for p in str(code).split("."))
+
+@st.cache_resource(show_spinner="Loading master…", max_entries=2)
+def load_master_store(version):
+    path = version[0]
+    df = pd.read_csv(path, dtype={c: str for c in MASTER_TEXT_COLS}, encoding="utf-8-sig")
+    for c in MASTER_NUM_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    order = {
+        "Bank": sorted(df["Bank"].dropna().unique()),
+        "Period": sorted(df["Period"].dropna().unique()),
+        "Indicator table": sorted(df["Indicator table"].dropna().unique()),
+        "Element": sorted(df["Element"].dropna().unique(), key=_element_key),
+    }
+    for c in MASTER_KEYS:
+        df[c] = pd.Categorical(df[c], categories=order[c], ordered=True)
+    df = df.sort_values(MASTER_KEYS, kind="stable").reset_index(drop=True)
+    index = {c: {k: np.asarray(v) for k, v in df.groupby(c, observed=True).indices.items()} for c in MASTER_KEYS}
+    measures = [c for c in MASTER_NUM_COLS if c in df.columns and df[c].notna().any()] or ["AZN"]
+    return {"df": df, "values": order, "index": index, "measures": measures}
+
+def query_master(store, filters):
+    """filters: {key column: selected values}; empty selections don't filter. -> sorted row positions"""
+    rows = None
+    for col, selected in filters.items():
+        if not selected:
+            continue
+        idx = store["index"][col]
+        hit = np.concatenate([idx[v] for v in selected if v in idx] or [np.empty(0, dtype=np.intp)])
+        rows = hit if rows is None else np.intersect1d(rows, hit, assume_unique=True)
+    return np.arange(len(store["df"])) if rows is None else np.sort(rows)
+
+# ---- MASTER EXPORT ----
+# Filtered slices are written once per (master version, banks, period range, format) under
+# exports/master/ and reused from there; only the newest MASTER_EXPORT_KEEP are kept. This is a
+# disk cache, not a streamed download: st.download_button holds the whole file in memory.
+MASTER_EXPORT_DIR = os.path.join(EXPORT_DIR, "master")
+MASTER_EXPORT_KEEP = 20
+MASTER_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/octet-stream"),
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
 
-def run_scraper(idx, name, folder):
-    st.session_state['scraping_any'] = True
-    badge_html = "<span class='status-badge arrange'>⏳ Scraping...</span>"
-    status_holders[idx].markdown(render_bank_row(badge_html, folder, name), unsafe_allow_html=True)
-    script = SCRAPERS[idx] if idx < len(SCRAPERS) else None
-    if script and os.path.exists(script):
-        try:
-            res = subprocess.run(["python3", script], capture_output=True, text=True, timeout=420)
-            log_out = (res.stdout or "") + "\n" + (res.stderr or "")
-            if res.returncode == 0:
-                acrobat_periods = needs_acrobat(folder)
-                if acrobat_periods:
-                    period_str = ', '.join(acrobat_periods)
-                    badge_html = f"<span class='status-badge arrange'>🟨 Acrobat Needed</span>"
-                    msg = (
-                        f"{badge_html} "
-                        f"{render_bank_row('', folder, name)} <span style='color:#aaa;font-size:0.96em'>({period_str})</span><br>"
-                        "<b style='color:#FFEF00;'>PDF files detected. Open <u>Adobe Acrobat Wizard</u>. It will convert PDFs to Excel.<br>Only then proceed to <u>Arrange Files</u>.</b>"
-                    )
-                    status_holders[idx].markdown(msg, unsafe_allow_html=True)
-                else:
-                    arrange_periods = needs_arrange(folder)
-                    if arrange_periods:
-                        period_str = ', '.join(arrange_periods)
-                        badge_html = f"<span class='status-badge arrange'>🟨 Needs Arrange</span>"
-                        status_holders[idx].markdown(
-                            render_bank_row(badge_html, folder, name) + f" <span style='color:#aaa;font-size:0.96em'>({period_str})</span>",
-                            unsafe_allow_html=True
-                        )
-                    elif is_fully_arranged(folder):
-                        badge_html = f"<span class='status-badge'>✅ Ready</span>"
-                        status_holders[idx].markdown(render_bank_row(badge_html, folder, name), unsafe_allow_html=True)
-                    elif has_any_data(folder):
-                        badge_html = f"<span class='status-badge'>🟩 Downloaded</span>"
-                        status_holders[idx].markdown(render_bank_row(badge_html, folder, name), unsafe_allow_html=True)
-                    else:
-                        badge_html = f"<span class='status-badge error'>❌ No Data</span>"
-                        status_holders[idx].markdown(render_bank_row(badge_html, folder, name), unsafe_allow_html=True)
-            else:
-                error_logs[idx] = log_out
-                with status_holders[idx]:
-                    badge_html = f"<span class='status-badge error'>❌ Error</span>"
-                    st.markdown(render_bank_row(badge_html, folder, name), unsafe_allow_html=True)
-                    st.expander("View Error / Missing Summary").code(error_logs[idx] or "No details.", language="text")
-        except Exception as e:
-            badge_html = f"<span class='status-badge error'>❌ Error</span>"
-            status_holders[idx].markdown(
-                render_bank_row(badge_html, folder, name) + f" <span style='color:#888;font-size:0.97em'>{e}</span>",
-                unsafe_allow_html=True
-            )
+def master_export_path(version, banks, period_range, fmt):
+    key = json.dumps([version[1], version[2], sorted(banks), list(period_range), fmt])
+    return os.path.join(MASTER_EXPORT_DIR, hashlib.md5(key.encode()).hexdigest()[:16] + MASTER_FORMATS[fmt][0])
+
+def build_master_export(store, banks, period_range, fmt, path):
+    periods = store["values"]["Period"]
+    lo, hi = periods.index(period_range[0]), periods.index(period_range[1])
+    rows = query_master(store, {"Bank": banks, "Period": periods[lo:hi + 1]})
+    df = store["df"].iloc[rows]
+    df = df.astype({c: str for c in MASTER_KEYS})
+    os.makedirs(MASTER_EXPORT_DIR, exist_ok=True)
+    tmp = path + ".part"
+    if fmt == "CSV":
+        df.to_csv(tmp, index=False, encoding="utf-8-sig", chunksize=50_000)
+    elif fmt == "Parquet":
+        df.to_parquet(tmp, index=False)
     else:
-        badge_html = f"<span class='status-badge error'>❌ Script missing</span>"
-        status_holders[idx].markdown(render_bank_row(badge_html, folder, name), unsafe_allow_html=True)
-    st.session_state['scraping_any'] = False
-
-# ---- STEP 1: SCRAPING ----
-st.subheader("1️⃣ Scrape & Update")
-
-status_holders = [st.empty() for _ in BANKS]
-scrape_clicked = st.button("🔄 Run All Scrapers", disabled=st.session_state['scraping_any'])
-error_logs = [None] * len(BANKS)
-
-for idx, (name, folder) in enumerate(BANKS):
+        write_xlsx(df, tmp, sheet_name="Master")
+    os.replace(tmp, path)
+    old = sorted((os.path.join(MASTER_EXPORT_DIR, f) for f in os.listdir(MASTER_EXPORT_DIR)
+                  if not f.endswith(".part")), key=os.path.getmtime, reverse=True)
+    for stale in old[MASTER_EXPORT_KEEP:]:
+        os.remove(stale)
+    return len(df)
+
+# ---- BACKGROUND JOBS ----
+# Scrapers, arrangers and the ETL run in jobs.py's server-wide pool (APP_MAX_JOBS at a time).
+# Each job locks the bank folders it touches, so no two sessions can scrape the same bank at once.
+SCRAPE_TIMEOUT = 420
+ETL_CMD = ["python3", "-m", "etl.etl", "--raw", "../processed_data", "--out", "output",
+           "--config", "config", "--master", "master.xlsx"]
+JOB_ICONS = {"queued": "🕓", "running": "⏳", "done": "✅", "failed": "❌", "timeout": "⌛"}
+
+def start_scraper(idx, name, folder):
+    script = SCRAPERS[idx] if idx < len(SCRAPERS) else None
+    if not script or not os.path.exists(script):
+        st.error(f"❌ Script missing for {name}")
+        return None
+    return jobs.submit_command(f"Scrape {name}", ["python3", script], resources=[folder],
+                               kind="scrape", timeout=SCRAPE_TIMEOUT)
+
+def blocking_jobs(resources):
+    """Names of the active jobs holding any of resources: why a submit_* call returned None."""
+    return sorted({job["name"] for job in map(jobs.busy, resources) if job})
+
+def arrange_resources(banks):
+    return banks + ["processed_data"]
+
+ETL_RESOURCES = ["processed_data", "etl"]
+
+def start_arrange(banks):
+    def arrange(log):
+        results = run_arrangers(banks)
+        for r in results:
+            for line in plan_lines(r["plan"]):
+                log(line)
+        return results
+    return jobs.submit_function("Arrange files", arrange, resources=arrange_resources(banks), kind="arrange")
+
+def start_etl():
+    return jobs.submit_command("Balance ETL", ETL_CMD, resources=ETL_RESOURCES,
+                               kind="etl", cwd="bank_etl_v3")
+
+def job_badge(job):
+    verb = {"scrape": "Scraping", "arrange": "Arranging", "etl": "ETL running"}.get(job["kind"], "Running")
+    text = f"⏳ {verb}..." if job["status"] == "running" else "🕓 Queued"
+    return f"<span class='status-badge arrange'>{text}</span>"
+
+def render_jobs_panel():
+    all_jobs = jobs.list_jobs()
+    active = [j for j in all_jobs if j["status"] in jobs.ACTIVE]
+    if not all_jobs:
+        return
+    with st.expander(f"🧵 Jobs ({len(active)} active)", expanded=bool(active)):
+        for job in reversed(all_jobs):
+            end = job["finished"] or time.time()
+            elapsed = f"{end - job['started']:.0f}s" if job["started"] else "waiting"
+            st.markdown(f"{JOB_ICONS.get(job['status'], '')} **{job['name']}** · {job['status']} · {elapsed}")
+            if job["log"] and (job["status"] != "done" or job in active):
+                st.code("\n".join(list(job["log"])[-40:]), language="text")
+        if not active and st.button("Clear finished jobs"):
+            jobs.clear_finished()
+            st.rerun(scope="fragment")
+    # a job finished since the last poll -> rerun the whole page so badges and quarter lists pick it up
+    seen = st.session_state.setdefault('jobs_finished', jobs.finished_count())
+    if jobs.finished_count() != seen:
+        st.session_state['jobs_finished'] = jobs.finished_count()
+        st.rerun()
+
+def bank_badge(status, folder, running=None):
+    if running:
+        return job_badge(running)
+    if needs_acrobat(status, folder):
+        return "<span class='status-badge arrange'>🟨 Acrobat Needed</span>"
+    if needs_arrange(status, folder):
+        return "<span class='status-badge arrange'>🟨 Needs Arrange</span>"
+    if is_fully_arranged(status, folder):
+        return "<span class='status-badge'>✅ Fully Arranged</span>"
+    if has_any_data(status, folder):
+        return "<span class='status-badge'>🟩 Downloaded</span>"
+    return "<span class='status-badge error'>❌ Not Downloaded</span>"
+
+def render_bank_row(status, idx, name, folder, key_prefix, with_scrape=False):
     col1, col2, col3, col4 = st.columns([0.15, 0.20, 0.48, 0.17])
-    if needs_acrobat(folder):
-        badge_html = "<span class='status-badge arrange'>🟨 Acrobat Needed</span>"
-    elif needs_arrange(folder):
-        badge_html = "<span class='status-badge arrange'>🟨 Needs Arrange</span>"
-    elif is_fully_arranged(folder):
-        badge_html = "<span class='status-badge'>✅ Fully Arranged</span>"
-    elif has_any_data(folder):
-        badge_html = "<span class='status-badge'>🟩 Downloaded</span>"
-    else:
-        badge_html = "<span class='status-badge error'>❌ Not Downloaded</span>"
-
+    running = jobs.busy(folder)
     with col1:
         st.markdown(
-            f"<div style='display:flex;align-items:center;min-height:54px'>{badge_html}</div>",
+            f"<div style='display:flex;align-items:center;min-height:54px'>{bank_badge(status, folder, running)}</div>",
             unsafe_allow_html=True
         )
     with col2:
-        logo_b64 = get_bank_logo_b64(folder)
-        logo_html = (
-            f"<img src='data:image/png;base64,{logo_b64}' "
-            "style='height:27px;width:auto;margin-right:10px;border-radius:5px;display:inline-block;'>"
-            if logo_b64 else ""
-        )
-        st.markdown(
-            f"""
-            <div style="display:flex;align-items:center;min-height:54px;">
-                {logo_html}<b style="font-size:1.08em;display:inline-block;vertical-align:middle;">{name}</b>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
+        st.markdown(bank_name_html(folder, name), unsafe_allow_html=True)
     with col3:
         # EXPANDER
-        render_quarters_expander(folder, key=f"exp_{idx}")
+        render_quarters_expander(status, folder, key=f"{key_prefix}_{idx}")
     with col4:
         # SCRAPE BUTTON
-        indiv_btn = st.button("Scrape", key=f"scrape_{idx}", disabled=st.session_state['scraping_any'])
-        if indiv_btn:
-            with st.spinner(f"Scraping {name}…"):
-                run_scraper(idx, name, folder)
-                st.rerun()
+        if with_scrape and st.button("Scrape", key=f"scrape_{idx}", disabled=running is not None):
+            if start_scraper(idx, name, folder):
+                st.rerun(scope="fragment")   # only this row redraws; the jobs panel takes it from here
+            elif jobs.busy(folder):           # None without a job: the script is missing (shown above)
+                st.warning(f"{name} is already being processed.")
+
+# Fragments: a click inside one re-runs only that function, not the CSS, the other rows or the sections.
+# The jobs panel polls every 2 s (reads an in-memory table) and reattaches after reruns or from other sessions.
+jobs_panel = st.fragment(run_every=2)(render_jobs_panel)
+bank_row = st.fragment(render_bank_row)
+
+jobs_panel()
+status = status_snapshot()
+
+# ---- STEP 1: SCRAPING ----
+st.subheader("1️⃣ Scrape & Update")
+
+scrape_clicked = st.button("🔄 Run All Scrapers")
+
+for idx, (name, folder) in enumerate(BANKS):
+    bank_row(status, idx, name, folder, "exp", with_scrape=True)
 
 if scrape_clicked:
-    with st.spinner("Scraping all banks…"):
-        st.session_state['scraping_any'] = True
-        for idx, (name, folder) in enumerate(BANKS):
-            run_scraper(idx, name, folder)
-        st.session_state['scraping_any'] = False
-    st.success("🎉 Scraping complete!")
-    st.rerun()
+    free = [(idx, name, folder) for idx, (name, folder) in enumerate(BANKS) if not jobs.busy(folder)]
+    started = [name for idx, name, folder in free if start_scraper(idx, name, folder)]
+    if started:
+        st.rerun()
+    if not free:
+        st.info("All banks are already being scraped.")
 
 # ---- STEP 2: ARRANGEMENT (AFTER ACROBAT) ----
 st.markdown("---")
 st.subheader("2️⃣ Arrange Files")
 
-needs_arrange_banks = []
-for name, folder in BANKS:
-    arrange_periods = needs_arrange(folder)
-    if arrange_periods:
-        needs_arrange_banks.append((name, arrange_periods))
-if needs_arrange_banks:
-    msg = "<br>".join(
-        f"<b>{name}</b>: <span style='color:#ccc;font-size:0.96em'>{', '.join(periods)}</span>"
-        for name, periods in needs_arrange_banks
-    )
-    st.markdown(
-    "<div style='padding:0.8em 1em;background:#2b2b40;border-radius:8px;color:#F7E967;border-left:5px solid #FFEF00;margin-bottom:1em;font-weight:500;'>"
-    "<b>After converting PDFs with Acrobat:</b> Click <b>Arrange Files</b> to finalize processing for the periods below.<br><br>" + msg +
-    "</div>", unsafe_allow_html=True)
-else:
-    st.success("✅ No banks need arranging. All processed.")
-
-arrange_clicked = st.button("📂 Arrange Files for Banks Needing It", disabled=st.session_state['scraping_any'])
-if arrange_clicked:
-    with st.spinner("Arranging all Excels from raw_data…"):
-        arrange_logs = []
-        for name, folder in BANKS:
-            script = next((p for f, p in ARRANGERS if f == folder), None)
-            if script and os.path.exists(script):
-                res = subprocess.run(["python3", script], capture_output=True, text=True)
-                arrange_logs.append(f"[{name}] " + (res.stdout.strip() or "OK"))
-                if res.stderr:
-                    arrange_logs.append(res.stderr.strip())
-        st.success("✅ All arrange scripts have been executed.")
-        st.expander("View arrange logs").code('\n'.join(arrange_logs))
-    st.rerun()
+@st.fragment
+def render_arrange_section(status):
+    needs_arrange_banks = []
+    for name, folder in BANKS:
+        arrange_periods = needs_arrange(status, folder)
+        if arrange_periods:
+            needs_arrange_banks.append((name, arrange_periods))
+    if needs_arrange_banks:
+        msg = "<br>".join(
+            f"<b>{name}</b>: <span style='color:#ccc;font-size:0.96em'>{', '.join(periods)}</span>"
+            for name, periods in needs_arrange_banks
+        )
+        st.markdown(
+        "<div style='padding:0.8em 1em;background:#2b2b40;border-radius:8px;color:#F7E967;border-left:5px solid #FFEF00;margin-bottom:1em;font-weight:500;'>"
+        "<b>After converting PDFs with Acrobat:</b> Click <b>Arrange Files</b> to finalize processing for the periods below.<br><br>" + msg +
+        "</div>", unsafe_allow_html=True)
+    else:
+        st.success("✅ No banks need arranging. All processed.")
+
+    arrange_job = jobs.latest("arrange")
+    arranging = arrange_job is not None and arrange_job["status"] in jobs.ACTIVE
+    arrange_clicked = st.button("📂 Arrange Files for Banks Needing It", disabled=arranging)
+    if arrange_clicked:
+        banks = [folder for _, folder in BANKS if folder in ARRANGERS]
+        if start_arrange(banks):
+            st.rerun(scope="fragment")
+        blocking = blocking_jobs(arrange_resources(banks))
+        if blocking:
+            st.warning(f"Waiting on {', '.join(blocking)}. Try again when those jobs finish.")
+
+    if arranging:
+        st.info("⏳ Arranging files in the background…")
+    elif arrange_job and arrange_job["result"] is not None:
+        results = arrange_job["result"]
+        failed = sum(r["errors"] for r in results)
+        if failed:
+            st.error(f"❌ {failed} file(s) could not be moved. See the arrange logs.")
+        else:
+            st.success("✅ All banks have been arranged.")
+        with st.expander("View arrange logs"):
+            st.dataframe([{k: v for k, v in r.items() if k != "plan"} for r in results],
+                         hide_index=True, use_container_width=True)
+            st.code("\n".join(arrange_job["log"]) or "Nothing to move.")
+
+render_arrange_section(status)
 
 # ---- STEP 3: FINAL BANK STATUS ----
 st.markdown("---")
 st.subheader("3️⃣ Final Bank Status")
 for idx, (name, folder) in enumerate(BANKS):
-    col1, col2, col3, col4 = st.columns([0.15, 0.20, 0.48, 0.17])
-    if needs_acrobat(folder):
-        badge_html = "<span class='status-badge arrange'>🟨 Acrobat Needed</span>"
-    elif needs_arrange(folder):
-        badge_html = "<span class='status-badge arrange'>🟨 Needs Arrange</span>"
-    elif is_fully_arranged(folder):
-        badge_html = "<span class='status-badge'>✅ Fully Arranged</span>"
-    elif has_any_data(folder):
-        badge_html = "<span class='status-badge'>🟩 Downloaded</span>"
-    else:
-        badge_html = "<span class='status-badge error'>❌ Not Downloaded</span>"
-
-    with col1:
-        st.markdown(
-            f"<div style='display:flex;align-items:center;min-height:54px'>{badge_html}</div>",
-            unsafe_allow_html=True
-        )
-    with col2:
-        logo_b64 = get_bank_logo_b64(folder)
-        logo_html = (
-            f"<img src='data:image/png;base64,{logo_b64}' "
-            "style='height:27px;width:auto;margin-right:10px;border-radius:5px;display:inline-block;'>"
-            if logo_b64 else ""
-        )
-        st.markdown(
-            f"""
-            <div style="display:flex;align-items:center;min-height:54px;">
-                {logo_html}<b style="font-size:1.08em;display:inline-block;vertical-align:middle;">{name}</b>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    with col3:
-        render_quarters_expander(folder, key=f"final_{idx}")
-    with col4:
-        pass  # Nothing here for now
+    bank_row(status, idx, name, folder, "final")
 
 # ---- STEP 4: EXPORT ----
 st.markdown("---")
 st.subheader("4️⃣ Export Processed Data")
 
-if all_banks_fully_arranged():
-    zip_buffer = zip_processed_data()
-    st.download_button(
-        label="⬇️ Download All Processed Data (ZIP)",
-        data=zip_buffer,
-        file_name=f"processed_data_{datetime.now().strftime('%Y%m%d')}.zip",
-        mime="application/zip"
-    )
-else:
-    st.warning("⚠️ Processed data is incomplete. Finish arranging first.")
+@st.fragment
+def render_export_section(status):
+    if all_banks_fully_arranged(status):
+        # built only on click, and the download button lives only in that run: Streamlit reads
+        # download_button's data into memory each time it renders, so it must not sit on every rerun
+        if st.button("📦 Prepare ZIP Export", disabled=jobs.busy("processed_data") is not None):
+            with st.spinner("Packing processed data..."):
+                written = build_export_zip()
+            st.info(f"{written} file(s) packed." if written else "Archive already up to date.")
+            with open(EXPORT_ZIP, "rb") as zip_file:
+                st.download_button(
+                    label="⬇️ Download All Processed Data (ZIP)",
+                    data=zip_file,
+                    file_name=f"processed_data_{datetime.now().strftime('%Y%m%d')}.zip",
+                    mime="application/zip"
+                )
+    else:
+        st.warning("⚠️ Processed data is incomplete. Finish arranging first.")
+
+    etl_job = jobs.latest("etl")
+    etl_running = etl_job is not None and etl_job["status"] in jobs.ACTIVE
+    if st.button("🧮 Build Balance Master (ETL)", disabled=etl_running or not all_banks_fully_arranged(status)):
+        if start_etl():
+            st.rerun(scope="fragment")
+        blocking = blocking_jobs(ETL_RESOURCES)
+        if blocking:
+            st.warning(f"Processed data is busy ({', '.join(blocking)}). Try again when that job finishes.")
+    if etl_job and not etl_running:
+        if etl_job["status"] == "done":
+            st.success("✅ Master written to bank_etl_v3/output/master.xlsx")
+        else:
+            st.error(f"❌ ETL {etl_job['status']}. See the jobs panel for its log.")
+
+    # filtered master slice
+    version = master_version()
+    if version is None:
+        return
+    store = load_master_store(version)
+    periods = store["values"]["Period"]
+    st.markdown("**Download the ETL master**")
+    m1, m2 = st.columns(2)
+    banks = m1.multiselect("Banks (empty = all)", store["values"]["Bank"], key="mexp_banks")
+    fmt = m2.radio("Format", list(MASTER_FORMATS), horizontal=True, key="mexp_fmt")
+    period_range = ((periods[0], periods[-1]) if len(periods) < 2 else
+                    st.select_slider("Periods", options=periods, value=(periods[0], periods[-1]), key="mexp_periods"))
+    path = master_export_path(version, banks, period_range, fmt)
+    # like the ZIP: the download button, which reads the whole file into memory, only in the
+    # click's run; an export already on disk for this selection is reused
+    if st.button("🛠️ Prepare Master Export", key="mexp_build"):
+        if not os.path.exists(path):
+            with st.spinner(f"Writing {fmt}…"):
+                n = build_master_export(store, banks, period_range, fmt, path)
+            st.info(f"{n:,} rows written.")
+        ext, mime = MASTER_FORMATS[fmt]
+        with open(path, "rb") as master_file:
+            st.download_button(
+                label=f"⬇️ Download Master ({fmt})",
+                data=master_file,
+                file_name=f"master_{period_range[0]}_{period_range[1]}{ext}",
+                mime=mime,
+                key="mexp_download",
+            )
+
+render_export_section(status)
+
+# ---- MASTER EXPLORER ----
+st.markdown("---")
+st.subheader("🔎 Master Explorer")
+
+@st.fragment
+def render_master_explorer():
+    version = master_version()
+    if version is None:
+        st.info("No master yet. Run the ETL in Step 4 first.")
+        return
+    store = load_master_store(version)
+    values = store["values"]
+
+    f1, f2 = st.columns(2)
+    filters = {
+        "Bank": f1.multiselect("Bank", values["Bank"], key="mx_bank"),
+        "Period": f2.multiselect("Period", values["Period"], key="mx_period"),
+        "Indicator table": f1.multiselect("Indicator table", values["Indicator table"], key="mx_table"),
+        "Element": f2.multiselect("Element", values["Element"], key="mx_element"),
+    }
+    rows = query_master(store, filters)
+
+    p1, p2, p3 = st.columns([0.3, 0.3, 0.4])
+    page_size = p1.selectbox("Rows per page", [50, 100, 250, 500], key="mx_page_size")
+    pages = max(1, -(-len(rows) // page_size))
+    if st.session_state.get("mx_page", 1) > pages:   # filters narrowed below the current page
+        st.session_state["mx_page"] = pages
+    page = p2.number_input("Page", min_value=1, max_value=pages, step=1, key="mx_page")   # value comes from session_state (min_value at first)
+    p3.markdown(f"<div style='padding-top:2.1em'>{len(rows):,} rows · page {page}/{pages}</div>",
+                unsafe_allow_html=True)
+    view = store["df"].iloc[rows[(page - 1) * page_size: page * page_size]]
+    st.dataframe(view.dropna(axis=1, how="all"), hide_index=True, use_container_width=True)
+
+    # cross-bank pivot for one element: Period x Bank
+    c1, c2 = st.columns(2)
+    element = c1.selectbox("Pivot element", values["Element"], key="mx_pivot_el")
+    measure = c2.selectbox("Value", store["measures"], key="mx_pivot_val")
+    pivot_rows = query_master(store, {**filters, "Element": [element]})
+    sub = store["df"].iloc[pivot_rows]
+    if sub.empty:
+        st.caption("No rows for this element with the current filters.")
+    else:
+        pivot = sub.pivot_table(index="Period", columns="Bank", values=measure, aggfunc="sum", observed=True)
+        st.dataframe(pivot, use_container_width=True)
+
+render_master_explorer()
 
 # ---- STEP 5: LAUNCH POWERBI ----
 st.markdown("---")
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import errno
+import shutil
+import time
+import argparse
+from functools import partial
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# the file catalog lives with the downloaders, which write most of it
+from downloaders import file_catalog
+
+# run from the repo root as a module: python3 -m arrangers.arrange [--banks ...] [--dry-run]
+
+RAW_ROOT = "raw_data"
+PROCESSED_ROOT = "processed_data"
+
+# ---- FILENAME PATTERNS ----
+PERIOD = r"20\d{2}_(?:Q[1-4]|12m)"
+TYPE_PERIOD = re.compile(rf"(?P<type>[a-z_]+)_(?P<period>{PERIOD})\.(?P<ext>xlsx|xls)")
+# legacy, rare: 2020_Q1_cash_flow_2020_Q1.xlsx
+PERIOD_TYPE_PERIOD = re.compile(rf"(?P<period>{PERIOD})_(?P<type>[a-z_]+)_{PERIOD}\.(?P<ext>xlsx|xls)")
+
+# ---- PER-BANK RULES ----
+# exts:      Excel extensions picked up (everything else, PDFs included, is left alone)
+# patterns:  tried in order with re.match; need 'period', and 'type'/'ext' when renaming
+# rename:    True -> "<type>_<period>.<ext>", False -> keep the original file name
+# q4_12m:    file 12m (annual) reports under <year>_Q4
+# recursive: walk sub-folders of raw_data/<bank>, or only its top level
+# period_from_dir: take the period from the parent folder name instead of the file name
+BANK_RULES = {
+    "abb_bank": {
+        "exts": (".xlsx",),
+        "patterns": [re.compile(rf"(?P<type>.+?)_(?P<period>{PERIOD})\.(?P<ext>xlsx)")],
+        "rename": True, "q4_12m": False, "recursive": True,
+    },
+    "access_bank": {
+        "exts": (".xlsx", ".xls"),
+        "patterns": [re.compile(rf"(?:risk_reports_)?(?P<type>[a-z_]+)_(?P<period>{PERIOD})\.(?P<ext>xlsx|xls)")],
+        "rename": True, "q4_12m": True, "recursive": True,
+    },
+    "kapital_bank": {
+        "exts": (".xlsx", ".xls"),
+        "patterns": [TYPE_PERIOD],
+        "rename": False, "q4_12m": True, "recursive": True,
+    },
+    "pasha_bank": {
+        "exts": (".xlsx", ".xls"),
+        "patterns": [TYPE_PERIOD, PERIOD_TYPE_PERIOD],
+        "rename": True, "q4_12m": False, "recursive": True,
+    },
+    "xalq_bank": {
+        "exts": (".xlsx", ".xls"),
+        "patterns": [TYPE_PERIOD, PERIOD_TYPE_PERIOD],
+        "rename": True, "q4_12m": False, "recursive": False,
+    },
+    "yelobank": {
+        "exts": (".xlsx", ".xls"),
+        "patterns": [re.compile(r"(?P<period>20\d{2}_Q[1-4])")],
+        "rename": False, "q4_12m": False, "recursive": True, "period_from_dir": True,
+    },
+}
+
+# ---- PLAN ----
+def scan_raw(raw_root=RAW_ROOT, banks=None):
+    """One walk over raw_data -> {bank: [(dirpath, fname), ...]}."""
+    found = defaultdict(list)
+    banks = set(banks or BANK_RULES)
+    for dirpath, dirs, files in os.walk(raw_root):
+        rel = os.path.relpath(dirpath, raw_root)
+        parts = [] if rel == "." else rel.split(os.sep)
+        if not parts:
+            dirs[:] = [d for d in dirs if d in banks]
+            continue
+        bank = parts[0]
+        if not BANK_RULES[bank]["recursive"]:
+            dirs[:] = []
+        for fname in files:
+            found[bank].append((dirpath, fname))
+    return found
+
+def target_for(bank, dirpath, fname):
+    """Return (period, out_name) for a raw file, or (None, None) if unrecognized."""
+    rule = BANK_RULES[bank]
+    subject = os.path.basename(dirpath) if rule.get("period_from_dir") else fname
+    for rx in rule["patterns"]:
+        m = rx.match(subject)
+        if not m:
+            continue
+        period = m.group("period")
+        if rule["q4_12m"] and period.endswith("12m"):
+            period = period.replace("12m", "Q4")
+        out_name = f"{m.group('type')}_{period}.{m.group('ext')}" if rule["rename"] else fname
+        return period, out_name
+    return None, None
+
+def plan_moves(raw_root=RAW_ROOT, processed_root=PROCESSED_ROOT, banks=None):
+    """Scan raw_data once and decide what happens to every Excel file.
+    Each entry: {bank, action, src, dst}; action is move / duplicate / conflict / skip."""
+    plan = []
+    claimed = {}
+    for bank, entries in sorted(scan_raw(raw_root, banks).items()):
+        rule = BANK_RULES[bank]
+        for dirpath, fname in sorted(entries):
+            if not fname.endswith(rule["exts"]):
+                continue
+            src = os.path.join(dirpath, fname)
+            period, out_name = target_for(bank, dirpath, fname)
+            if not period or not out_name:
+                plan.append({"bank": bank, "action": "skip", "src": src, "dst": None})
+                continue
+            dst = os.path.join(processed_root, bank, period, out_name)
+            if os.path.abspath(src) == os.path.abspath(dst):
+                continue
+            if os.path.exists(dst):
+                action = "duplicate"
+            elif dst in claimed:
+                action = "conflict"   # another raw file already maps to this target in this run
+            else:
+                action = "move"
+                claimed[dst] = src
+            plan.append({"bank": bank, "action": action, "src": src, "dst": dst})
+    return plan
+
+# ---- APPLY ----
+def _copy_across(move):
+    # different filesystem: copy to a temp name next to the target, then rename into place
+    src, dst = move["src"], move["dst"]
+    tmp = dst + ".part"
+    shutil.copy2(src, tmp)
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, dst)
+    os.remove(src)
+    return move
+
+def apply_plan(plan, workers=4):
+    """Same-filesystem moves are atomic renames; cross-device ones are copied in parallel."""
+    cross = []
+    for mv in plan:
+        if mv["action"] != "move":
+            continue
+        os.makedirs(os.path.dirname(mv["dst"]), exist_ok=True)
+        if os.path.exists(mv["dst"]):
+            mv["action"] = "duplicate"
+            continue
+        try:
+            os.rename(mv["src"], mv["dst"])
+            mv["status"] = "moved"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                mv["status"] = f"error: {e}"
+                continue
+            cross.append(mv)
+    if cross:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(mv, pool.submit(_copy_across, mv)) for mv in cross]
+            for mv, fut in futures:
+                try:
+                    fut.result()
+                    mv["status"] = "moved"
+                except Exception as e:
+                    mv["status"] = f"error: {e}"
+    return plan
+
+def plan_lines(plan, dry_run=False):
+    lines = []
+    for mv in plan:
+        action = mv["action"]
+        if action == "skip":
+            lines.append(f"[SKIP] {mv['bank']}: unrecognized Excel file name: {os.path.basename(mv['src'])}")
+        elif action == "duplicate":
+            lines.append(f"[DUPLICATE] {mv['dst']} exists, skipping {mv['src']}")
+        elif action == "conflict":
+            lines.append(f"[CONFLICT] {mv['src']} -> {mv['dst']} (already claimed by another file)")
+        elif dry_run:
+            lines.append(f"[PLAN] {mv['src']} -> {mv['dst']}")
+        elif mv.get("status", "").startswith("error"):
+            lines.append(f"[ERROR] {mv['src']} -> {mv['dst']}: {mv['status']}")
+        else:
+            lines.append(f"[MOVED] {mv['src']} -> {mv['dst']}")
+    return lines
+
+def summarize(bank, plan, seconds=0.0):
+    """Per-bank counts for one plan: moved / duplicate / skipped / errors, plus the plan itself."""
+    errors = [mv for mv in plan if mv.get("status", "").startswith("error")]
+    return {
+        "bank": bank,
+        "moved": sum(mv["action"] == "move" for mv in plan) - len(errors),
+        "duplicate": sum(mv["action"] in ("duplicate", "conflict") for mv in plan),
+        "skipped": sum(mv["action"] == "skip" for mv in plan),
+        "errors": len(errors),
+        "seconds": round(seconds, 3),
+        "plan": plan,
+    }
+
+def print_plan(results, dry_run=False):
+    for res in results:
+        for line in plan_lines(res["plan"], dry_run):
+            print(line)
+    print()
+    for res in results:
+        if not res["plan"]:
+            continue
+        print(f"{res['bank']}: {res['moved']} {'to move' if dry_run else 'moved'}, "
+              f"{res['duplicate']} duplicate, {res['skipped']} skipped"
+              + (f", {res['errors']} failed" if res["errors"] else "")
+              + f" ({res['seconds']:.2f}s)")
+
+# ---- REGISTRY ----
+def arrange_bank(bank, raw_root=RAW_ROOT, processed_root=PROCESSED_ROOT, dry_run=False, workers=4, plan=None):
+    """Apply the moves for one bank (its part of a run_arrangers plan, or planned here when
+    called alone); returns its summarize() dict."""
+    t0 = time.perf_counter()
+    if plan is None:
+        plan = plan_moves(raw_root, processed_root, [bank])
+    if not dry_run:
+        apply_plan(plan, workers=workers)
+        moved = [mv for mv in plan if mv.get("status") == "moved"]
+        file_catalog.update([p for mv in moved for p in (mv["src"], mv["dst"])])
+    return summarize(bank, plan, time.perf_counter() - t0)
+
+# bank folder -> callable(raw_root=..., processed_root=..., dry_run=..., workers=..., plan=None)
+ARRANGERS = {bank: partial(arrange_bank, bank) for bank in BANK_RULES}
+
+def run_arrangers(banks=None, raw_root=RAW_ROOT, processed_root=PROCESSED_ROOT, dry_run=False, workers=4):
+    """One scan of raw_data plans every bank; the banks' parts are then applied in parallel
+    (each bank only touches its own folders). Results keep the input order."""
+    banks = [b for b in (banks or ARRANGERS) if b in ARRANGERS]
+    if not banks:
+        return []
+    parts = defaultdict(list)
+    for mv in plan_moves(raw_root, processed_root, banks):
+        parts[mv["bank"]].append(mv)
+    with ThreadPoolExecutor(max_workers=len(banks)) as pool:
+        futures = [pool.submit(ARRANGERS[b], raw_root=raw_root, processed_root=processed_root,
+                               dry_run=dry_run, workers=workers, plan=parts[b]) for b in banks]
+        return [f.result() for f in futures]
+
+def arrange_banks(banks=None, raw_root=RAW_ROOT, processed_root=PROCESSED_ROOT, dry_run=False, workers=4):
+    results = run_arrangers(banks, raw_root, processed_root, dry_run=dry_run, workers=workers)
+    print_plan(results, dry_run=dry_run)
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description="Move converted Excels from raw_data into processed_data/<bank>/<period>/.")
+    ap.add_argument("--banks", nargs="*", choices=sorted(BANK_RULES), help="default: all banks with rules")
+    ap.add_argument("--raw", default=RAW_ROOT)
+    ap.add_argument("--processed", default=PROCESSED_ROOT)
+    ap.add_argument("--dry-run", action="store_true", help="print the plan, move nothing")
+    ap.add_argument("--workers", type=int, default=4, help="parallel cross-device copies")
+    args = ap.parse_args()
+    results = arrange_banks(args.banks, args.raw, args.processed, dry_run=args.dry_run, workers=args.workers)
+    if any(res["errors"] for res in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
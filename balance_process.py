@@ -1,6 +1,11 @@
 import os
 import re
+import argparse
+import hashlib
 from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
 # ---------------- CONFIG ----------------
@@ -13,15 +18,23 @@ REPORT_RX = re.compile(r"(financial[_\s-]*position|balance(?![_\s-]*of[_\s-]*pay
 PERIOD_Q_RX   = re.compile(r"\b(20\d{2})[ _\-\.]?Q([1-4])\b", re.IGNORECASE)   # 2024_Q1
 PERIOD_12M_RX = re.compile(r"\b(20\d{2})[ _\-\.]?12M\b", re.IGNORECASE)        # 2020_12m → Q4
 
-TOTAL_RX = re.compile(r"\b(total|subtotal|cəm|ümumi|итог|всего)\b", re.IGNORECASE)
+# Consolidated long-format output (one typed parquet, sorted by the key columns)
+OUT_FILE = Path("output") / "balance_long.parquet"
+KEY_COLS = ["Bank", "Period", "SourceFile", "Sheet"]
+OUT_COLS = KEY_COLS + ["ReportType", "Metric", "Descriptor", "Value", "Amount"]
+OUT_DTYPES = {"Bank": "category", "Period": "category", "SourceFile": "string", "Sheet": "string",
+              "ReportType": "category", "Metric": "string", "Descriptor": "string",
+              "Value": "string", "Amount": "float64"}
+
+TOTAL_RX = re.compile(r"\b(?:total|subtotal|cəm|ümumi|итог|всего)\b", re.IGNORECASE)
 
 # ---------------- HELPERS ----------------
 def is_balance_file(path: Path) -> bool:
     return path.suffix.lower() in INCLUDE_EXT and bool(REPORT_RX.search(str(path)))
 
-def parse_bank(path: Path) -> str:
+def parse_bank(path: Path, root: Path = ROOT) -> str:
     try:
-        parts = path.relative_to(ROOT).parts[:-1]
+        parts = path.relative_to(root).parts[:-1]
     except ValueError:
         parts = path.parent.parts
     return parts[0] if parts else "UNKNOWN_BANK"
@@ -45,92 +58,110 @@ def col_letter(idx: int) -> str:
         s = chr(65 + rem) + s
     return s
 
+LABEL_RX = re.compile(r"[A-Za-zÀ-žƏəİıÖöÜüĞğŞş]")   # any letter -> text label (metric)
+
 def find_header_row(df: pd.DataFrame) -> int:
     # First row with >=2 non-nulls; tweak if needed
-    for i, row in df.iterrows():
-        if row.count() >= 2:
-            return i
-    return 0
-
-def first_text_cell_index(series: pd.Series) -> int | None:
-    for j, v in series.items():
-        if pd.isna(v):
-            continue
-        s = str(v).strip()
-        if not s:
-            continue
-        # treat cells with any letter as text label (metric)
-        if re.search(r"[A-Za-zÀ-žƏəİıÖöÜüĞğŞş]", s):
-            return j
-    return None
+    ok = (df.notna().sum(axis=1) >= 2).to_numpy()
+    return int(ok.argmax()) if ok.any() else 0
+
+def build_descriptors(header: pd.Series) -> list[str]:
+    descriptors = []
+    for c_idx, v in enumerate(header.tolist()):
+        label = str(v).strip() if pd.notna(v) else ""
+        # avoid meaningless numeric-only descriptors like "1" if header was bad
+        if not label or label.isdigit():
+            label = col_letter(c_idx)
+        descriptors.append(label)
+    return descriptors
 
 def tidy_sheet_cellwise(raw: pd.DataFrame) -> pd.DataFrame:
     if raw is None or raw.empty:
         return pd.DataFrame()
 
-    # Drop fully empty rows/cols
+    # Drop fully empty rows/cols, then work positionally
     df = raw.dropna(how="all").dropna(axis=1, how="all")
     if df.empty:
         return pd.DataFrame()
+    df = df.reset_index(drop=True)
+    df.columns = range(df.shape[1])
 
-    # Detect header row
+    # Header row -> descriptors (fallback to column letters)
     h = find_header_row(df)
-
-    # Build descriptors from the header row (fallback to column letters)
-    header_vals = df.iloc[h].tolist()
-    descriptors = []
-    for c_idx, v in enumerate(header_vals):
-        label = str(v).strip() if pd.notna(v) and str(v).strip() else col_letter(c_idx)
-        descriptors.append(label)
+    descriptors = np.array(build_descriptors(df.iloc[h]), dtype=object)
 
     # Data starts after header
-    data = df.iloc[h+1:].reset_index(drop=True)
-    if data.empty:
+    values = df.iloc[h+1:].to_numpy(dtype=object)
+    if values.size == 0:
         return pd.DataFrame()
 
-    records = []
-    for _, row in data.iterrows():
-        # find metric cell index (first non-empty text cell anywhere in the row)
-        metric_idx = first_text_cell_index(row)
-        if metric_idx is None:
-            continue
-        metric_text = str(row.iloc[metric_idx]).strip()
-        if not metric_text or TOTAL_RX.search(metric_text):
-            continue
-
-        # emit one record for every other non-empty cell in the row
-        for c_idx, cell in enumerate(row):
-            if c_idx == metric_idx:
-                continue
-            if pd.isna(cell):
-                continue
-            val = str(cell).strip()
-            if not val:
-                continue
-            descriptor = descriptors[c_idx] if c_idx < len(descriptors) else col_letter(c_idx)
-            # avoid meaningless numeric-only descriptors like "1" if header was bad
-            if not descriptor or descriptor.isdigit():
-                descriptor = col_letter(c_idx)
-            records.append({
-                "Metric": metric_text,
-                "Descriptor": descriptor,
-                "Value": val
-            })
-
-    if not records:
+    # Long table of every non-empty cell, row-major: (row, col, text)
+    rows, cols = np.nonzero(~pd.isna(values))
+    text = pd.Series(values[rows, cols]).astype(str).str.strip().to_numpy(dtype=object)
+    keep = text != ""
+    rows, cols, text = rows[keep], cols[keep], text[keep]
+    if rows.size == 0:
+        return pd.DataFrame()
+
+    # Metric = first text cell of each row; rows whose metric is a total are dropped.
+    # object dtype on purpose: pandas' pyarrow strings match with RE2, whose \b only treats
+    # ASCII as word characters and so never fires before "Ümumi", "итог", "всего".
+    cells = pd.Series(text, dtype=object)
+    is_label = cells.str.contains(LABEL_RX).to_numpy(dtype=bool)
+    lab_rows = rows[is_label]
+    first = np.flatnonzero(is_label)[np.unique(lab_rows, return_index=True)[1]]
+    metric_row = rows[first]
+    metric_ok = ~cells.iloc[first].str.contains(TOTAL_RX).to_numpy(dtype=bool)
+
+    n_rows = values.shape[0]
+    metric_col = np.full(n_rows, -1)
+    metric_idx = np.full(n_rows, -1)
+    metric_col[metric_row[metric_ok]] = cols[first][metric_ok]
+    metric_idx[metric_row[metric_ok]] = first[metric_ok]
+
+    # emit one record for every other non-empty cell in a row that has a metric
+    emit = (metric_col[rows] >= 0) & (cols != metric_col[rows])
+    if not emit.any():
         return pd.DataFrame()
-    return pd.DataFrame.from_records(records)
+    return pd.DataFrame({
+        "Metric": text[metric_idx[rows[emit]]],
+        "Descriptor": descriptors[cols[emit]],
+        "Value": text[emit],
+    })
 
 # ---------------- MAIN PROCESS ----------------
-def process_file(xl_path: Path):
-    bank   = parse_bank(xl_path)
+def md5sum(path: Path) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def source_key(xl_path: Path, root: Path = ROOT) -> str:
+    try:
+        return xl_path.relative_to(root).as_posix()
+    except ValueError:
+        return xl_path.as_posix()
+
+def to_amount(values: pd.Series) -> pd.Series:
+    # typed copy of Value: '(42 653)' -> -42653.0, '8,880,952.11' -> 8880952.11, text -> NaN
+    # the right-most of '.'/',' is the decimal separator, the other one is thousands
+    s = values.astype("string").str.replace("[\\s\u00a0\u202f]", "", regex=True)
+    s = s.str.replace("^\\((.*)\\)$", "-\\1", regex=True).str.replace("−", "-", regex=False)
+    dec_comma = (s.str.rfind(",") > s.str.rfind(".")).fillna(False)
+    s = s.where(dec_comma, s.str.replace(",", "", regex=False))
+    s = s.where(~dec_comma, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(s, errors="coerce").astype("float64")
+
+def process_file(xl_path: Path, root: Path = ROOT) -> pd.DataFrame:
+    bank   = parse_bank(xl_path, root)
     period = parse_period(xl_path)
 
     try:
         book = pd.read_excel(xl_path, sheet_name=None, header=None, engine="openpyxl")
     except Exception as e:
         print(f"[SKIP] {xl_path} -> read error: {e}")
-        return
+        return pd.DataFrame(columns=OUT_COLS)
 
     frames = []
     for sheet_name, raw in book.items():
@@ -138,34 +169,73 @@ def process_file(xl_path: Path):
             tidy = tidy_sheet_cellwise(raw)
             if tidy.empty:
                 continue
-            tidy["Bank"]       = bank
-            tidy["Period"]     = period
-            tidy["ReportType"] = "BalanceSheet"
-            tidy["SourceFile"] = xl_path.name
-            tidy["Sheet"]      = str(sheet_name)
+            tidy["Sheet"] = str(sheet_name)
             frames.append(tidy)
         except Exception as e:
             print(f"[WARN] {xl_path}::{sheet_name} -> tidy error: {e}")
 
     if not frames:
         print(f"[INFO] {xl_path} -> no usable rows")
-        return
+        return pd.DataFrame(columns=OUT_COLS)
 
     out_df = pd.concat(frames, ignore_index=True)
-
-    # Write CSV next to the source file
-    out_path = xl_path.with_name(xl_path.stem + "__balance_clean.csv")
-    out_df.to_csv(out_path, index=False, encoding="utf-8-sig")
-    print(f"✅ {xl_path} → {out_path} ({len(out_df):,} rows)")
+    out_df["Bank"]       = bank
+    out_df["Period"]     = period
+    out_df["ReportType"] = "BalanceSheet"
+    out_df["SourceFile"] = source_key(xl_path, root)
+    out_df["Amount"]     = to_amount(out_df["Value"])
+    print(f"✅ {xl_path} ({len(out_df):,} rows)")
+    return out_df[OUT_COLS]
+
+def load_previous(out_path: Path, log_path: Path):
+    if not (out_path.exists() and log_path.exists()):
+        return pd.DataFrame(columns=OUT_COLS), {}
+    log = pd.read_csv(log_path, dtype=str).fillna("")
+    return pd.read_parquet(out_path), dict(zip(log["file"], log["md5"]))
 
 def main():
-    count = 0
-    for p in ROOT.rglob("*"):
-        if p.is_file() and is_balance_file(p):
-            process_file(p)
-            count += 1
-    if count == 0:
-        print("No Balance Sheet files found under", ROOT)
+    ap = argparse.ArgumentParser(description="Consolidate balance sheet workbooks into one long-format dataset.")
+    ap.add_argument("--root", default=str(ROOT), help="processed_data root")
+    ap.add_argument("--out", default=str(OUT_FILE), help="consolidated parquet file")
+    ap.add_argument("--workers", type=int, default=None, help="parallel processes (default: CPU count)")
+    ap.add_argument("--full", action="store_true", help="ignore the hash log and reprocess every file")
+    args = ap.parse_args()
+
+    root = Path(args.root)
+    out_path = Path(args.out)
+    log_path = out_path.with_name(out_path.stem + "_log.csv")
+
+    files = sorted(p for p in root.rglob("*") if p.is_file() and is_balance_file(p))
+    if not files:
+        print("No Balance Sheet files found under", root)
+        return
+
+    prev, seen = (pd.DataFrame(columns=OUT_COLS), {}) if args.full else load_previous(out_path, log_path)
+    hashes = {source_key(p, root): md5sum(p) for p in files}
+    todo = [p for p in files if seen.get(source_key(p, root)) != hashes[source_key(p, root)]]
+    # keep rows of unchanged files only; changed and deleted files drop out
+    unchanged = {k for k, h in hashes.items() if seen.get(k) == h}
+    keep = prev[prev["SourceFile"].isin(unchanged)]
+    print(f"{len(files)} balance files, {len(todo)} new/changed, {len(seen.keys() - hashes.keys())} removed")
+
+    if not todo and len(keep) == len(prev):
+        print(f"Up to date: {out_path} ({len(prev):,} rows)")
+        return
+
+    parts = [keep]
+    if todo:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            parts.extend(pool.map(partial(process_file, root=root), todo, chunksize=4))
+
+    master = pd.concat([p for p in parts if not p.empty] or [pd.DataFrame(columns=OUT_COLS)], ignore_index=True)
+    master = master.astype(OUT_DTYPES).sort_values(KEY_COLS, kind="stable").reset_index(drop=True)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    master.to_parquet(tmp, index=False, row_group_size=50_000)
+    os.replace(tmp, out_path)
+    pd.DataFrame({"file": list(hashes), "md5": list(hashes.values())}).to_csv(log_path, index=False, encoding="utf-8-sig")
+    print(f"✅ {out_path} ({len(master):,} rows, {master['SourceFile'].nunique()} files)")
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,9 @@ import numpy as np
 import pandas as pd
 from rapidfuzz import process as rf_process, fuzz as rf_fuzz
 
+from .excel_out import write_xlsx
+from .extractors import read_credit_table, credit_risk_stage
+
 # ----------------- Config -----------------
 MASTER_COLS = [
     "Bank","Period","Indicator table","Element","Sub-element","AZN","FS Line","Item","Currency",
@@ -16,6 +19,7 @@ MASTER_COLS = [
 ]
 
 FILENAME_BALANCE_RE = re.compile(r"(balance[_\s]?sheet|balance|financial[_\s]?position)", re.IGNORECASE)
+FILENAME_CREDIT_RE = re.compile(r"credit[_\s]?risk", re.IGNORECASE)
 SHEET_NAME_HINTS = ("maliyyə vəziyyəti", "financial position", "balance")
 
 PREFER_HDR = ("hesabat", "cari", "current")
@@ -64,9 +68,10 @@ def force_master_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 def dedup_master_keep_last_per_element(master: pd.DataFrame) -> pd.DataFrame:
-    # one row per Bank+Period+Element, keep the last (usually the detailed/true line)
-    master = master.sort_values(["Bank","Period","Element","AZN"])
-    return master.drop_duplicates(["Bank","Period","Element"], keep="last")
+    # one row per Bank+Period+table+Element, keep the last (usually the detailed/true line);
+    # the table keeps a credit sector from replacing a balance line of the same name
+    master = master.sort_values(["Bank","Period","Indicator table","Element","AZN"])
+    return master.drop_duplicates(["Bank","Period","Indicator table","Element"], keep="last")
 
 # ----------------- Element sorting (natural) -----------------
 def _pad(code: str, w: int = 6) -> str:
@@ -135,6 +140,22 @@ def normalize_amount(x):
 def is_balance_candidate(filename: str) -> bool:
     return bool(FILENAME_BALANCE_RE.search(Path(filename).stem))
 
+def is_credit_candidate(filename: str) -> bool:
+    return bool(FILENAME_CREDIT_RE.search(Path(filename).stem))
+
+def read_credit_file(file_path: str, rules_path: Path) -> pd.DataFrame:
+    try:
+        xls = pd.ExcelFile(file_path, engine="openpyxl")
+    except Exception as e:
+        print(f"[WARN] Cannot open {file_path}: {e}")
+        return pd.DataFrame()
+    xls.rules_path = str(rules_path)
+    try:
+        return read_credit_table(xls, file_path)
+    except Exception as e:
+        print(f"[WARN] {file_path}: credit table not read: {e}")
+        return pd.DataFrame()
+
 def read_balance_sheet(file_path: str) -> pd.DataFrame | None:
     try:
         xls = pd.ExcelFile(file_path, engine="openpyxl")
@@ -349,27 +370,40 @@ def run():
     ap.add_argument("--raw", required=True, help="processed_data/<bank>/<period>")
     ap.add_argument("--out", required=True, help="output folder")
     ap.add_argument("--config", required=True, help="config folder with items_map_balance.csv")
-    ap.add_argument("--master", required=True, help="output csv filename, e.g. master4.csv")
+    ap.add_argument("--master", required=True,
+                    help="output filename under --out, e.g. master4.csv; an .xlsx name also writes <out>/master.csv")
     args = ap.parse_args()
 
     raw_root = Path(args.raw)
     out_dir = Path(args.out)
     cfg_dir = Path(args.config)
-    master_csv = out_dir / args.master
+    master_path = out_dir / args.master
+    master_xlsx = master_path if master_path.suffix.lower() == ".xlsx" else None
+    master_csv = out_dir / "master.csv" if master_xlsx else master_path
 
     items_map_path = cfg_dir / "items_map_balance.csv"
     if not items_map_path.exists():
         raise FileNotFoundError(f"Mapping not found: {items_map_path}")
     items_map = pd.read_csv(items_map_path, dtype=str).fillna("")
+    rules_path = cfg_dir / "report_type_rules.yaml"
 
     ensure_dir(str(out_dir))
 
     processed_log = []
     master_parts = []
+    credit_parts = []
 
     for bank_dir in [p for p in raw_root.iterdir() if p.is_dir()]:
         for period_dir in [p for p in bank_dir.iterdir() if p.is_dir()]:
             for fp in period_dir.rglob("*.xls*"):
+                if is_credit_candidate(fp.name):
+                    df = read_credit_file(str(fp), rules_path)
+                    if df.empty:
+                        continue
+                    df["Bank"], df["Period"] = bank_dir.name, period_dir.name
+                    credit_parts.append(df)
+                    processed_log.append({"report_type": "credit_risk", "file": str(fp), "md5": md5sum(str(fp))})
+                    continue
                 if not is_balance_candidate(fp.name):
                     continue
                 df = extract_balance_sheet_from_file(str(fp), items_map)
@@ -384,16 +418,33 @@ def run():
                 master_parts.append(df)
                 processed_log.append({"report_type": "balance_sheet", "file": str(fp), "md5": md5sum(str(fp))})
 
-    if master_parts:
-        master = pd.concat(master_parts, ignore_index=True)
-
-        # natural sort + keep one value per Bank+Period+Element
+    # credit risk: overdue shares recomputed for every bank/quarter in one pass; published shares
+    # that disagree go to rejects.csv
+    credit, rejects = credit_risk_stage(credit_parts)
+    credit = force_master_columns(credit)
+    if not credit.empty:
+        credit = credit.sort_values(["Bank","Period"], kind="stable")
+        format_numeric_for_csv(credit).to_csv(out_dir / "credit_risk.csv", index=False, encoding="utf-8-sig")
+    if rejects.empty:
+        rejects = pd.DataFrame(columns=MASTER_COLS + ["reason"])
+    rejects = rejects.replace({"nan": np.nan, "None": np.nan})
+    format_numeric_for_csv(rejects).to_csv(out_dir / "rejects.csv", index=False, encoding="utf-8-sig")
+    if len(rejects):
+        print(f"[WARN] {len(rejects)} credit row(s) with published shares off the recomputed ones -> {out_dir / 'rejects.csv'}")
+
+    if master_parts or not credit.empty:
+        master = pd.concat(master_parts + ([credit] if not credit.empty else []), ignore_index=True)
+
+        # natural sort + keep one value per Bank+Period+table+Element
         master["__k__"] = master["Element"].astype(str).map(_pad)
         master = master.sort_values(["Bank","Period","__k__"]).drop(columns="__k__")
         master = dedup_master_keep_last_per_element(master)
 
         master_out = format_numeric_for_csv(master)
         master_out.to_csv(master_csv, index=False, encoding="utf-8-sig")
+        if master_xlsx:
+            ensure_dir(str(master_xlsx.parent))
+            write_xlsx(master, master_xlsx, sheet_name="Master")
 
     pd.DataFrame(processed_log).to_csv(out_dir / "processed_log.csv", index=False, encoding="utf-8-sig")
 
@@ -0,0 +1,67 @@
+import math
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# ----------------- Streaming XLSX export -----------------
+# xlsxwriter in constant_memory mode flushes every row to disk as soon as the next
+# one starts, so memory stays flat no matter how many rows the master has.
+# Rows must therefore be written strictly top to bottom.
+
+def _col_kinds(df: pd.DataFrame) -> list[str]:
+    kinds = []
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_bool_dtype(s): kinds.append("bool")
+        elif pd.api.types.is_numeric_dtype(s): kinds.append("num")
+        elif pd.api.types.is_datetime64_any_dtype(s): kinds.append("date")
+        else: kinds.append("str")
+    return kinds
+
+def write_xlsx(df: pd.DataFrame, path, sheet_name: str = "Sheet1", num_format: str = "#,##0.##########") -> str:
+    """Write df to a single-sheet xlsx: typed numeric cells, bold frozen header."""
+    path = str(path)
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_numbers": False})
+    ws = wb.add_worksheet(sheet_name[:31])
+    hdr_fmt = wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+    num_fmt = wb.add_format({"num_format": num_format})
+    # "#,##0.####" leaves a bare decimal point on whole numbers ("1,234."), so those get their own format
+    int_fmt = wb.add_format({"num_format": "#,##0"})
+    date_fmt = wb.add_format({"num_format": "yyyy-mm-dd"})
+
+    cols = [str(c) for c in df.columns]
+    kinds = _col_kinds(df)
+    ws.freeze_panes(1, 0)
+    for j, c in enumerate(cols):
+        ws.set_column(j, j, max(10, min(40, len(c) + 2)))
+        ws.write_string(0, j, c, hdr_fmt)
+
+    # numeric columns as float64 arrays (NaN -> blank), everything else as objects
+    arrays = []
+    for c, k in zip(df.columns, kinds):
+        if k == "num":
+            arrays.append(pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float, na_value=np.nan))
+        else:
+            arrays.append(df[c].to_numpy(dtype=object))
+
+    n = len(df)
+    for i in range(n):
+        r = i + 1
+        for j, k in enumerate(kinds):
+            v = arrays[j][i]
+            if k == "num":
+                if math.isfinite(v): ws.write_number(r, j, v, int_fmt if v.is_integer() else num_fmt)
+            elif v is None or v is pd.NaT or (isinstance(v, float) and math.isnan(v)):
+                continue
+            elif k == "bool":
+                ws.write_boolean(r, j, bool(v))
+            elif k == "date":
+                ws.write_datetime(r, j, pd.Timestamp(v).to_pydatetime(), date_fmt)
+            else:
+                s = str(v)
+                if s and s not in ("nan", "None"): ws.write_string(r, j, s)
+
+    if n:
+        ws.autofilter(0, 0, n, len(cols) - 1)
+    wb.close()
+    return path
@@ -1,15 +1,16 @@
-import os, yaml, pandas as pd, numpy as np
+import os, re, yaml, pandas as pd, numpy as np
 from rapidfuzz import process, fuzz
-from .utils import force_master_columns, apply_bank_period_fallback
+from .utils import (MASTER_COLS, CREDIT_BUCKETS, SHARE_TOLERANCE_PP, force_master_columns,
+                    apply_bank_period_fallback, recompute_credit_shares)
 
-def read_sheet(xls, report_type: str, rules_path: str):
+def read_sheet(xls, report_type: str, rules_path: str, header=0):
     with open(rules_path, "r", encoding="utf-8") as f:
         rules = yaml.safe_load(f) or {}
     kws = [k.lower() for k in (rules.get(report_type, {}).get("sheet_keywords", []) or [])]
     pick = xls.sheet_names[0]
     for s in xls.sheet_names:
         if any(k in s.lower() for k in kws): pick = s; break
-    df = xls.parse(pick, header=0)
+    df = xls.parse(pick, header=header)
     return df
 
 def promote_headers_if_needed(df: pd.DataFrame) -> pd.DataFrame:
@@ -144,31 +145,107 @@ def extract_capital(xls, dict_df, items_map_df, banks_df, filename):
     return force_master_columns(out), pd.DataFrame()
 
 # ---------- Credit Risk (wide) ----------
-def extract_credit(xls, dict_df, banks_df, filename):
-    df = read_sheet(xls, "credit_risk", xls.rules_path)
-    df = promote_headers_if_needed(df)
-    ren = {"Bank":"Bank","Element":"Element","Indicator t":"Indicator table","Indicator table":"Indicator table",
-           "Period":"Period","Total":"Total","31-60 days":"31-60 days","61-90 days":"61-90 days","91+ days":"91+ days",
-           "31-60 days_share%inLP":"31-60 days_share%inLP","61-90 days_share%inLP":"61-90 days_share%inLP",
-           "91+ days_share%inLP":"91+ days_share%inLP"}
-    for k,v in ren.items():
-        if k in df.columns: df = df.rename(columns={k:v})
-    df["Indicator table"] = "Credit Risk"
-    df["FS Line"] = df.get("Element","")
-    df["Item"] = "Loan portfolio"
-    df["Currency"] = np.nan
-    df["Amount vs Share"] = "Amount"
-    df["AZN"] = np.nan
-    keep = ["Bank","Period","Indicator table","Element","AZN","FS Line","Item","Currency","Amount vs Share",
-            "Total","31-60 days","61-90 days","91+ days","31-60 days_share%inLP","61-90 days_share%inLP","91+ days_share%inLP"]
-    if "Sub-element" in df.columns:
-        out = df[["Bank","Period","Indicator table","Element","Sub-element","AZN","FS Line","Item","Currency","Amount vs Share",
-                  "Total","31-60 days","61-90 days","91+ days","31-60 days_share%inLP","61-90 days_share%inLP","91+ days_share%inLP"]].copy()
-    else:
-        out = df[keep].copy()
-        out.insert(4, "Sub-element", np.nan)
-    out = apply_bank_period_fallback(out, filename, banks_df)
-    return force_master_columns(out), pd.DataFrame()
+# The credit_risk workbooks are PDF conversions: a loan-portfolio-quality block whose header
+# spans several rows ("Cəmi" | "Cari" | "Vaxtı keçmiş günlər" over "1-30 gün", "31-60 gün", ...),
+# one row per sector under it, a blank row, then blocks we don't use (collateral split).
+# Overdue buckets from 91 days up are summed into "91+ days"; a header with share/%/payı is a
+# published share of that bucket instead of an amount.
+CREDIT_RANGE_RX = re.compile(r"(\d+)\s*[-–]\s*\(?\d+")
+CREDIT_YEAR_RX  = re.compile(r"\b1\s*il")                  # "1 il və artıq", "1 ildən böyük"
+CREDIT_SHARE_RX = re.compile(r"share|%|pay")
+CREDIT_TOTAL_RX = re.compile(r"^(?:c[əa]mi|cemi|total|yekun)\b")
+
+def credit_buckets(text: pd.DataFrame) -> pd.DataFrame:
+    """Lowercased header text -> '31-60 days' / '61-90 days' / '91+ days' per cell, '' elsewhere
+    ('91-120' and '1 il və artıq' both land in '91+ days')."""
+    lo = text.apply(lambda s: pd.to_numeric(s.str.extract(CREDIT_RANGE_RX, expand=False), errors="coerce"))
+    lo = lo.mask(lo.isna() & text.apply(lambda s: s.str.contains(CREDIT_YEAR_RX)), 366)
+    return pd.DataFrame(np.select([lo.eq(31), lo.eq(61), lo.ge(91)], CREDIT_BUCKETS, ""),
+                        index=text.index, columns=text.columns)
+
+def credit_numbers(col: pd.Series) -> pd.Series:
+    """One column of report cells -> floats. What pd.to_numeric can't read is parsed like
+    etl.normalize_amount, with '-' as zero and a repeated separator as thousands ('2,753,791')."""
+    nums = pd.to_numeric(col, errors="coerce")
+    s = (col.where(nums.isna() & col.notna()).astype(str).str.strip()
+            .str.replace(r"^[-–—]$", "0", regex=True)          # how the reports print a zero
+            .str.replace(r"[−–—]", "-", regex=True)
+            .str.replace(r"^\((.*)\)$", r"-\1", regex=True)     # (42 653) -> -42653
+            .str.replace("[\\s\u00a0\u202f\u2009\u2007\u2060]", "", regex=True))
+    for sep in ",.":
+        s = s.mask(s.str.count(re.escape(sep)) > 1, s.str.replace(sep, "", regex=False))
+    comma_dec = s.str.rfind(",") > s.str.rfind(".")           # right-most separator is the decimal
+    s = s.mask(comma_dec, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    s = s.mask(~comma_dec, s.str.replace(",", "", regex=False))
+    return nums.fillna(pd.to_numeric(s, errors="coerce"))
+
+def read_credit_table(xls, filename, banks_df=None):
+    """Loan-portfolio block of a credit_risk workbook -> master rows (shares not yet recomputed)."""
+    raw = read_sheet(xls, "credit_risk", xls.rules_path, header=None)
+    text = raw.fillna("").astype(str).apply(lambda s: s.str.strip().str.lower())
+    buckets = credit_buckets(text)
+    is_hdr = buckets.eq("31-60 days").any(axis=1).to_numpy()
+    if not is_hdr.any():
+        return pd.DataFrame(columns=MASTER_COLS)
+    hdr = int(np.argmax(is_hdr))
+
+    # columns: first "Cəmi" in the header rows is Total, buckets/shares come from the bucket row
+    top = text.iloc[max(0, hdr - 5):hdr + 1]
+    is_total = top.apply(lambda s: s.str.contains(CREDIT_TOTAL_RX)).any().to_numpy()
+    total_col = int(np.argmax(is_total)) if is_total.any() else None
+    is_share = text.iloc[hdr].str.contains(CREDIT_SHARE_RX).to_numpy()
+    amount_cols, share_cols = {}, {}
+    for j, b in enumerate(buckets.iloc[hdr]):
+        if b and j != total_col:
+            (share_cols if is_share[j] else amount_cols).setdefault(b, []).append(j)
+
+    # sector rows: from the first row with numbers to the next row without any
+    # (a blank line or the title of the collateral block)
+    body = raw.iloc[hdr + 1:]
+    num_cols = sorted({j for cols in (amount_cols, share_cols) for v in cols.values() for j in v}
+                      | ({total_col} if total_col is not None else set()))
+    nums = body.iloc[:, num_cols].apply(credit_numbers)
+    nums.columns = num_cols
+    has_num = nums.notna().any(axis=1).to_numpy()
+    if not has_num.any():
+        return pd.DataFrame(columns=MASTER_COLS)
+    first = int(np.argmax(has_num))
+    stop = first + (int(np.argmax(~has_num[first:])) if (~has_num[first:]).any() else len(has_num) - first)
+    body, nums = body.iloc[first:stop], nums.iloc[first:stop]
+    # sector labels: the first column left of the numbers that has text
+    left = body.iloc[:, :min(num_cols)]
+    has_text = (text.loc[body.index].iloc[:, :min(num_cols)].ne("")
+                & left.apply(lambda s: pd.to_numeric(s, errors="coerce")).isna()).any().to_numpy()
+    label_col = int(np.argmax(has_text)) if has_text.any() else 0
+    keep = body.iloc[:, label_col].notna().to_numpy()
+    body, nums = body[keep], nums[keep]
+    if body.empty:
+        return pd.DataFrame(columns=MASTER_COLS)
+
+    out = pd.DataFrame({"Element": body.iloc[:, label_col].astype(str).str.replace(r"\s+", " ", regex=True)
+                                                   .str.strip(" -:")})
+    out["Total"] = nums[total_col] if total_col is not None else np.nan
+    for b in CREDIT_BUCKETS:
+        for cols, target in ((amount_cols, b), (share_cols, f"{b}_share%inLP")):
+            out[target] = nums[cols[b]].sum(axis=1, min_count=1) if b in cols else np.nan
+    out = out.assign(**{"Indicator table": "Credit Risk", "FS Line": out["Element"],
+                        "Item": "Loan portfolio", "Currency": np.nan,
+                        "Amount vs Share": "Amount", "AZN": np.nan})
+    if banks_df is not None:
+        out = apply_bank_period_fallback(out, filename, banks_df)
+    return force_master_columns(out.reset_index(drop=True))
+
+def extract_credit(xls, dict_df, banks_df, filename, tol=SHARE_TOLERANCE_PP):
+    out, flagged = recompute_credit_shares(read_credit_table(xls, filename, banks_df), tol)
+    return force_master_columns(out), flagged
+
+def credit_risk_stage(parts, tol=SHARE_TOLERANCE_PP):
+    """Recompute shares for many credit frames (all banks/quarters) in one vectorized pass."""
+    parts = [p for p in parts if p is not None and not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=MASTER_COLS), pd.DataFrame()
+    out, flagged = recompute_credit_shares(pd.concat(parts, ignore_index=True), tol)
+    return force_master_columns(out), flagged
 
 # ---------- Currency Risk ----------
 def extract_currency(xls, dict_df, banks_df, filename):
@@ -40,14 +40,23 @@ def force_master_columns(df: pd.DataFrame) -> pd.DataFrame:
     num_cols = ["AZN","Total","31-60 days","61-90 days","91+ days",
                 "31-60 days_share%inLP","61-90 days_share%inLP","91+ days_share%inLP"]
     for c in num_cols:
-        df[c] = pd.to_numeric(
-            df[c].astype(str)
+        # cells that are already numbers pass through; only text gets the separator cleaning
+        # (str(1234.0) would otherwise lose its dot and become 12340)
+        cells = df[c].astype(object)
+        is_text = cells.astype(str).astype(object).eq(cells)   # str cells equal their own str(); numbers, NaN don't
+        numbers = pd.to_numeric(df[c].where(~is_text), errors="coerce")
+        if not is_text.any():
+            df[c] = numbers
+            continue
+        parsed = pd.to_numeric(
+            df[c].where(is_text).astype(str)
                 .str.replace("\u00a0","", regex=False)  # NBSP
                 .str.replace(" ","", regex=False)       # spaces as thousands
                 .str.replace(".","", regex=False)       # dots as thousands
                 .str.replace(",",".", regex=False),     # comma decimals
             errors="coerce"
         )
+        df[c] = parsed.where(is_text, numbers)
     # tidy text
     for c in ["Bank","Period","Indicator table","Element","Sub-element","FS Line","Item","Currency","Amount vs Share"]:
         df[c] = df[c].astype(str).str.strip()
@@ -72,3 +81,47 @@ def apply_bank_period_fallback(df: pd.DataFrame, filename: str, banks_df: pd.Dat
     df["Period"] = df["Period"].astype(str).str.replace("_"," ").str.replace("-"," ")
     df["Period"] = df["Period"].str.replace("Q"," Q", case=False, regex=False).str.replace("  "," ")
     return df
+
+# ---------- Credit risk: overdue buckets vs loan portfolio ----------
+CREDIT_BUCKETS = ["31-60 days","61-90 days","91+ days"]
+CREDIT_SHARES  = [f"{b}_share%inLP" for b in CREDIT_BUCKETS]
+SHARE_TOLERANCE_PP = 0.5   # published vs recomputed share, in percentage points
+
+def recompute_credit_shares(df: pd.DataFrame, tol: float = SHARE_TOLERANCE_PP):
+    """Recompute the *_share%inLP columns from bucket amounts and Total (in %).
+    Works on any number of banks/periods at once. Returns (df, flagged) where
+    flagged holds the rows whose published share is off by more than `tol` pp."""
+    d = df.copy()
+    for c in ["Total"] + CREDIT_BUCKETS + CREDIT_SHARES:
+        if c not in d.columns: d[c] = np.nan
+    amounts = d[CREDIT_BUCKETS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    total = pd.to_numeric(d["Total"], errors="coerce").to_numpy(dtype=float)
+    published = d[CREDIT_SHARES].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    valid = np.isfinite(total) & (total != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = np.where(valid[:, None], amounts / total[:, None] * 100.0, np.nan)
+
+    # banks publish either fractions (0.034) or percents (3.4). Settle the scale per table
+    # (Bank+Period): by which one agrees with the recomputed shares, else fractions when no
+    # published value exceeds 1. Published shares are then in percent before they are compared
+    # or kept, so a column never mixes the two scales.
+    with np.errstate(invalid="ignore"):
+        vote = np.sign(np.abs(published - shares) - np.abs(published * 100.0 - shares))   # +1 -> fraction
+    keys = [c for c in ("Bank", "Period") if c in d.columns]
+    groups = [d[c].astype(str) for c in keys] or np.zeros(len(d), dtype=int)
+    vote = pd.Series(np.nansum(vote, axis=1), index=d.index).groupby(groups).transform("sum")
+    peak = pd.DataFrame(np.abs(published), index=d.index).max(axis=1).groupby(groups).transform("max")
+    fraction = ((vote > 0) | ((vote == 0) & (peak <= 1))).to_numpy()
+    published_pct = np.where(fraction[:, None], published * 100.0, published)
+
+    dev = np.abs(published_pct - shares)
+    bad = np.isfinite(dev) & (dev > tol)
+
+    d[CREDIT_SHARES] = np.where(np.isfinite(shares), shares, published_pct)
+    flagged = d.loc[bad.any(axis=1)].copy()
+    if not flagged.empty:
+        for i, c in enumerate(CREDIT_SHARES):
+            flagged[f"{c}_published"] = published[bad.any(axis=1), i]
+        flagged["reason"] = "share deviation > %.2f pp" % tol
+    return d, flagged
@@ -1,17 +1,20 @@
 # -*- coding: utf-8 -*-
 import os
 import re
-import time
-import requests
 import unidecode
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+import file_catalog
+from fetch import download_job, fetch_all, fetched, batch_summary
+from waits import site_timeout, wait_present, wait_dom_quiet, arm_dom_watch, scroll_until_stable
 from bs4 import BeautifulSoup
 from collections import defaultdict
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
 
 BASE_URL = "https://abb-bank.az/az/hesabatlar"
 RAW_DATA_DIR = os.path.join("raw_data", "abb_bank")
+WAIT = site_timeout("abb_bank")
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 
 # ---- RANGE: 2020 Q1 -> open-ended future ----
@@ -156,199 +159,223 @@ def detect_report_type(context_norm: str):
     return None
 
 # --- DOM helpers ---
-def find_section_body_for_header(header_el):
-    """Walk forward siblings until the body (class contains 'ac-a') or next header."""
-    siblings = header_el.find_elements(By.XPATH, "following-sibling::*")
-    for sib in siblings:
-        cls = (sib.get_attribute("class") or "").lower()
-        tag = sib.tag_name.lower()
+# every header gets clicked in one script call; bodies stay in the DOM even if a single-open
+# accordion collapses them again, and the page is then parsed once for all sections
+_EXPAND_ALL_JS = """
+var n = 0;
+document.querySelectorAll('h4.ac-q').forEach(function (h) {
+    if (h.getAttribute('aria-expanded') !== 'true') { h.click(); n++; }
+});
+return n;
+"""
+
+def expand_all_sections(driver):
+    arm_dom_watch(driver)
+    clicked = driver.execute_script(_EXPAND_ALL_JS) or 0
+    if clicked:
+        wait_dom_quiet(driver, timeout=WAIT)
+    return clicked
+
+def section_body_soup(header):
+    """Body of an h4.ac-q section: the next sibling with class ac-a before the next header."""
+    for sib in header.find_next_siblings():
+        cls = " ".join(sib.get("class") or []).lower()
         if "ac-a" in cls:
             return sib
-        if tag == "h4" and "ac-q" in cls:
+        if sib.name == "h4" and "ac-q" in cls:
             break
     return None
 
-def pull_pdf_links_from_section_html(section_html: str):
-    """Return list[(href, context_text)] for each .pdf inside a section body."""
-    soup = BeautifulSoup(section_html, "html.parser")
-    out = []
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
-        if not href.lower().endswith(".pdf"):
+def pull_pdf_links(body):
+    """Return list[(href, context_text)] for each .pdf inside a section body.
+    Context is the longest text among the link and its next 6 ancestors (within the body).
+    Text lengths for the whole body come from one pass over its strings instead of a
+    get_text() per ancestor per link; only the winning nodes are rendered, once each."""
+    links = [a for a in body.find_all("a", href=True) if a["href"].strip().lower().endswith(".pdf")]
+    if not links:
+        return []
+    # id(node) -> [chars, strings] of node.get_text(" ", strip=True)
+    sizes = {}
+    for s in body.strings:
+        n = len(s.strip())
+        if not n:
             continue
-        # context: prefer outer card text, else link text
-        parent = a
-        context = ""
-        hops = 0
-        while parent and hops < 7:
-            text = parent.get_text(" ", strip=True) or ""
-            # take the longest reasonable text chunk
-            if len(text) > len(context):
-                context = text
-            parent = parent.parent
+        node = s.parent
+        while node is not None:
+            acc = sizes.setdefault(id(node), [0, 0])
+            acc[0] += n
+            acc[1] += 1
+            if node is body:
+                break
+            node = node.parent
+    rendered = {}
+    out = []
+    for a in links:
+        best, best_len = None, 0
+        node, hops = a, 0
+        while node is not None and hops < 7:
+            chars, count = sizes.get(id(node), (0, 0))
+            length = chars + count - 1 if count else 0
+            if length > best_len:
+                best, best_len = node, length
+            if node is body:
+                break
+            node = node.parent
             hops += 1
-        if not context:
+        if best is None:
             context = a.get_text(" ", strip=True)
-        out.append((href, context))
+        else:
+            if id(best) not in rendered:
+                rendered[id(best)] = best.get_text(" ", strip=True)
+            context = rendered[id(best)]
+        out.append((a["href"].strip(), context))
     return out
 
-def main():
+def harvest_sections(soup):
+    """Entries from every h4.ac-q section of one parsed listing page."""
+    headers = soup.select("h4.ac-q")
+    print(f"Found {len(headers)} report sections.")
+    entries = []
+    for i, h in enumerate(headers, 1):
+        print(f"\n[{i}] header: {text_of(h)}")
+        body = section_body_soup(h)
+        if body is None:
+            print(f"    [WARN] no section body found.")
+            continue
+        items = pull_pdf_links(body)
+        print(f"    links: {len(items)} PDF(s)")
+        entries += section_entries(items)
+    return entries
+
+def section_entries(items):
+    """[(href, context text), ...] from one section -> entries for the canonical types."""
+    entries = []
+    for href, context in items:
+        if href.startswith("/"):
+            href = "https://abb-bank.az" + href
+
+        # try parse period
+        year, quarter = extract_year_quarter(context)
+        if (year is None) or (quarter is None):
+            # parse from filename if needed
+            fn_norm = normalize(os.path.basename(href))
+            y = re.search(r"(20\d{2})", fn_norm)
+            if y and not year:
+                year = int(y.group(1))
+            r = re.search(r"\b(i{1,3}v?)\b", fn_norm)
+            if r and not quarter:
+                quarter = ROMAN_TO_Q.get(r.group(1).upper())
+            if not quarter:
+                if re.search(r"[_-]3\b", fn_norm): quarter = "Q1"
+                elif re.search(r"[_-]6\b", fn_norm): quarter = "Q2"
+                elif re.search(r"[_-]9\b", fn_norm): quarter = "Q3"
+                elif re.search(r"[_-]12\b", fn_norm): quarter = "Q4"
+
+        if (year is None) or (quarter is None):
+            print(f"      [SKIP] no year/quarter -> {context[:120]} ...")
+            continue
+
+        if year < MIN_YEAR or not in_upper_bound(year, quarter):
+            print(f"      [SKIP] outside lower bound: {year} {quarter}")
+            continue
+
+        # Decide the exact type from the link text itself
+        context_norm = normalize(context)
+        rtype = detect_report_type(context_norm)
+
+        if rtype not in CORE_REPORTS:
+            # Explicitly refuse to save interest rate risk or generic 'risk reports'
+            # or cash flow etc.
+            # Uncomment the next line to debug what we skipped:
+            # print(f"      [SKIP] not in CORE_REPORTS -> {context[:120]} ...")
+            continue
+        entries.append({"rtype": rtype, "year": year, "quarter": quarter, "url": href})
+    return entries
+
+def discover_http(session):
+    # every section body is in the markup, just collapsed
+    return harvest_sections(get_soup(session, BASE_URL)) or None
+
+def discover_browser(session):
     # --- Selenium (uc) to load the hub and get session cookies ---
-    options = uc.ChromeOptions()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-gpu")
-    driver = uc.Chrome(options=options)
-    driver.get(BASE_URL)
-    time.sleep(2)
-
-    # best-effort: accept cookies / close overlays
+    driver = open_tab("abb_bank")
     try:
-        for xp in [
-            "//button[contains(.,'Qəbul et')]",
-            "//button[contains(.,'Accept')]",
-            "//button[contains(.,'Bağla')]",
-        ]:
-            els = driver.find_elements(By.XPATH, xp)
-            if els:
-                els[0].click()
-                time.sleep(0.7)
-                break
-    except Exception:
-        pass
+        driver.get(BASE_URL)
+        wait_present(driver, (By.CSS_SELECTOR, "h4.ac-q"), timeout=WAIT)
 
-    # click "Digər hesabatlar" to reveal more blocks
-    try:
-        other = driver.find_element(By.XPATH, "//span[contains(.,'Digər hesabatlar') or contains(.,'Diger hesabatlar')]")
-        other.click()
-        time.sleep(1.2)
-    except Exception:
-        pass
+        # best-effort: accept cookies / close overlays
+        try:
+            for xp in [
+                "//button[contains(.,'Qəbul et')]",
+                "//button[contains(.,'Accept')]",
+                "//button[contains(.,'Bağla')]",
+            ]:
+                els = driver.find_elements(By.XPATH, xp)
+                if els:
+                    arm_dom_watch(driver)
+                    els[0].click()
+                    wait_dom_quiet(driver, timeout=WAIT)
+                    break
+        except Exception:
+            pass
 
-    # Scroll to mount everything
-    try:
-        last_h = 0
-        for _ in range(8):
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(0.6)
-            h = driver.execute_script("return document.body.scrollHeight;")
-            if h == last_h:
-                break
-            last_h = h
-    except Exception:
-        pass
-
-    # mirror cookies to requests for faster, reliable PDF download
-    session = requests.Session()
-    session.headers.update({
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML like Gecko) Chrome/124 Safari/537.36",
-        "Referer": BASE_URL,
-    })
-    for c in driver.get_cookies():
-        session.cookies.set(c["name"], c["value"])
-
-    headers = driver.find_elements(By.CSS_SELECTOR, "h4.ac-q")
-    print(f"Found {len(headers)} report sections.")
+        # click "Digər hesabatlar" to reveal more blocks
+        try:
+            other = driver.find_element(By.XPATH, "//span[contains(.,'Digər hesabatlar') or contains(.,'Diger hesabatlar')]")
+            arm_dom_watch(driver)
+            other.click()
+            wait_dom_quiet(driver, timeout=WAIT)
+        except Exception:
+            pass
 
-    quarter_files = defaultdict(set)
-    total_new = 0
+        # Scroll to mount everything
+        try:
+            scroll_until_stable(driver, max_rounds=8, timeout=WAIT)
+        except Exception:
+            pass
 
-    for i, h in enumerate(headers, 1):
-        title_raw = (h.text or "").strip()
-        print(f"\n[{i}] header: {title_raw}")
+        # mirror cookies to requests for faster, reliable PDF download
+        import_browser_cookies(session, driver)
 
         # Always expand — regardless of header text
         try:
-            if h.get_attribute("aria-expanded") in (None, "false"):
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", h)
-                ActionChains(driver).move_to_element(h).perform()
-                h.click()
-                time.sleep(0.9)
+            expand_all_sections(driver)
         except Exception:
             pass
+        return harvest_sections(BeautifulSoup(driver.page_source, "html.parser"))
+    finally:
+        release_tab(driver)
 
-        body = find_section_body_for_header(h)
-        if not body:
-            print(f"    [WARN] no section body found.")
-            continue
-
-        items = pull_pdf_links_from_section_html(body.get_attribute("innerHTML") or "")
-        print(f"    links: {len(items)} PDF(s)")
+def main():
+    session = new_session(referer=BASE_URL)
+    file_catalog.sync(["abb_bank"])
+    entries = discover("abb_bank", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=BASE_URL)
 
-        for href, context in items:
-            if href.startswith("/"):
-                href = "https://abb-bank.az" + href
-
-            # try parse period
-            year, quarter = extract_year_quarter(context)
-            if (year is None) or (quarter is None):
-                # parse from filename if needed
-                fn_norm = normalize(os.path.basename(href))
-                y = re.search(r"(20\d{2})", fn_norm)
-                if y and not year:
-                    year = int(y.group(1))
-                r = re.search(r"\b(i{1,3}v?)\b", fn_norm)
-                if r and not quarter:
-                    quarter = ROMAN_TO_Q.get(r.group(1).upper())
-                if not quarter:
-                    if re.search(r"[_-]3\b", fn_norm): quarter = "Q1"
-                    elif re.search(r"[_-]6\b", fn_norm): quarter = "Q2"
-                    elif re.search(r"[_-]9\b", fn_norm): quarter = "Q3"
-                    elif re.search(r"[_-]12\b", fn_norm): quarter = "Q4"
-
-            if (year is None) or (quarter is None):
-                print(f"      [SKIP] no year/quarter -> {context[:120]} ...")
-                continue
-
-            if year < MIN_YEAR or not in_upper_bound(year, quarter):
-                print(f"      [SKIP] outside lower bound: {year} {quarter}")
-                continue
-
-            # Decide the exact type from the link text itself
-            context_norm = normalize(context)
-            rtype = detect_report_type(context_norm)
-
-            if rtype not in CORE_REPORTS:
-                # Explicitly refuse to save interest rate risk or generic 'risk reports'
-                # or cash flow etc.
-                # Uncomment the next line to debug what we skipped:
-                # print(f"      [SKIP] not in CORE_REPORTS -> {context[:120]} ...")
-                continue
-
-            period, pdir = ensure_period_dir(year, quarter)
-            save_name = f"{rtype}_{year}_{quarter}.pdf"
-            if already_downloaded(period, save_name):
-                quarter_files[period].add(rtype)
-                continue
-
-            try:
-                print(f"      ↓ {period}/{save_name}")
-                dr = session.get(href, timeout=50, allow_redirects=True)
-                ok_pdf = (dr.status_code == 200 and (
-                    dr.content.startswith(b"%PDF") or
-                    "application/pdf" in (dr.headers.get("Content-Type","").lower())
-                ))
-                if ok_pdf:
-                    with open(os.path.join(pdir, save_name), "wb") as f:
-                        f.write(dr.content)
-                    total_new += 1
-                    quarter_files[period].add(rtype)
-                else:
-                    print(f"        [WARN] not a PDF or HTTP {dr.status_code}: {href}")
-            except Exception as e:
-                print(f"        [ERR] {e}")
-
-    driver.quit()
+    quarter_files = defaultdict(set)
+    jobs = []
+    for e in entries:
+        rtype, year, quarter, href = e["rtype"], e["year"], e["quarter"], e["url"]
+        period, pdir = ensure_period_dir(year, quarter)
+        save_name = f"{rtype}_{year}_{quarter}.pdf"
+        recheck = already_downloaded(period, save_name)
+        if recheck:
+            quarter_files[period].add(rtype)
+        else:
+            print(f"      ↓ {period}/{save_name}")
+        jobs.append(download_job(href, os.path.join(pdir, save_name), "pdf", f"{period}/{save_name}",
+                                 content_types=("application/pdf",), period=period, rtype=rtype,
+                                 recheck=recheck))
+
+    print(f"\nDownloading {batch_summary(jobs)}...")
+    done = fetched(fetch_all(session, jobs, bank="abb_bank"))
+    for job in done:
+        quarter_files[job["period"]].add(job["rtype"])
+    total_new = len(done)
 
     # include any preexisting files in the summary
-    for sub in os.listdir(RAW_DATA_DIR):
-        p = os.path.join(RAW_DATA_DIR, sub)
-        if not os.path.isdir(p):
-            continue
-        for fname in os.listdir(p):
-            m = re.match(r"([a-z_]+)_(20\d{2})_(Q[1-4])\.pdf$", fname)
-            if m:
-                quarter_files[sub].add(m.group(1))
+    for period, types in file_catalog.report_types("abb_bank", root="raw_data", ext=".pdf").items():
+        quarter_files[period] |= types
 
     print("\n=== SUMMARY OF MISSING REPORTS PER QUARTER (>= {0}) ===".format(MIN_YEAR))
     for quarter in sorted(quarter_files.keys()):
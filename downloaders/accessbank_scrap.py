@@ -1,14 +1,17 @@
 import os
-import time
 import re
-import requests
 import unidecode
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover
+from http_client import new_session, import_browser_cookies
+from fetch import download_job, fetch_all, fetched, kind_for, report_line, batch_summary
+from waits import site_timeout, wait_present, wait_count_stable, click_and_settle, scroll_until_stable
 from selenium.webdriver.common.by import By
 
 BASE_URL = "https://www.accessbank.az/az/our-bank/in-figures/"
 RAW_DATA_DIR = os.path.join("raw_data", "access_bank")
 PROCESSED_DATA_DIR = os.path.join("processed_data", "access_bank")
+WAIT = site_timeout("access_bank")
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
 
@@ -52,155 +55,106 @@ def file_exists(folder, report_type, yyyy, quarter, ext_list):
     return False
 
 def safe_click(driver, elem, header_offset=120):
-    driver.execute_script(
-        "window.scrollTo(0, arguments[0].getBoundingClientRect().top + window.scrollY - arguments[1]);",
-        elem, header_offset
-    )
-    time.sleep(0.3)
-    driver.execute_script("arguments[0].click();", elem)
-    time.sleep(1.2)
-
-def scroll_inner_panel_until_loaded(panel):
-    last_html = ""
-    for _ in range(30):
-        driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", panel)
-        time.sleep(1.1)
-        new_html = panel.get_attribute('innerHTML')
-        if new_html == last_html:
-            break
-        last_html = new_html
+    click_and_settle(driver, elem, header_offset=header_offset, timeout=WAIT)
+
+def scroll_inner_panel_until_loaded(driver, panel):
+    # lazy list: keep scrolling while new documents get appended
+    scroll_until_stable(driver, panel, max_rounds=30, timeout=WAIT)
+    wait_count_stable(driver, (By.CSS_SELECTOR, "a.link_document"), root=panel, timeout=WAIT)
+
+def link_entry(href, label, report_type):
+    ext = os.path.splitext((href or "").split('?')[0])[1].lower()
+    if not href or ext not in VALID_EXTENSIONS:
+        return None
+    yyyy, quarter = get_year_quarter(label)
+    if not yyyy or not quarter:
+        return None
+    url = href if href.startswith("http") else "https://www.accessbank.az" + href
+    return {"rtype": report_type, "year": yyyy, "quarter": quarter, "ext": ext, "url": url}
+
+def discover_browser(session, report):
+    """Entries for every core and risk report link (browser only: the risk panel is lazy-loaded)."""
+    entries = []
+    driver = open_tab("access_bank")
+    try:
+        driver.get(BASE_URL)
+        wait_present(driver, (By.CSS_SELECTOR, "div.faq__question"), timeout=WAIT)
 
-def main():
-    report = []
-    total_downloaded = 0
-    available_year_quarters = set()
+        import_browser_cookies(session, driver)
 
-    options = uc.ChromeOptions()
-    driver = uc.Chrome(options=options)
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver.get(BASE_URL)
-    time.sleep(4)
-
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], cookie['value'])
-    headers = {"User-Agent": "Mozilla/5.0", "Referer": BASE_URL}
-
-    # 1. Download all core (non-risk) files
-    for az_title, section_en in SECTION_MAP.items():
-        try:
-            qlink = driver.find_element(By.XPATH, f"//div[contains(@class, 'faq__question') and contains(., '{az_title}')]")
-            safe_click(driver, qlink)
-            time.sleep(1.0)
-            doc_blocks = driver.find_elements(By.CSS_SELECTOR, "div.faq__document-group-wr")
-            for block in doc_blocks:
-                try:
-                    year_el = block.find_element(By.CSS_SELECTOR, "b.faq__answer__subtitle")
-                    block_year = year_el.text.strip()
-                    if not (block_year.isdigit() and int(block_year) >= 2020):
-                        continue
-                except Exception:
-                    continue
-                doc_links = block.find_elements(By.CSS_SELECTOR, "a.link_document")
-                for link in doc_links:
-                    href = link.get_attribute("href")
-                    label = link.text.strip()
-                    ext = os.path.splitext(href.split('?')[0])[1].lower()
-                    if not href or ext not in VALID_EXTENSIONS:
-                        continue
-                    yyyy, quarter = get_year_quarter(label)
-                    if not yyyy or not quarter:
-                        continue
-                    available_year_quarters.add((yyyy, quarter))
-                    report_type = section_en
-                    save_name = f"{report_type}_{yyyy}_{quarter}{ext}"
-                    subfolder = f"{yyyy}_{quarter}"
-                    period_dir = os.path.join(RAW_DATA_DIR if ext == ".pdf" else PROCESSED_DATA_DIR, subfolder)
-                    os.makedirs(period_dir, exist_ok=True)
-                    fpath = os.path.join(period_dir, save_name)
-                    # No cross-folder check! Just check in the relevant folder
-                    if ext == ".pdf" and file_exists(RAW_DATA_DIR, report_type, yyyy, quarter, [".pdf"]):
-                        report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                        continue
-                    if ext in [".xlsx", ".xls"] and file_exists(PROCESSED_DATA_DIR, report_type, yyyy, quarter, [".xlsx", ".xls"]):
-                        report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                        continue
-                    url = href if href.startswith("http") else "https://www.accessbank.az" + href
-                    print(f"    Downloading: {subfolder}/{save_name}")
+        # 1. All core (non-risk) files
+        for az_title, section_en in SECTION_MAP.items():
+            try:
+                qlink = driver.find_element(By.XPATH, f"//div[contains(@class, 'faq__question') and contains(., '{az_title}')]")
+                safe_click(driver, qlink)
+                doc_blocks = driver.find_elements(By.CSS_SELECTOR, "div.faq__document-group-wr")
+                for block in doc_blocks:
                     try:
-                        r = session.get(url, headers=headers, timeout=25)
-                        if ext == ".pdf" and not r.content.startswith(b'%PDF-'):
-                            report.append(f"[SKIP_CORRUPT] {subfolder}/{save_name}")
-                            continue
-                        if ext in [".xlsx", ".xls"] and r.content[:2] != b'PK':
-                            report.append(f"[SKIP_CORRUPT] {subfolder}/{save_name}")
+                        year_el = block.find_element(By.CSS_SELECTOR, "b.faq__answer__subtitle")
+                        block_year = year_el.text.strip()
+                        if not (block_year.isdigit() and int(block_year) >= 2020):
                             continue
-                        with open(fpath, "wb") as out:
-                            out.write(r.content)
-                        report.append(f"[OK] {subfolder}/{save_name}")
-                        total_downloaded += 1
-                    except Exception as e:
-                        report.append(f"[ERROR] {subfolder}/{save_name}: {e}")
+                    except Exception:
+                        continue
+                    for link in block.find_elements(By.CSS_SELECTOR, "a.link_document"):
+                        e = link_entry(link.get_attribute("href"), link.text.strip(), section_en)
+                        if e:
+                            entries.append(e)
+            except Exception as e:
+                report.append(f"[MISSING_ON_SITE] {section_en}: {e}")
+
+        # 2. ALL risk reports, by scrolling the right panel!
+        try:
+            risk_qlink = driver.find_element(By.XPATH, "//div[contains(@class, 'faq__question') and contains(., 'Risklərin İdarə Edilməsi')]")
+            safe_click(driver, risk_qlink)
+            panel = driver.find_element(By.XPATH, "//div[contains(@class, 'faq__answer') and .//b[contains(., 'Risklərin İdarə Edilməsi')]]/following-sibling::div")
+            scroll_inner_panel_until_loaded(driver, panel)
+            for link in panel.find_elements(By.CSS_SELECTOR, "a.link_document"):
+                label = link.text.strip()
+                report_type = next((en for az, en in RISK_REPORTS_AZ_TO_EN.items() if az in label), None)
+                e = link_entry(link.get_attribute("href"), label, report_type)
+                if e and report_type:
+                    entries.append(e)
         except Exception as e:
-            report.append(f"[MISSING_ON_SITE] {section_en}: {e}")
+            report.append(f"[MISSING_ON_SITE] risk_reports: {e}")
+        return entries
+    finally:
+        release_tab(driver)
 
-    # 2. Download ALL risk reports by scrolling the right panel!
-    try:
-        risk_qlink = driver.find_element(By.XPATH, "//div[contains(@class, 'faq__question') and contains(., 'Risklərin İdarə Edilməsi')]")
-        safe_click(driver, risk_qlink)
-        time.sleep(1.5)
-        panel = driver.find_element(By.XPATH, "//div[contains(@class, 'faq__answer') and .//b[contains(., 'Risklərin İdarə Edilməsi')]]/following-sibling::div")
-        scroll_inner_panel_until_loaded(panel)
-        time.sleep(2)
-        links = panel.find_elements(By.CSS_SELECTOR, "a.link_document")
-        for link in links:
-            href = link.get_attribute("href")
-            label = link.text.strip()
-            ext = os.path.splitext(href.split('?')[0])[1].lower()
-            if not href or ext not in VALID_EXTENSIONS:
-                continue
-            yyyy, quarter = get_year_quarter(label)
-            if not yyyy or not quarter:
-                continue
-            available_year_quarters.add((yyyy, quarter))
-            report_type = None
-            for az_risk, en_risk in RISK_REPORTS_AZ_TO_EN.items():
-                if az_risk in label:
-                    report_type = en_risk
-                    break
-            if not report_type:
-                continue
-            save_name = f"{report_type}_{yyyy}_{quarter}{ext}"
-            subfolder = f"{yyyy}_{quarter}"
-            period_dir = os.path.join(RAW_DATA_DIR if ext == ".pdf" else PROCESSED_DATA_DIR, subfolder)
-            os.makedirs(period_dir, exist_ok=True)
-            fpath = os.path.join(period_dir, save_name)
-            if ext == ".pdf" and file_exists(RAW_DATA_DIR, report_type, yyyy, quarter, [".pdf"]):
-                report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                continue
-            if ext in [".xlsx", ".xls"] and file_exists(PROCESSED_DATA_DIR, report_type, yyyy, quarter, [".xlsx", ".xls"]):
-                report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                continue
-            url = href if href.startswith("http") else "https://www.accessbank.az" + href
-            print(f"    Downloading: {subfolder}/{save_name}")
-            try:
-                r = session.get(url, headers=headers, timeout=25)
-                if ext == ".pdf" and not r.content.startswith(b'%PDF-'):
-                    report.append(f"[SKIP_CORRUPT] {subfolder}/{save_name}")
-                    continue
-                if ext in [".xlsx", ".xls"] and r.content[:2] != b'PK':
-                    report.append(f"[SKIP_CORRUPT] {subfolder}/{save_name}")
-                    continue
-                with open(fpath, "wb") as out:
-                    out.write(r.content)
-                report.append(f"[OK] {subfolder}/{save_name}")
-                total_downloaded += 1
-            except Exception as e:
-                report.append(f"[ERROR] {subfolder}/{save_name}: {e}")
-    except Exception as e:
-        report.append(f"[MISSING_ON_SITE] risk_reports: {e}")
+def main():
+    report = []
+    jobs = []
+    available_year_quarters = set()
+
+    session = new_session(referer=BASE_URL)
+    entries = discover("access_bank", None, lambda: discover_browser(session, report),
+                       session=session, listing=BASE_URL)
+
+    for e in entries:
+        report_type, yyyy, quarter, ext, url = e["rtype"], e["year"], e["quarter"], e["ext"], e["url"]
+        available_year_quarters.add((yyyy, quarter))
+        save_name = f"{report_type}_{yyyy}_{quarter}{ext}"
+        subfolder = f"{yyyy}_{quarter}"
+        period_dir = os.path.join(RAW_DATA_DIR if ext == ".pdf" else PROCESSED_DATA_DIR, subfolder)
+        os.makedirs(period_dir, exist_ok=True)
+        fpath = os.path.join(period_dir, save_name)
+        # No cross-folder check! Just check in the relevant folder
+        recheck = os.path.exists(fpath)   # same name on disk: re-check it against the site
+        if not recheck and ext == ".pdf" and file_exists(RAW_DATA_DIR, report_type, yyyy, quarter, [".pdf"]):
+            report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
+            continue
+        if not recheck and ext in [".xlsx", ".xls"] and file_exists(PROCESSED_DATA_DIR, report_type, yyyy, quarter, [".xlsx", ".xls"]):
+            report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
+            continue
+        if not recheck:
+            print(f"    Queued: {subfolder}/{save_name}")
+        jobs.append(download_job(url, fpath, kind_for(fpath), f"{subfolder}/{save_name}", recheck=recheck))
+
+    # 3. Fetch everything queued above in parallel
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="access_bank"):
+        report.append(report_line(job))
+    total_downloaded = len(fetched(jobs))
 
     print("\n=== FULL ACCESSBANK REPORT ===")
     for line in report:
@@ -221,7 +175,6 @@ def main():
 
     print(f"\nDone.\nAll PDFs in raw_data/access_bank/<year>_<quarter>/, Excels in processed_data/access_bank/<year>_<quarter>/")
     print(f"Total files downloaded: {total_downloaded}")
-    driver.quit()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
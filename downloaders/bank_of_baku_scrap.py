@@ -1,15 +1,19 @@
 import os
-import time
 import re
-import requests
 from datetime import datetime
+from urllib.parse import urljoin
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+from fetch import download_job, fetch_all, fetched, report_line, batch_summary
+from waits import site_timeout, wait_present, click_and_settle
 
 BASE_URL = "https://www.bankofbaku.com/en/about-the-bank/reports/quarterly-reports"
 PROCESSED_DATA_DIR = os.path.join("processed_data", "bank_of_baku")
+WAIT = site_timeout("bank_of_baku")
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
 
 REPORT_TYPES = {
@@ -43,13 +47,7 @@ def extract_year(text):
     return int(m.group(1)) if m else None
 
 def scroll_and_click(driver, el):
-    driver.execute_script("""
-        arguments[0].scrollIntoView({block: 'center'});
-        window.scrollBy(0, -100);
-    """, el)
-    time.sleep(0.6)
-    driver.execute_script("arguments[0].click();", el)
-    time.sleep(1.2)
+    click_and_settle(driver, el, timeout=WAIT)
 
 def file_exists_anywhere(report_type, year, quarter):
     period = f"{year}_{quarter}"
@@ -57,83 +55,110 @@ def file_exists_anywhere(report_type, year, quarter):
     folder = os.path.join(PROCESSED_DATA_DIR, period)
     return os.path.exists(os.path.join(folder, fname))
 
-def main():
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver = uc.Chrome(options=options)
-    wait = WebDriverWait(driver, 10)
-    driver.get(BASE_URL)
-    print("[DEBUG] Loaded Bank of Baku page")
-    time.sleep(2.5)
-
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], cookie['value'])
-    headers = {"User-Agent": "Mozilla/5.0", "Referer": BASE_URL}
-
-    report = []
-    total_downloaded = 0
-    all_year_quarters = set()
+def link_entry(internal_name, year, href, span_text):
+    quarter = normalize_quarter_label(span_text)
+    if not href or not quarter:
+        return None
+    return {"rtype": internal_name, "year": year, "quarter": quarter, "url": href}
 
+def discover_http(session, report):
+    # the nested section/year accordions are all in the markup, just collapsed
+    soup = get_soup(session, BASE_URL)
+    notes, entries = [], []
     for display_name, internal_name in REPORT_TYPES.items():
-        try:
-            section_btn = wait.until(EC.element_to_be_clickable((
-                By.XPATH, f"//h2[contains(@class, 'accordion__header') and contains(., '{display_name}')]")))
-            scroll_and_click(driver, section_btn)
-            print(f"[INFO] Opened section: {display_name}")
-        except Exception as e:
-            report.append(f"[MISSING] {display_name} section not found: {e}")
+        section = next((h for h in soup.select("h2.accordion__header") if display_name in text_of(h)), None)
+        body = section.find_next_sibling("div") if section else None
+        if body is None:
+            notes.append(f"[MISSING] {display_name} section not found")
             continue
-
-        year_headers = driver.find_elements(By.XPATH,
-            f"//h2[contains(., '{display_name}')]/following-sibling::div//h2[contains(@class, 'accordion__header')]")
-        print(f"[DEBUG] Found {len(year_headers)} years in {display_name}")
-
-        for year_header in year_headers:
+        for year_header in body.select("h2.accordion__header"):
+            year = extract_year(text_of(year_header))
+            if not year or year not in YEAR_RANGE:
+                continue
+            accordion = year_header.find_next_sibling(
+                lambda t: t.name == "div" and "accordion__main" in (t.get("class") or []))
+            if accordion is None:
+                continue
+            for a in accordion.select("a[href*=storage]"):
+                e = link_entry(internal_name, year, urljoin(BASE_URL, a["href"]), text_of(a.find("span")))
+                if e:
+                    entries.append(e)
+    if entries:
+        report.extend(notes)
+    return entries or None
+
+def discover_browser(session, report):
+    driver = open_tab("bank_of_baku")
+    try:
+        wait = WebDriverWait(driver, WAIT)
+        driver.get(BASE_URL)
+        wait_present(driver, (By.CSS_SELECTOR, "h2.accordion__header"), timeout=WAIT)
+        print("[DEBUG] Loaded Bank of Baku page")
+
+        import_browser_cookies(session, driver)
+
+        entries = []
+        for display_name, internal_name in REPORT_TYPES.items():
             try:
-                year_text = year_header.text.strip()
-                year = extract_year(year_text)
-                if not year or year not in YEAR_RANGE:
-                    continue
-
-                scroll_and_click(driver, year_header)
-                print(f"  [INFO] Opened year {year}")
+                section_btn = wait.until(EC.element_to_be_clickable((
+                    By.XPATH, f"//h2[contains(@class, 'accordion__header') and contains(., '{display_name}')]")))
+                scroll_and_click(driver, section_btn)
+                print(f"[INFO] Opened section: {display_name}")
+            except Exception as e:
+                report.append(f"[MISSING] {display_name} section not found: {e}")
+                continue
 
-                accordion = year_header.find_element(By.XPATH, "./following-sibling::div[contains(@class, 'accordion__main')]")
-                links = accordion.find_elements(By.XPATH, ".//a[contains(@href, 'storage')]")
+            year_headers = driver.find_elements(By.XPATH,
+                f"//h2[contains(., '{display_name}')]/following-sibling::div//h2[contains(@class, 'accordion__header')]")
+            print(f"[DEBUG] Found {len(year_headers)} years in {display_name}")
 
-                for a in links:
-                    href = a.get_attribute("href")
-                    span = a.find_element(By.TAG_NAME, "span").text.strip()
-                    quarter = normalize_quarter_label(span)
-                    if not href or not quarter:
-                        continue
-                    period = f"{year}_{quarter}"
-                    all_year_quarters.add((year, quarter))
-                    folder = os.path.join(PROCESSED_DATA_DIR, period)
-                    os.makedirs(folder, exist_ok=True)
-                    fname = f"bank_of_baku_{internal_name}_{year}_{quarter}.xlsx"
-                    fpath = os.path.join(folder, fname)
-                    if os.path.exists(fpath):
-                        report.append(f"[SKIP] Already exists: {period}/{fname}")
+            for year_header in year_headers:
+                try:
+                    year_text = year_header.text.strip()
+                    year = extract_year(year_text)
+                    if not year or year not in YEAR_RANGE:
                         continue
 
-                    try:
-                        r = session.get(href, headers=headers, timeout=20)
-                        if r.status_code == 200 and r.content[:2] == b'PK':
-                            with open(fpath, "wb") as out:
-                                out.write(r.content)
-                            report.append(f"[OK] {fname}")
-                            total_downloaded += 1
-                        else:
-                            report.append(f"[ERROR] {fname} failed (status {r.status_code})")
-                    except Exception as e:
-                        report.append(f"[ERROR] {fname}: {e}")
-            except Exception as e:
-                report.append(f"[ERROR] Year block in {display_name} failed: {e}")
-                continue
+                    scroll_and_click(driver, year_header)
+                    print(f"  [INFO] Opened year {year}")
+
+                    accordion = year_header.find_element(By.XPATH, "./following-sibling::div[contains(@class, 'accordion__main')]")
+                    for a in accordion.find_elements(By.XPATH, ".//a[contains(@href, 'storage')]"):
+                        e = link_entry(internal_name, year, a.get_attribute("href"),
+                                       a.find_element(By.TAG_NAME, "span").text.strip())
+                        if e:
+                            entries.append(e)
+                except Exception as e:
+                    report.append(f"[ERROR] Year block in {display_name} failed: {e}")
+                    continue
+        return entries
+    finally:
+        release_tab(driver)
+
+def main():
+    session = new_session(referer=BASE_URL)
+
+    report = []
+    jobs = []
+    all_year_quarters = set()
+    entries = discover("bank_of_baku", lambda: discover_http(session, report),
+                       lambda: discover_browser(session, report),
+                       session=session, listing=BASE_URL)
+
+    for e in entries:
+        internal_name, year, quarter, href = e["rtype"], e["year"], e["quarter"], e["url"]
+        period = f"{year}_{quarter}"
+        all_year_quarters.add((year, quarter))
+        folder = os.path.join(PROCESSED_DATA_DIR, period)
+        os.makedirs(folder, exist_ok=True)
+        fname = f"bank_of_baku_{internal_name}_{year}_{quarter}.xlsx"
+        fpath = os.path.join(folder, fname)
+        jobs.append(download_job(href, fpath, "excel", fname, recheck=os.path.exists(fpath)))
+
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="bank_of_baku"):
+        report.append(report_line(job))
+    total_downloaded = len(fetched(jobs))
 
     print("\n=== BANK OF BAKU FULL REPORT ===")
     for line in report:
@@ -149,7 +174,6 @@ def main():
             print(f"{year}_{quarter}: missing {missing_core}")
 
     print(f"\nDone.\nAll Excels in processed_data/bank_of_baku/<year>_<quarter>/")
-    driver.quit()
 
 if __name__ == "__main__":
     main()
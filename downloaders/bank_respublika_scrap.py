@@ -1,8 +1,10 @@
 import os
 import re
-import requests
 from collections import defaultdict
 from bs4 import BeautifulSoup
+from http_client import new_session
+import file_catalog
+from fetch import download_job, fetch_all, report_line, batch_summary
 
 BASE_URL = "https://www.bankrespublika.az/az/reportsnew"
 PROCESSED_ROOT = os.path.join("processed_data", "bank_respublika")
@@ -30,20 +32,15 @@ QUARTER_MAP = {
 }
 
 def file_exists_anywhere(report_type, year, quarter):
-    period = f"{year}_{quarter}"
-    fname_prefix = f"{report_type}_{period}"
-    for dirpath, _, files in os.walk(PROCESSED_ROOT):
-        for fname in files:
-            if fname.startswith(fname_prefix) and fname.endswith((".xlsx", ".xls")):
-                return True
-    return False
-
-def get_soup():
-    r = requests.get(BASE_URL, timeout=20)
+    return file_catalog.exists("bank_respublika", root="processed_data", period=f"{year}_{quarter}",
+                               report_type=report_type, ext=(".xlsx", ".xls"))
+
+def get_soup(session):
+    r = session.get(BASE_URL)
     r.raise_for_status()
     return BeautifulSoup(r.content, "html.parser")
 
-def extract_main_reports(soup, per_quarter_status):
+def extract_main_reports(soup, per_quarter_status, jobs):
     tds = soup.find_all("td")
     for td in tds:
         header = td.find("p", {"style": False})
@@ -74,26 +71,21 @@ def extract_main_reports(soup, per_quarter_status):
                 period_dir = os.path.join(PROCESSED_ROOT, period)
                 os.makedirs(period_dir, exist_ok=True)
                 dst = os.path.join(period_dir, fname)
-                if file_exists_anywhere(en_name, year, q):
+                recheck = os.path.exists(dst)
+                if recheck or file_exists_anywhere(en_name, year, q):
                     per_quarter_status[period][en_name] = f"[SKIP] Already exists: {period}/{fname}"
-                    continue
+                    if not recheck:
+                        continue
                 href = a.get("href")
                 if not href or not href.endswith((".xlsx", ".xls")):
                     continue
                 url = href if href.startswith("http") else f"https://www.bankrespublika.az{href}"
-                print(f"    Downloading: {period}/{fname}")
-                try:
-                    r = requests.get(url, timeout=30)
-                    if not r.ok or not r.content[:2] == b'PK':
-                        per_quarter_status[period][en_name] = f"[SKIP_CORRUPT] {period}/{fname}"
-                        continue
-                    with open(dst, "wb") as out:
-                        out.write(r.content)
-                    per_quarter_status[period][en_name] = f"[OK] {period}/{fname}"
-                except Exception as e:
-                    per_quarter_status[period][en_name] = f"[ERROR] {period}/{fname}: {e}"
+                if not recheck:
+                    print(f"    Queued: {period}/{fname}")
+                jobs.append(download_job(url, dst, "excel", f"{period}/{fname}", period=period, rtype=en_name,
+                                         recheck=recheck))
 
-def extract_risk_reports(soup, per_quarter_status):
+def extract_risk_reports(soup, per_quarter_status, jobs):
     risk_blocks = []
     for risk_az, risk_en in RISK_MAP.items():
         for p in soup.find_all("p"):
@@ -123,31 +115,33 @@ def extract_risk_reports(soup, per_quarter_status):
             period_dir = os.path.join(PROCESSED_ROOT, period)
             os.makedirs(period_dir, exist_ok=True)
             dst = os.path.join(period_dir, fname)
-            if file_exists_anywhere(risk_en, year, q):
+            recheck = os.path.exists(dst)
+            if recheck or file_exists_anywhere(risk_en, year, q):
                 per_quarter_status[period][risk_en] = f"[SKIP] Already exists: {period}/{fname}"
-                continue
+                if not recheck:
+                    continue
             href = a.get("href")
             if not href or not href.endswith((".xlsx", ".xls")):
                 continue
             url = href if href.startswith("http") else f"https://www.bankrespublika.az{href}"
-            print(f"    Downloading: {period}/{fname}")
-            try:
-                r = requests.get(url, timeout=30)
-                if not r.ok or not r.content[:2] == b'PK':
-                    per_quarter_status[period][risk_en] = f"[SKIP_CORRUPT] {period}/{fname}"
-                    continue
-                with open(dst, "wb") as out:
-                    out.write(r.content)
-                per_quarter_status[period][risk_en] = f"[OK] {period}/{fname}"
-            except Exception as e:
-                per_quarter_status[period][risk_en] = f"[ERROR] {period}/{fname}: {e}"
+            if not recheck:
+                print(f"    Queued: {period}/{fname}")
+            jobs.append(download_job(url, dst, "excel", f"{period}/{fname}", period=period, rtype=risk_en,
+                                     recheck=recheck))
 
 def main():
-    soup = get_soup()
+    session = new_session(referer=BASE_URL)
+    soup = get_soup(session)
+    file_catalog.sync(["bank_respublika"])
     per_quarter_status = defaultdict(dict)
 
-    extract_main_reports(soup, per_quarter_status)
-    extract_risk_reports(soup, per_quarter_status)
+    jobs = []
+    extract_main_reports(soup, per_quarter_status, jobs)
+    extract_risk_reports(soup, per_quarter_status, jobs)
+
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="bank_respublika"):
+        per_quarter_status[job["period"]][job["rtype"]] = report_line(job)
 
     print("\n=== BANK RESPUBLIKA REPORT ===")
     for qid, stats in sorted(per_quarter_status.items()):
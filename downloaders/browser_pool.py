@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import shutil
+import subprocess
+import urllib.request
+import cassette
+import undetected_chromedriver as uc
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.service import Service
+
+# ---- SHARED BROWSER ----
+# One headless Chrome is started on a fixed DevTools port and left running; every scraper
+# process attaches to it with a cached (uc-patched) chromedriver and works in its own tab.
+# Later scrapers skip the browser cold start and the driver download entirely. Every tab gets
+# the headless fixes uc.Chrome used to apply (see stealth()). Chrome runs under a detached
+# "serve" process that shuts it down once no scraper tab has been open for IDLE_TIMEOUT.
+#   python3 downloaders/browser_pool.py stop   -> shut the shared browser down now
+# Under SCRAPER_CASSETTE=record every page a tab leaves is snapshotted; under replay tabs load
+# the snapshots from cassette.py's local stand-in instead of the bank sites.
+CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache")
+PROFILE_DIR = os.path.join(CACHE_DIR, "chrome-profile")
+DRIVER_DIR = os.path.join(CACHE_DIR, "chromedriver")
+DEBUG_PORT = int(os.environ.get("SCRAPER_CHROME_PORT", "9222"))
+SHARED = os.environ.get("SCRAPER_SHARED_BROWSER", "1") != "0"   # 0 -> private browser per scraper
+IDLE_TIMEOUT = float(os.environ.get("SCRAPER_CHROME_IDLE", "600"))   # seconds; 0 -> keep running
+IDLE_POLL = 15
+
+CHROME_FLAGS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--blink-settings=imagesEnabled=false",
+    "--window-size=1400,1000",
+]
+
+# what a tab refuses to load (Network.setBlockedURLs patterns)
+BLOCK_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*fonts.googleapis.com*", "*fonts.gstatic.com*"],
+    "css": ["*.css", "*.css?*"],
+}
+BLOCK_DEFAULT = ("images", "fonts", "css")
+
+def _chrome_binary():
+    path = os.environ.get("SCRAPER_CHROME_BIN") or uc.find_chrome_executable()
+    if not path:
+        raise RuntimeError("Chrome executable not found (set SCRAPER_CHROME_BIN)")
+    return path
+
+def _chrome_major(binary):
+    out = subprocess.run([binary, "--version"], capture_output=True, text=True).stdout
+    m = re.search(r"(\d+)\.\d+\.\d+", out)
+    return int(m.group(1)) if m else 0
+
+def driver_path(refresh=False):
+    """Patched chromedriver matching the installed Chrome, downloaded once into .cache/chromedriver/."""
+    major = _chrome_major(_chrome_binary())
+    exe = "chromedriver.exe" if sys.platform.startswith("win") else "chromedriver"
+    path = os.path.join(DRIVER_DIR, str(major), exe)
+    if refresh and os.path.exists(path):
+        os.remove(path)
+    if not os.path.exists(path):
+        patcher = uc.Patcher(version_main=major)
+        patcher.auto()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy2(patcher.executable_path, path + ".part")
+        os.replace(path + ".part", path)
+    return path
+
+def browser_alive(port=DEBUG_PORT):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=1):
+            return True
+    except OSError:
+        return False
+
+def _take_start_lock(path, timeout):
+    """Create path exclusively (O_EXCL works the same on every OS); one older than 2*timeout is
+    left over from a crashed launcher and is taken over."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > 2 * timeout:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"another scraper is still starting Chrome ({path})")
+        time.sleep(0.2)
+
+def ensure_browser(port=DEBUG_PORT, timeout=20):
+    if browser_alive(port):
+        return
+    # scrapers started together must not both launch Chrome on the port: the first takes the
+    # lock and starts it, the others wait for the lock and then find it running
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    lock = os.path.join(CACHE_DIR, f"chrome-{port}.lock")
+    _take_start_lock(lock, 2 * timeout)   # outlasts the launcher's own wait below
+    try:
+        if browser_alive(port):
+            return
+        # detached: the browser outlives this scraper and serves the next one
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", str(port)],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + timeout
+        while not browser_alive(port):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"shared Chrome did not come up on port {port}")
+            time.sleep(0.2)
+    finally:
+        try:
+            os.remove(lock)
+        except FileNotFoundError:
+            pass
+
+def scraper_tabs(port=DEBUG_PORT):
+    """Open pages besides the browser's own about:blank tab; None when Chrome doesn't answer."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/list", timeout=2) as r:
+            pages = [t for t in json.load(r) if t.get("type") == "page"]
+    except (OSError, ValueError):
+        return None
+    return max(0, len(pages) - 1)
+
+def serve(port=DEBUG_PORT, idle_timeout=IDLE_TIMEOUT):
+    """Run the shared Chrome in the foreground; stop it after idle_timeout s without scraper tabs."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    cmd = [_chrome_binary(), *CHROME_FLAGS, f"--remote-debugging-port={port}",
+           f"--user-data-dir={os.path.abspath(PROFILE_DIR)}", "about:blank"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    last_busy = time.monotonic()
+    while proc.poll() is None:
+        time.sleep(IDLE_POLL)
+        if scraper_tabs(port) != 0:    # tabs open, or still starting up
+            last_busy = time.monotonic()
+        elif idle_timeout and time.monotonic() - last_busy > idle_timeout:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return proc.returncode
+
+def _attach(port):
+    options = webdriver.ChromeOptions()
+    options.debugger_address = f"127.0.0.1:{port}"
+    try:
+        return webdriver.Chrome(service=Service(driver_path()), options=options)
+    except SessionNotCreatedException:
+        # Chrome updated itself since the driver was cached
+        return webdriver.Chrome(service=Service(driver_path(refresh=True)), options=options)
+
+def _private_driver():
+    options = uc.ChromeOptions()
+    for flag in CHROME_FLAGS:
+        options.add_argument(flag)
+    return uc.Chrome(options=options, driver_executable_path=driver_path())
+
+# what uc.Chrome(headless) did for each driver, redone per tab since plain webdriver.Chrome
+# attaches to the shared browser: no "HeadlessChrome" in the User-Agent, navigator.webdriver
+# hidden, and the navigator properties headless Chrome leaves empty filled in
+_STEALTH_JS = """
+Object.defineProperty(window, "navigator", {
+    value: new Proxy(navigator, {
+        has: (target, key) => (key === "webdriver" ? false : key in target),
+        get: (target, key) => key === "webdriver" ? false
+            : typeof target[key] === "function" ? target[key].bind(target) : target[key],
+    }),
+});
+Object.defineProperty(navigator, "maxTouchPoints", {get: () => 1});
+if (navigator.connection) Object.defineProperty(navigator.connection, "rtt", {get: () => 100});
+if (!window.chrome) window.chrome = {runtime: {}, app: {isInstalled: false}};
+if (!window.Notification) window.Notification = {permission: "denied"};
+const originalQuery = window.navigator.permissions && window.navigator.permissions.query;
+if (originalQuery) {
+    window.navigator.permissions.__proto__.query = parameters =>
+        parameters.name === "notifications"
+            ? Promise.resolve({state: window.Notification.permission})
+            : originalQuery(parameters);
+}
+"""
+
+def stealth(driver):
+    ua = driver.execute_script("return navigator.userAgent")
+    if "Headless" in ua:
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": ua.replace("Headless", "")})
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _STEALTH_JS})
+
+def block_resources(driver, block=BLOCK_DEFAULT):
+    urls = [p for kind in block for p in BLOCK_PATTERNS[kind]]
+    if urls:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+
+def _snapshot(driver):
+    try:
+        cassette.record_dom(driver.current_url, driver.page_source)
+    except Exception:
+        pass
+
+def _instrument(driver):
+    real_get = driver.get
+    def get(url):
+        if cassette.RECORDING:
+            _snapshot(driver)   # the page being left, in whatever state the scraper clicked it into
+            return real_get(url)
+        cassette.ensure_server()
+        return real_get(cassette.standin_url(url))
+    driver.get = get
+
+def open_tab(bank, block=BLOCK_DEFAULT):
+    """A driver focused on a fresh tab for this bank; hand it back with release_tab()."""
+    if SHARED:
+        ensure_browser()
+        driver = _attach(DEBUG_PORT)
+        driver.switch_to.new_window("tab")
+    else:
+        driver = _private_driver()
+    stealth(driver)
+    block_resources(driver, block)
+    if cassette.RECORDING or cassette.REPLAYING:
+        _instrument(driver)
+    atexit.register(release_tab, driver)
+    return driver
+
+def release_tab(driver):
+    """Close this scraper's tab; the shared browser (and its about:blank tab) keeps running."""
+    if getattr(driver, "_pool_released", False):
+        return
+    driver._pool_released = True
+    if cassette.RECORDING:
+        _snapshot(driver)
+    try:
+        if SHARED:
+            driver.close()
+            driver.service.stop()
+        else:
+            driver.quit()
+    except Exception:
+        pass
+
+def stop_browser(port=DEBUG_PORT):
+    if not browser_alive(port):
+        return False
+    driver = _attach(port)
+    try:
+        driver.execute_cdp_cmd("Browser.close", {})
+    except Exception:
+        pass   # the connection drops as the browser exits
+    driver.service.stop()
+    return True
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["stop"]:
+        print("[INFO] shared browser stopped" if stop_browser() else "[INFO] no shared browser running")
+    elif sys.argv[1:2] == ["serve"]:
+        sys.exit(serve(int(sys.argv[2]) if len(sys.argv) > 2 else DEBUG_PORT))
+    else:
+        ensure_browser()
+        print(f"[INFO] shared browser listening on 127.0.0.1:{DEBUG_PORT}")
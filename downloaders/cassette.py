@@ -0,0 +1,242 @@
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import hashlib
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+# ---- RECORD / REPLAY ----
+# SCRAPER_CASSETTE=record  every HTTP response the shared client sees (listing pages, files) and a
+#                          DOM snapshot of every page a browser tab leaves are written to a cassette
+# SCRAPER_CASSETTE=replay  nothing goes to the network: new_session() answers from the cassette and
+#                          browser tabs load the recorded pages from a local stand-in server
+# The cassette is a directory (SCRAPER_CASSETTE_DIR, default .cache/cassettes/default):
+#   cassette.json   "METHOD url" / "DOM url" -> {status, url, headers, body}
+#   bodies/<sha256> response bodies, stored once however many URLs serve them
+#
+#   python3 downloaders/cassette.py record downloaders/abb_scrap.py -> a normal (live) run, recorded
+#   python3 downloaders/cassette.py run downloaders/abb_scrap.py    -> replay one scraper, timed
+#   python3 downloaders/cassette.py serve [port]                    -> just the stand-in server
+MODE = os.environ.get("SCRAPER_CASSETTE", "")
+CASSETTE_DIR = os.environ.get("SCRAPER_CASSETTE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "cassettes", "default")
+RECORDING = MODE == "record"
+REPLAYING = MODE == "replay"
+
+# headers that describe the transfer rather than the content: not replayed
+_HOP_HEADERS = {"content-encoding", "transfer-encoding", "connection", "keep-alive", "content-length",
+                "set-cookie"}
+
+_lock = threading.Lock()
+_index = None
+_server = None
+
+def _index_path():
+    return os.path.join(CASSETTE_DIR, "cassette.json")
+
+def load():
+    global _index
+    with _lock:
+        if _index is None:
+            try:
+                with open(_index_path(), encoding="utf-8") as f:
+                    _index = json.load(f)
+            except (OSError, ValueError):
+                _index = {}
+        return _index
+
+def save():
+    if _index is None:
+        return
+    with _lock:
+        os.makedirs(CASSETTE_DIR, exist_ok=True)
+        with open(_index_path() + ".part", "w", encoding="utf-8") as f:
+            json.dump(_index, f, indent=1, sort_keys=True)
+        os.replace(_index_path() + ".part", _index_path())
+
+def body_of(entry):
+    if not entry or not entry.get("body"):
+        return b""
+    with open(os.path.join(CASSETTE_DIR, "bodies", entry["body"]), "rb") as f:
+        return f.read()
+
+def _store_body(data):
+    sha = hashlib.sha256(data).hexdigest()
+    path = os.path.join(CASSETTE_DIR, "bodies", sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + f".{threading.get_ident()}.part", "wb") as f:
+            f.write(data)
+        os.replace(path + f".{threading.get_ident()}.part", path)
+    return sha
+
+def key(method, url):
+    return f"{method.upper()} {url}"
+
+# ---- RECORD ----
+def record(method, url, status, headers, body, final_url=None):
+    index = load()
+    k = key(method, url)
+    # a 304 / 206 answer to a conditional or resumed request must not replace the full recording
+    if status in (304, 206) and k in index:
+        return
+    entry = {"status": status, "url": final_url or url,
+             "headers": {h: v for h, v in headers.items() if h.lower() not in _HOP_HEADERS},
+             "body": _store_body(body) if body else None, "at": time.time()}
+    with _lock:
+        index[k] = entry
+
+def record_response(resp):
+    """Called by the shared client for every response; reads the body so it can be kept."""
+    for r in (*resp.history, resp):   # redirect hops too, so replay follows the same chain
+        req = r.request
+        record(req.method, req.url, r.status_code, r.headers,
+               r.content if req.method != "HEAD" else b"", r.url)
+
+def record_dom(url, html):
+    if url and url.startswith("http"):
+        record("DOM", url, 200, {"Content-Type": "text/html; charset=utf-8"}, html.encode("utf-8"))
+
+# ---- REPLAY ----
+def lookup(method, url):
+    index = load()
+    entry = index.get(key(method, url))
+    if entry is None and method.upper() == "HEAD":
+        get = index.get(key("GET", url))
+        if get:
+            entry = {**get, "body": None}
+    return entry
+
+def replay_adapter():
+    # requests is imported here only: the stand-in server below works without it
+    from requests.adapters import BaseAdapter
+    from requests.models import Response
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class ReplayAdapter(BaseAdapter):
+        """Transport that answers from the cassette; a URL that was never recorded gets a 404."""
+        def send(self, request, **kwargs):
+            entry = lookup(request.method, request.url)
+            resp = Response()
+            resp.request, resp.url, resp.connection = request, request.url, self
+            if entry is None:
+                print(f"[WARN] cassette: no recording for {request.method} {request.url}")
+                resp.status_code, resp.reason = 404, "Not Recorded"
+                resp.headers = CaseInsensitiveDict({"X-Cassette": "miss"})
+                resp._content, resp._content_consumed = b"", True
+                return resp
+            headers = CaseInsensitiveDict(entry["headers"])
+            etag = request.headers.get("If-None-Match")
+            if etag and etag == headers.get("ETag"):
+                resp.status_code, resp.reason = 304, "Not Modified"
+                resp.headers, resp._content = headers, b""
+            else:
+                # Range is ignored: a full 200 is always a valid answer to a resume
+                resp.status_code, resp.reason = entry["status"], "Replayed"
+                resp.headers = headers
+                resp._content = body_of(entry) if request.method != "HEAD" else b""
+            resp._content_consumed = True
+            resp.encoding = get_encoding_from_headers(resp.headers)
+            return resp
+
+        def close(self):
+            pass
+
+    return ReplayAdapter()
+
+# ---- LOCAL STAND-IN ----
+# Serves the cassette over HTTP so a real browser can load recorded pages: /<host>/<path?query>
+# is answered with the DOM snapshot of https://<host>/<path?query> (else the recorded GET body).
+# Snapshots get their scripts removed (the DOM is already in its final state) and a <base> so
+# relative links still point at the original site.
+_SCRIPT = re.compile(rb"<script\b.*?</script\s*>", re.I | re.S)
+_HEAD = re.compile(rb"<head[^>]*>", re.I)
+
+def standin_url(url):
+    """Where the stand-in serves url (ensure_server() must have run)."""
+    u = urlparse(url)
+    return f"http://127.0.0.1:{_server.server_port}/{u.netloc}{u.path or '/'}" + (f"?{u.query}" if u.query else "")
+
+def _original_url(path):
+    host, _, rest = path.lstrip("/").partition("/")
+    return f"https://{host}/{rest}", f"http://{host}/{rest}"
+
+class StandinHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        for url in _original_url(self.path):
+            entry = lookup("DOM", url) or lookup("GET", url)
+            if entry:
+                break
+        else:
+            self.send_error(404, "Not Recorded")
+            return
+        body = body_of(entry)
+        ctype = entry["headers"].get("Content-Type") or entry["headers"].get("content-type") or ""
+        if "html" in ctype:
+            base = f'<base href="{url}">'.encode("utf-8")
+            body = _SCRIPT.sub(b"", body)
+            body = _HEAD.sub(lambda m: m.group(0) + base, body, count=1) if _HEAD.search(body) else base + body
+        self.send_response(entry["status"])
+        self.send_header("Content-Type", ctype or "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+def ensure_server(port=0):
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer(("127.0.0.1", port), StandinHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+if RECORDING:
+    atexit.register(save)
+
+# ---- CLI ----
+def record_run(script, *args):
+    env = {**os.environ, "SCRAPER_CASSETTE": "record", "SCRAPER_CASSETTE_DIR": os.path.abspath(CASSETTE_DIR),
+           "SCRAPER_CATALOG": "0", "SCRAPER_RECHECK": "1"}   # crawl and request everything once
+    t0 = time.perf_counter()
+    code = subprocess.call([sys.executable, os.path.abspath(script), *args], env=env)
+    print(f"[INFO] {os.path.basename(script)} recorded in {time.perf_counter() - t0:.1f}s (exit {code})")
+    return code
+
+def run(script, *args):
+    """Replay one scraper in a scratch working directory and time it. Its downloads, manifests,
+    retry queue, discovery record and file catalog all stay in that directory."""
+    script = os.path.abspath(script)
+    with tempfile.TemporaryDirectory(prefix="replay-") as cwd:
+        env = {**os.environ, "SCRAPER_CASSETTE": "replay", "SCRAPER_CASSETTE_DIR": os.path.abspath(CASSETTE_DIR),
+               "SCRAPER_CATALOG": "0",   # always exercise discovery, not the catalog cache
+               "SCRAPER_CACHE_DIR": os.path.join(cwd, ".cache"), "SCRAPER_DATA_ROOT": cwd}
+        t0 = time.perf_counter()
+        code = subprocess.call([sys.executable, script, *args], cwd=cwd, env=env)
+        print(f"[INFO] {os.path.basename(script)} replayed in {time.perf_counter() - t0:.1f}s (exit {code})")
+    return code
+
+if __name__ == "__main__":
+    cmd = sys.argv[1:2]
+    if cmd == ["record"] and len(sys.argv) > 2:
+        sys.exit(record_run(*sys.argv[2:]))
+    elif cmd == ["run"] and len(sys.argv) > 2:
+        sys.exit(run(*sys.argv[2:]))
+    elif cmd == ["serve"]:
+        srv = ensure_server(int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+        print(f"[INFO] cassette {os.path.abspath(CASSETTE_DIR)} served on http://127.0.0.1:{srv.server_port}/<host>/<path>")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("usage: cassette.py record|run <scraper.py> [args...] | serve [port]")
+        sys.exit(2)
@@ -1,21 +1,18 @@
-import requests
-import hashlib
 import os
-import time
 import re
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from browser_pool import open_tab, release_tab
+from urllib.parse import urljoin
+from discovery import discover, get_soup, text_of
+from http_client import new_session
+import file_catalog
+from fetch import download_job, fetch_all
+from waits import site_timeout, wait_present
 
 # ---- DIRECTORIES ----
 CBAR_DIR = os.path.join("processed_data", "CBAR")
 os.makedirs(CBAR_DIR, exist_ok=True)
 
-CBAR_LOCAL_FILE = os.path.join(CBAR_DIR, "CBAR_LATEST.xlsx")
-CBAR_HASH_FILE = os.path.join(CBAR_DIR, "CBAR_LATEST.hash")
-
 MONTHS_AZ = [
     "Yanvar", "Fevral", "Mart", "Aprel", "May", "İyun", "İyul",
     "Avqust", "Sentyabr", "Oktyabr", "Noyabr", "Dekabr"
@@ -48,103 +45,99 @@ def filter_cbar_sheets(filepath, sheets_to_keep=CBAR_SHEETS_KEEP):
 
 MONTH_MAP = {az: en for az, en in zip(MONTHS_AZ, MONTHS_EN)}
 
-def download_latest_cbar_excel(download_to=CBAR_LOCAL_FILE):
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    url = "https://www.cbar.az/page-40/statistical-bulletin"
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.get(url)
-    time.sleep(2)
-
-    # Find active year
-    years = driver.find_elements(By.CSS_SELECTOR, "dt")
-    active_year = None
-    for y in years:
-        if 'jquery-list-active' in y.get_attribute("class"):
-            active_year = y.text.strip()
-            break
-    if not active_year:
-        active_year = years[0].text.strip() if years else "UnknownYear"
-
-    # Find the latest Excel link and parse period (month)
-    assets = driver.find_elements(By.CSS_SELECTOR, "dd.assets a.download_item")
-    excel_url = None
-    period = None
-    for a in assets:
-        href = a.get_attribute("href")
-        if href and href.endswith(".xlsx"):
-            excel_url = href
+CBAR_URL = "https://www.cbar.az/page-40/statistical-bulletin"
+
+def latest_entry(active_year, assets):
+    """active_year + [(href, <div> html), ...] of the listing -> entry for the newest Excel, or None."""
+    for href, div_html in assets:
+        if not href or not href.endswith(".xlsx"):
+            continue
+        print(f"[DEBUG] Raw <div> HTML: {div_html!r}")
+        m = re.search(r"<p[^>]*>(.*?)</p>", div_html or "", re.IGNORECASE | re.DOTALL)
+        period = m.group(1).strip() if m else "Unknown"
+        print(f"[DEBUG] Extracted month from HTML: {period!r}")
+        period_en = MONTH_MAP.get(period, period)
+        return {"rtype": "statistical_bulletin", "url": href,
+                "period": f"{period_en} {active_year}", "period_az": f"{period} {active_year}"}
+    return None
+
+def discover_http(session):
+    soup = get_soup(session, CBAR_URL)
+    years = soup.select("dt")
+    active = next((y for y in years if "jquery-list-active" in (y.get("class") or [])), None)
+    active_year = text_of(active) or (text_of(years[0]) if years else "UnknownYear")
+    assets = [(urljoin(CBAR_URL, a.get("href", "")), str(a.find("div") or ""))
+              for a in soup.select("dd.assets a.download_item")]
+    entry = latest_entry(active_year, assets)
+    return [entry] if entry else None
+
+def discover_browser(session):
+    driver = open_tab("cbar")
+    try:
+        driver.get(CBAR_URL)
+        wait_present(driver, (By.CSS_SELECTOR, "dd.assets a.download_item"), timeout=site_timeout("cbar"))
+
+        # Find active year
+        years = driver.find_elements(By.CSS_SELECTOR, "dt")
+        active_year = None
+        for y in years:
+            if 'jquery-list-active' in y.get_attribute("class"):
+                active_year = y.text.strip()
+                break
+        if not active_year:
+            active_year = years[0].text.strip() if years else "UnknownYear"
+
+        # Latest Excel link and its period (month)
+        assets = []
+        for a in driver.find_elements(By.CSS_SELECTOR, "dd.assets a.download_item"):
             try:
-                div = a.find_element(By.TAG_NAME, "div")
-                div_html = div.get_attribute('outerHTML')
-                print(f"[DEBUG] Raw <div> HTML: {div_html!r}")
-                m = re.search(r"<p[^>]*>(.*?)</p>", div_html, re.IGNORECASE)
-                if m:
-                    period = m.group(1).strip()
-                    print(f"[DEBUG] Extracted month from HTML: {period!r}")
-                else:
-                    period = "Unknown"
+                div_html = a.find_element(By.TAG_NAME, "div").get_attribute('outerHTML')
             except Exception as ex:
                 print(f"[DEBUG] Period extraction error: {ex}")
-                period = "Unknown"
-            break
-    driver.quit()
-    if not excel_url:
+                div_html = ""
+            assets.append((a.get_attribute("href"), div_html))
+        entry = latest_entry(active_year, assets)
+        return [entry] if entry else []
+    finally:
+        release_tab(driver)
+
+def find_latest_cbar_excel(session):
+    entries = discover("cbar", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=CBAR_URL)
+    if not entries:
         raise Exception("Excel link not found")
-    period_en = MONTH_MAP.get(period, period)
-    period_full = f"{period} {active_year}"
-    period_full_en = f"{period_en} {active_year}"
-    print(f"[INFO] Latest period on website: {period_full} / {period_full_en}")
-    print(f"[INFO] Latest Excel URL: {excel_url}")
-    resp = requests.get(excel_url)
-    with open(download_to + ".new", "wb") as f:
-        f.write(resp.content)
-    print(f"[INFO] Downloaded as: {download_to + '.new'}")
-    return download_to + ".new", period_full, period_full_en
-
-def file_hash(path):
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-def load_stored_hash():
-    if os.path.exists(CBAR_HASH_FILE):
-        with open(CBAR_HASH_FILE, "r") as f:
-            return f.read().strip()
-    return None
-
-def store_hash(hashval):
-    with open(CBAR_HASH_FILE, "w") as f:
-        f.write(hashval)
+    latest = entries[0]
+    print(f"[INFO] Latest period on website: {latest['period_az']} / {latest['period']}")
+    print(f"[INFO] Latest Excel URL: {latest['url']}")
+    return latest["url"], latest["period_az"], latest["period"]
 
 def update_cbar_file():
-    TMP_FILE, period_full, period_full_en = download_latest_cbar_excel()
-    new_hash = file_hash(TMP_FILE)
-
-    prev_hash = load_stored_hash()
+    session = new_session(referer=CBAR_URL)
+    excel_url, period_full, period_full_en = find_latest_cbar_excel(session)
     # filename for new period
     clean_period = period_full_en.replace(" ", "_")
     new_fname = f"CBAR_{clean_period}.xlsx"
     new_fpath = os.path.join(CBAR_DIR, new_fname)
 
-    if prev_hash == new_hash and os.path.exists(new_fpath):
+    # conditional request against the download manifest: an unchanged bulletin costs one round-trip
+    # retry=False: a bare re-download would skip the sheet filtering and old-file cleanup below
+    job = download_job(excel_url, new_fpath, "excel", new_fname, recheck=os.path.exists(new_fpath), retry=False)
+    fetch_all(session, [job], bank="cbar")
+    if job["status"] == "unchanged":
         print(f"[INFO] No update. CBAR Excel unchanged for period: {period_full} / {period_full_en}")
-        os.remove(TMP_FILE)
-    else:
+    elif job["status"] in ("ok", "updated"):
         print(f"[INFO] New data detected or no previous file. Updating local CBAR file for period: {period_full} / {period_full_en}")
         # Remove all old CBAR files, only keep the latest
+        touched = [new_fpath]
         for f in os.listdir(CBAR_DIR):
-            if f.endswith(".xlsx"):
+            if f.endswith(".xlsx") and f != new_fname:
                 os.remove(os.path.join(CBAR_DIR, f))
-        os.rename(TMP_FILE, new_fpath)
+                touched.append(os.path.join(CBAR_DIR, f))
         filter_cbar_sheets(new_fpath)
-        store_hash(new_hash)
+        file_catalog.update(touched)   # filtered in place: size/hash changed after the download
         print(f"[INFO] {new_fname} now up to date. Period: {period_full} / {period_full_en}")
-    print(f"[INFO] Current local hash: {new_hash}")
+    else:
+        print(f"[ERROR] CBAR download failed: {job['error']}")
 
 if __name__ == "__main__":
     update_cbar_file()
\ No newline at end of file
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import hashlib
+import datetime
+from bs4 import BeautifulSoup
+
+# ---- LINK DISCOVERY ----
+# Every downloader can find its report links in one of two ways:
+#   http     GET the listing page(s) and parse the static HTML: seconds, no Chrome
+#   browser  drive the page in a shared Chrome tab: accordions, year tabs, lazy lists
+# discover() tries http first and only starts the browser when the static HTML does not carry
+# the links (JS-rendered markup, a redesign, a blocked request). Each run records the path it
+# took in .cache/discovery/<bank>.json.
+#
+# A partial static parse is no better than none: the http entries must cover every report type
+# and period the last browser run found, and reach the latest quarter whose reports should be
+# out by now (REPORT_LAG_DAYS after quarter end) unless a browser run since then didn't find it
+# either. Otherwise the browser runs after all.
+#
+# Both paths of a scraper return the same entries: dicts with at least rtype, period, url.
+# Pass http_fn=None for a site whose links only exist after scripting (accessbank's lazy risk
+# panel); the run is still timed and recorded. bank_respublika and rabitabank never needed Chrome.
+CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache")
+DISCOVERY_DIR = os.path.join(CACHE_DIR, "discovery")
+HTTP_FIRST = os.environ.get("SCRAPER_HTTP_FIRST", "1") != "0"   # 0 -> always use the browser
+HTML_TIMEOUT = None   # None -> the session default (http_client.TIMEOUT)
+REPORT_LAG_DAYS = int(os.environ.get("SCRAPER_REPORT_LAG_DAYS", "45"))
+
+# ---- CATALOG CACHE ----
+# The record also keeps the entries themselves plus a fingerprint of the listing page. The next
+# run GETs the listing once (reused by the http path), and when the fingerprint matches and the
+# catalog is younger than CATALOG_MAX_AGE it returns the stored entries without crawling at all;
+# the download step still re-checks/fetches whatever is missing or changed. Only entries that
+# passed the completeness check are cataloged, and a catalog that no longer reaches the due
+# quarter is crawled again. When the static listing fell short and the browser had to run, the
+# fingerprint only covers a script-rendered shell that stays the same while reports are added,
+# so that bank's catalog expires after CATALOG_SHELL_MAX_AGE instead.
+CATALOG = os.environ.get("SCRAPER_CATALOG", "1") != "0"   # 0 -> always crawl
+CATALOG_MAX_AGE = float(os.environ.get("SCRAPER_CATALOG_MAX_AGE", str(7 * 24 * 3600)))   # seconds
+CATALOG_SHELL_MAX_AGE = float(os.environ.get("SCRAPER_CATALOG_SHELL_MAX_AGE", str(6 * 3600)))
+
+_pages = {}   # url -> listing bytes fetched this run
+
+# per-request noise that says nothing about the reports listed: nonces, CSRF tokens, inline data
+_VOLATILE = [
+    re.compile(rb"<script\b.*?</script\s*>", re.I | re.S),
+    re.compile(rb"<style\b.*?</style\s*>", re.I | re.S),
+    re.compile(rb"<noscript\b.*?</noscript\s*>", re.I | re.S),
+    re.compile(rb"<!--.*?-->", re.S),
+    re.compile(rb"<meta\b[^>]*>", re.I),
+    re.compile(rb"<input\b[^>]*type=[\"']?hidden[^>]*>", re.I),
+    re.compile(rb"\s(?:nonce|data-csrf|data-token)=(\"[^\"]*\"|'[^']*')", re.I),
+]
+
+def listing_html(session, url, timeout=HTML_TIMEOUT):
+    if url not in _pages:
+        r = session.get(url, timeout=timeout)
+        r.raise_for_status()
+        _pages[url] = r.content
+    return _pages[url]
+
+def get_soup(session, url, headers=None, timeout=HTML_TIMEOUT):
+    if headers is None:
+        return BeautifulSoup(listing_html(session, url, timeout), "html.parser")
+    r = session.get(url, headers=headers, timeout=timeout)
+    r.raise_for_status()
+    return BeautifulSoup(r.content, "html.parser")
+
+def fingerprint(html):
+    for rx in _VOLATILE:
+        html = rx.sub(b"", html)
+    return hashlib.sha256(re.sub(rb"\s+", b" ", html).strip()).hexdigest()
+
+def text_of(el):
+    """Visible-ish text of a tag, like WebElement.text for static markup."""
+    return el.get_text(" ", strip=True) if el is not None else ""
+
+# ---- COMPLETENESS ----
+_QUARTER_RX = re.compile(r"(20\d{2})\D{0,3}Q([1-4])", re.I)
+
+def period_key(e):
+    """'2024 Q1', '2024_Q1', '2023 12m', 'March 2024': whatever the scraper calls the period."""
+    return " ".join(str(v) for v in (e.get("year"), e.get("quarter") or e.get("period")) if v)
+
+def coverage(entries):
+    return {"rtypes": sorted({str(e.get("rtype", "")) for e in entries}),
+            "periods": sorted({period_key(e) for e in entries})}
+
+def newest_quarter(periods):
+    found = [(int(m.group(1)), int(m.group(2))) for m in map(_QUARTER_RX.search, periods) if m]
+    return max(found) if found else None
+
+def expected_quarter(now=None):
+    """(year, quarter) of the latest quarter whose reports are due, plus the due time."""
+    day = datetime.date.fromtimestamp(now or time.time()) - datetime.timedelta(days=REPORT_LAG_DAYS)
+    year, q = (day.year, (day.month - 1) // 3) if day.month > 3 else (day.year - 1, 4)
+    ended = datetime.datetime(year + q // 4, q * 3 % 12 + 1, 1)
+    return (year, q), (ended + datetime.timedelta(days=REPORT_LAG_DAYS)).timestamp()
+
+def incomplete(entries, reference):
+    """Why the http entries can't stand in for a browser crawl, or None when they can.
+    reference: coverage + time of the last browser run (record['browser'])."""
+    got = coverage(entries)
+    if reference:
+        for what in ("rtypes", "periods"):
+            missing = sorted(set(reference[what]) - set(got[what]))
+            if missing:
+                return f"missing {what} the last browser run found: {', '.join(missing[:5])}"
+    newest = newest_quarter(got["periods"])
+    if newest is None:
+        return None   # not a quarterly listing (cbar's monthly bulletin)
+    expected, due = expected_quarter()
+    if newest >= expected:
+        return None
+    if reference and reference.get("at", 0) >= due and (newest_quarter(reference["periods"]) or (0, 0)) < expected:
+        return None   # the browser didn't find it after the due date either: not published yet
+    return f"newest period {newest[0]} Q{newest[1]}, expected {expected[0]} Q{expected[1]}"
+
+def last_run(bank):
+    try:
+        with open(os.path.join(DISCOVERY_DIR, f"{bank}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def record_run(bank, path, entries, seconds, fp=None, cataloged=None, shell=None):
+    """entries must have passed the completeness check (browser runs always do): they become
+    the catalog. shell: the listing page is a static shell; None keeps the previous verdict."""
+    os.makedirs(DISCOVERY_DIR, exist_ok=True)
+    dst = os.path.join(DISCOVERY_DIR, f"{bank}.json")
+    prev = last_run(bank) or {}
+    record = {"path": path, "entries": len(entries), "seconds": round(seconds, 2), "at": time.time(),
+              "shell": bool(prev.get("shell")) if shell is None else shell}
+    # browser: what the last browser run found, the yardstick for later http runs
+    if path == "browser" and entries:
+        record["browser"] = dict(coverage(entries), at=record["at"])
+    elif prev.get("browser"):
+        record["browser"] = prev["browser"]
+    if fp and entries:
+        # cataloged: when the entries were last actually crawled (cache hits keep it)
+        record.update(fingerprint=fp, catalog=entries, cataloged=cataloged or record["at"])
+    with open(dst + ".part", "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(dst + ".part", dst)
+
+def cached_catalog(bank, fp):
+    prev = last_run(bank)
+    if not prev or not prev.get("catalog") or prev.get("fingerprint") != fp:
+        return None
+    max_age = CATALOG_SHELL_MAX_AGE if prev.get("shell") else CATALOG_MAX_AGE
+    if time.time() - prev.get("cataloged", 0) > max_age:
+        return None
+    gap = incomplete(prev["catalog"], prev.get("browser"))
+    if gap:
+        print(f"[INFO] {bank}: cataloged links are out of date ({gap}), crawling again")
+        return None
+    return prev
+
+def discover(bank, http_fn, browser_fn, session=None, listing=None):
+    """Entries from the cached catalog when the listing page is unchanged, else from http_fn()
+    when they pass the completeness check, else from browser_fn(); records the path used."""
+    t0 = time.perf_counter()
+    fp = None
+    if CATALOG and session is not None and listing:
+        try:
+            fp = fingerprint(listing_html(session, listing))
+        except Exception as e:
+            print(f"[WARN] {bank}: could not fetch the listing page for the catalog check: {e}")
+        prev = cached_catalog(bank, fp) if fp else None
+        if prev:
+            entries = prev["catalog"]
+            seconds = time.perf_counter() - t0
+            print(f"[INFO] {bank}: listing unchanged, reusing {len(entries)} cataloged link(s) ({seconds:.1f}s)")
+            record_run(bank, "cache", entries, seconds, fp, prev["cataloged"])
+            return entries
+    entries, path, shell = None, "http", None
+    if not http_fn:
+        shell = True   # links only exist after scripting
+    elif HTTP_FIRST:
+        try:
+            entries = http_fn()
+            shell = False
+        except Exception as e:
+            print(f"[WARN] {bank}: HTTP discovery failed: {e}")   # a blocked request says nothing about the page
+        if not entries:
+            print(f"[INFO] {bank}: no report links in the static HTML, falling back to the browser")
+        else:
+            gap = incomplete(entries, (last_run(bank) or {}).get("browser"))
+            if gap:
+                print(f"[WARN] {bank}: static HTML gave {len(entries)} link(s) but {gap}; falling back to the browser")
+                entries = None
+        if shell is False:
+            shell = not entries
+    if not entries:
+        path = "browser"
+        entries = browser_fn()
+    seconds = time.perf_counter() - t0
+    print(f"[INFO] {bank}: discovered {len(entries)} link(s) via {path} in {seconds:.1f}s")
+    record_run(bank, path, entries, seconds, fp, shell=shell)
+    return entries
@@ -0,0 +1,370 @@
+import os
+import json
+import time
+import sys
+import hashlib
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import file_catalog
+
+# ---- CONCURRENT DOWNLOADS ----
+# Scrapers first collect what to fetch (discovery), then hand the whole list to fetch_all():
+# a bounded thread pool that never keeps more than PER_HOST requests open against one site.
+#
+# job dict:    url, path, kind ("pdf" / "excel" / None = no content check), label (for logs),
+#              optional content_types (Content-Type values accepted when the magic bytes don't match),
+#              recheck=True for a file already on disk at path (see MANIFEST below),
+#              retry=False to keep a failure out of the retry queue (see RETRY QUEUE below),
+#              plus whatever the scraper wants back (period, report type, ...)
+# result:      the same dict + status and error; status is one of
+#              ok / updated / unchanged / corrupt / http_error / error / duplicate
+#              (a second job for a path already in the batch is not fetched: "duplicate")
+MAX_WORKERS = int(os.environ.get("SCRAPER_DOWNLOAD_WORKERS", "8"))
+PER_HOST = int(os.environ.get("SCRAPER_PER_HOST", "4"))
+TIMEOUT = None       # None -> the session default (http_client.TIMEOUT)
+CHUNK = 256 * 1024   # bytes read/written per step; memory use does not grow with file size
+SNIFF = 8            # leading bytes needed for the magic check
+
+MAGIC = {
+    "pdf": (b"%PDF",),
+    "excel": (b"PK", b"\xd0\xcf\x11\xe0"),   # xlsx (zip) / legacy xls (OLE2)
+}
+
+# ---- MANIFEST ----
+# .cache/downloads/<bank>.json: url -> {path, etag, last_modified, size, sha256, checked}
+# sha256/size describe the bytes as served (cbar filters its workbook after download).
+# Files already on disk are re-checked with If-None-Match / If-Modified-Since, or a HEAD + size
+# compare when the server sends no validators, so an unchanged file costs one small round-trip
+# and a restated one is fetched again and replaces the old copy in place.
+# SCRAPER_CACHE_DIR moves manifests and retry queues elsewhere (cassette.py's replay uses a scratch copy)
+CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache")
+MANIFEST_DIR = os.path.join(CACHE_DIR, "downloads")
+RECHECK = os.environ.get("SCRAPER_RECHECK", "1") != "0"   # 0 -> trust files on disk, no requests
+
+def manifest_path(bank):
+    return os.path.join(MANIFEST_DIR, f"{bank}.json")
+
+def load_manifest(bank):
+    try:
+        with open(manifest_path(bank), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(bank, manifest):
+    path = manifest_path(bank)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".part", path)
+
+# ---- RETRY QUEUE ----
+# .cache/retry/<bank>.json: abs path -> {url, path, kind, label, content_types, referer,
+#                                        error_class, error, attempts, first_failed, next_at}
+# fetch_all(bank=...) queues every new download that failed (HTTP error, not a real PDF/Excel,
+# connection error) and drops it again once a later run fetches it. Re-check failures are not
+# queued: the file is still on disk. `python3 downloaders/fetch.py retry [bank ...]` fetches only
+# what is queued and due -- no discovery, no browser -- backing off per entry.
+RETRY_DIR = os.path.join(CACHE_DIR, "retry")
+RETRY_FAILED = ("http_error", "corrupt", "error")
+RETRY_BASE = 5 * 60            # seconds before the first retry; doubles per attempt (+ up to 50% jitter)
+RETRY_MAX_DELAY = 24 * 3600
+RETRY_MAX_ATTEMPTS = 8         # after that only `retry --all` tries again
+
+def retry_queue_path(bank):
+    return os.path.join(RETRY_DIR, f"{bank}.json")
+
+def load_retry_queue(bank):
+    try:
+        with open(retry_queue_path(bank), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_retry_queue(bank, queue):
+    path = retry_queue_path(bank)
+    if not queue:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(RETRY_DIR, exist_ok=True)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        json.dump(queue, f, indent=1, sort_keys=True)
+    os.replace(path + ".part", path)
+
+def _update_retry_queue(bank, jobs, referer):
+    queue = load_retry_queue(bank)
+    now, queued = time.time(), 0
+    for job in jobs:
+        key = os.path.abspath(job["path"])
+        status = job.get("status")
+        if status in ("ok", "updated", "unchanged"):
+            queue.pop(key, None)
+        elif status in RETRY_FAILED and not job.get("recheck") and job.get("retry", True):
+            prev = queue.get(key, {})
+            attempts = prev.get("attempts", 0) + 1
+            delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX_DELAY) * random.uniform(1, 1.5)
+            queue[key] = {
+                "url": job["url"], "path": key, "kind": job["kind"], "label": job["label"],
+                "content_types": list(job.get("content_types", ())), "referer": referer,
+                "error_class": job.get("error_class") or status, "error": job.get("error"),
+                "attempts": attempts, "first_failed": prev.get("first_failed", now), "next_at": now + delay,
+            }
+            queued += 1
+    save_retry_queue(bank, queue)
+    if queued:
+        print(f"[INFO] {queued} failed download(s) queued for retry: python3 downloaders/fetch.py retry {bank}")
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _entry(job, resp, sha, size):
+    return {
+        "path": job["path"], "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "size": size, "sha256": sha, "checked": time.time(),
+    }
+
+# ---- FETCH ----
+def download_job(url, path, kind=None, label=None, **extra):
+    return {"url": url, "path": path, "kind": kind,
+            "label": label or os.path.basename(path), **extra}
+
+def kind_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    return "pdf" if ext == ".pdf" else "excel" if ext in (".xlsx", ".xls") else None
+
+def _looks_valid(job, head, resp):
+    magic = MAGIC.get(job["kind"])
+    if not magic or head.startswith(magic):
+        return True
+    ctype = resp.headers.get("Content-Type", "").lower()
+    return any(t in ctype for t in job.get("content_types", ()))
+
+def _conditional_headers(entry):
+    cond = {}
+    if entry.get("etag"):
+        cond["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        cond["If-Modified-Since"] = entry["last_modified"]
+    return cond
+
+def _unchanged_by_head(session, job, headers, timeout, entry):
+    # no validators to send: HEAD and compare the advertised size with what we stored / have
+    resp = session.head(job["url"], headers=headers, timeout=timeout, allow_redirects=True)
+    length = resp.headers.get("Content-Length")
+    if not resp.ok or not length:
+        return None
+    size = entry["size"] if entry else os.path.getsize(job["path"])
+    if int(length) != size:
+        return None
+    sha = entry["sha256"] if entry else _sha256_file(job["path"])
+    return _entry(job, resp, sha, size)
+
+# ---- STREAMING ----
+# Bodies are streamed in CHUNK-sized pieces into <path>.part next to the target, fsynced and
+# renamed over <path> only when complete: a crash never leaves a truncated file under the real
+# name. <path>.part.json remembers the URL and validators, so the next run asks for the rest
+# with Range + If-Range instead of starting over (the server answers 200 if the file changed).
+def _part_paths(path):
+    return path + ".part", path + ".part.json"
+
+def _drop_part(job):
+    for p in _part_paths(job["path"]):
+        if os.path.exists(p):
+            os.remove(p)
+
+def _resume_headers(job):
+    part, meta_path = _part_paths(job["path"])
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        size = os.path.getsize(part)
+    except (OSError, ValueError):
+        return {}, 0
+    validator = meta.get("etag") or meta.get("last_modified")
+    if meta.get("url") != job["url"] or not validator or not size:
+        return {}, 0
+    return {"Range": f"bytes={size}-", "If-Range": validator}, size
+
+def _stream_to_part(job, resp, offset):
+    """Write the body to <path>.part; returns (sha256, size), or None when the content check fails."""
+    part, meta_path = _part_paths(job["path"])
+    os.makedirs(os.path.dirname(part) or ".", exist_ok=True)
+    h, head = hashlib.sha256(), b""
+    if offset:
+        # resumed: hash what is already there; its first bytes were checked when it started
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                head = head or chunk[:SNIFF]
+                h.update(chunk)
+    else:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"url": job["url"], "etag": resp.headers.get("ETag"),
+                       "last_modified": resp.headers.get("Last-Modified")}, f)
+    checked, size = bool(offset), offset
+    with open(part, "ab" if offset else "wb") as out:
+        for chunk in resp.iter_content(CHUNK):
+            if not chunk:
+                continue
+            if not checked:
+                head += chunk[:SNIFF - len(head)]
+                if len(head) >= SNIFF:
+                    if not _looks_valid(job, head, resp):
+                        break
+                    checked = True
+            h.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    if not checked and not _looks_valid(job, head, resp):   # tiny body, or the loop broke off
+        _drop_part(job)
+        return None
+    return h.hexdigest(), size
+
+def _fetch_one(session, job, headers, timeout, slots, manifest):
+    """Returns (status, error, manifest record or None); only fetch_all writes the manifest."""
+    host = urlparse(job["url"]).netloc
+    recheck = job.get("recheck")
+    entry = manifest.get(job["url"]) if recheck else None
+    headers = dict(headers or {})
+    with slots[host]:
+        if recheck:
+            cond = _conditional_headers(entry or {})
+            if not cond:
+                same = _unchanged_by_head(session, job, headers, timeout, entry)
+                if same:
+                    return "unchanged", None, same
+            headers.update(cond)
+        rng, offset = _resume_headers(job)
+        resp = session.get(job["url"], headers={**headers, **rng}, timeout=timeout,
+                           allow_redirects=True, stream=True)
+        if resp.status_code == 416 and offset:
+            # the .part no longer fits what the server has: start over
+            resp.close()
+            _drop_part(job)
+            offset = 0
+            resp = session.get(job["url"], headers=headers, timeout=timeout, allow_redirects=True, stream=True)
+        with resp:
+            if resp.status_code == 304 and entry:
+                return "unchanged", None, dict(entry, checked=time.time())
+            if not resp.ok:
+                return "http_error", f"HTTP {resp.status_code}", None
+            result = _stream_to_part(job, resp, offset if resp.status_code == 206 else 0)
+    if result is None:
+        return "corrupt", f"not a real {job['kind']}", None
+    sha, size = result
+    record = _entry(job, resp, sha, size)
+    if recheck and sha == (entry["sha256"] if entry else _sha256_file(job["path"])):
+        _drop_part(job)
+        return "unchanged", None, record
+    os.replace(_part_paths(job["path"])[0], job["path"])
+    _drop_part(job)
+    return ("updated" if recheck else "ok"), None, record
+
+def fetch_all(session, jobs, bank=None, headers=None, timeout=TIMEOUT, workers=MAX_WORKERS, per_host=PER_HOST):
+    """Download every job in parallel; returns the jobs (in input order) with status/error set.
+    With bank set, validators go to that bank's manifest and recheck jobs are revalidated."""
+    jobs, todo, paths = list(jobs), [], set()
+    for job in jobs:
+        if job["path"] in paths:
+            job["status"], job["error"] = "duplicate", None
+            continue
+        paths.add(job["path"])
+        if job.get("recheck") and not (RECHECK and bank):
+            job["status"], job["error"] = "unchanged", None
+            continue
+        todo.append(job)
+    if not todo:
+        return jobs
+    manifest = load_manifest(bank) if bank else {}
+    slots = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+    for host in {urlparse(j["url"]).netloc for j in todo}:
+        slots[host]   # create up front: defaultdict insertion is not atomic across threads
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo))), thread_name_prefix="fetch") as pool:
+        futures = {pool.submit(_fetch_one, session, job, headers, timeout, slots, manifest): job for job in todo}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                job["status"], job["error"], record = fut.result()
+                if record:
+                    manifest[job["url"]] = record   # workers only read the manifest
+            except Exception as e:
+                job["status"], job["error"], job["error_class"] = "error", str(e), type(e).__name__
+            if job["status"] == "unchanged":
+                continue
+            mark = ("OK" if job["status"] in ("ok", "updated") else
+                    "WARN" if job["status"] != "error" or job.get("recheck") else "ERROR")
+            print(f"    [{mark}] {job['label']}" + (f": {job['error']}" if job["error"] else "")
+                  + (" (changed on site)" if job["status"] == "updated" else ""))
+    if bank:
+        save_manifest(bank, manifest)
+        _update_retry_queue(bank, todo, session.headers.get("Referer"))
+    done = fetched(todo)
+    if done:
+        file_catalog.update([j["path"] for j in done],
+                            sha256={j["path"]: manifest[j["url"]]["sha256"] for j in done if j["url"] in manifest})
+    return jobs
+
+def batch_summary(jobs):
+    rechecks = sum(1 for j in jobs if j.get("recheck"))
+    return f"{len(jobs) - rechecks} new file(s), {rechecks} to re-check"
+
+def fetched(jobs):
+    """Jobs that wrote a file in this run (new or restated)."""
+    return [j for j in jobs if j.get("status") in ("ok", "updated")]
+
+def report_line(job):
+    """The per-file line the scrapers' end-of-run reports use."""
+    status = job.get("status")
+    if status == "ok":
+        return f"[OK] {job['label']}"
+    if status == "updated":
+        return f"[UPDATED] {job['label']}"
+    if status == "unchanged":
+        return f"[SKIP] Already exists: {job['label']}"
+    if job.get("recheck") and status != "duplicate":
+        return f"[SKIP] Already exists: {job['label']} (re-check failed: {job.get('error')})"
+    if status == "corrupt":
+        return f"[SKIP_CORRUPT] {job['label']}"
+    if status == "duplicate":
+        return f"[SKIP] Already queued: {job['label']}"
+    return f"[ERROR] {job['label']}: {job.get('error')}"
+
+def retry(banks=(), force=False):
+    """Fetch what the retry queue holds for each bank (all queued banks by default)."""
+    from http_client import new_session
+    banks = list(banks)
+    if not banks and os.path.isdir(RETRY_DIR):
+        banks = sorted(f[:-5] for f in os.listdir(RETRY_DIR) if f.endswith(".json"))
+    if not banks:
+        print("[INFO] retry queue is empty")
+    failed = 0
+    for bank in banks:
+        queue, now = load_retry_queue(bank), time.time()
+        due = [e for e in queue.values()
+               if force or (e["next_at"] <= now and e["attempts"] < RETRY_MAX_ATTEMPTS)]
+        print(f"[INFO] {bank}: retrying {len(due)} of {len(queue)} queued download(s)")
+        by_referer = {}
+        for e in due:
+            by_referer.setdefault(e.get("referer"), []).append(
+                download_job(e["url"], e["path"], e["kind"], e["label"], content_types=tuple(e["content_types"])))
+        for referer, jobs in by_referer.items():
+            for job in fetch_all(new_session(referer=referer), jobs, bank=bank):
+                failed += job["status"] not in ("ok", "updated", "unchanged")
+    return failed
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["retry"]:
+        sys.exit(1 if retry([a for a in args[1:] if a != "--all"], force="--all" in args) else 0)
+    print("usage: fetch.py retry [bank ...] [--all]")
+    sys.exit(2)
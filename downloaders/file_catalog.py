@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import sqlite3
+import hashlib
+import threading
+
+# ---- FILE CATALOG ----
+# One SQLite table of every file under raw_data/ and processed_data/, so "is this report already
+# here?" and "what is missing per quarter?" are indexed lookups instead of os.walk per link.
+#
+# files:  path (relative to the repo, "/"-separated), root (raw_data / processed_data), bank,
+#         folder (first sub-folder under the bank, "" for top-level files), period, report_type,
+#         name, ext, size, mtime, sha256
+# dirs:   path, parent, mtime_ns -- lets sync() skip every folder whose listing hasn't changed
+#
+# Writers keep it current: fetch_all() after each batch, the arrangers after moving files, and
+# anything else that adds/removes files calls update(paths). sync() reconciles with the disk
+# (manual copies, deletions) and only re-lists folders whose mtime changed since the last sync.
+# SCRAPER_DATA_ROOT: the folder holding raw_data/ and processed_data/ (default: the repo);
+# SCRAPER_CACHE_DIR: where files.sqlite lives (default: <repo>/.cache)
+REPO_ROOT = os.path.abspath(os.environ.get("SCRAPER_DATA_ROOT")
+                            or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+CATALOG_PATH = os.path.join(os.environ.get("SCRAPER_CACHE_DIR") or os.path.join(REPO_ROOT, ".cache"),
+                            "files.sqlite")
+ROOTS = ("raw_data", "processed_data")
+EXCEL_EXT = (".xlsx", ".xls")
+
+PERIOD_RE = re.compile(r"20\d{2}_(?:Q[1-4]|12m)")
+TYPE_PERIOD_RE = re.compile(r"(?P<type>.+?)_(?P<period>20\d{2}_(?:Q[1-4]|12m))")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, root TEXT, bank TEXT, folder TEXT, period TEXT, report_type TEXT,
+    name TEXT, ext TEXT, size INTEGER, mtime REAL, sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS files_bank_name ON files (bank, name);
+CREATE INDEX IF NOT EXISTS files_bank_period ON files (bank, period, report_type);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+"""
+
+_lock = threading.RLock()
+_conn = None
+
+def connect():
+    global _conn
+    with _lock:
+        if _conn is None:
+            os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+            _conn = sqlite3.connect(CATALOG_PATH, timeout=30, check_same_thread=False)
+            _conn.execute("PRAGMA journal_mode=WAL")   # app and scrapers read/write it side by side
+            _conn.executescript(_SCHEMA)
+        return _conn
+
+def _rel(path):
+    """Repo-relative "/" path, or None for anything outside raw_data/processed_data."""
+    rel = os.path.relpath(os.path.abspath(path), REPO_ROOT).replace(os.sep, "/")
+    return rel if rel.split("/", 1)[0] in ROOTS else None
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def describe(rel):
+    """raw_data/<bank>/[<folder>/...]<name> -> row fields parsed from the path alone."""
+    parts = rel.split("/")
+    root, bank, name = parts[0], parts[1] if len(parts) > 2 else "", parts[-1]
+    folder = parts[2] if len(parts) > 3 else ""
+    stem, ext = os.path.splitext(name)
+    period = next((p for p in parts[2:-1] if PERIOD_RE.fullmatch(p)), None)
+    m = TYPE_PERIOD_RE.match(stem)
+    report_type = None
+    if m:
+        period = period or m.group("period")
+        report_type = m.group("type")
+        if report_type.startswith(bank + "_"):   # bank_of_baku_balance_sheet_2024_Q1
+            report_type = report_type[len(bank) + 1:]
+    return {"path": rel, "root": root, "bank": bank, "folder": folder, "period": period,
+            "report_type": report_type, "name": name, "ext": ext.lower()}
+
+def _upsert(conn, rel, st, sha=None):
+    row = describe(rel)
+    old = conn.execute("SELECT size, mtime, sha256 FROM files WHERE path=?", (rel,)).fetchone()
+    if old and old[0] == st.st_size and old[1] == st.st_mtime and not sha:
+        return
+    row.update(size=st.st_size, mtime=st.st_mtime,
+               sha256=sha or _sha256(os.path.join(REPO_ROOT, rel)))
+    conn.execute("INSERT OR REPLACE INTO files VALUES (:path, :root, :bank, :folder, :period, :report_type,"
+                 " :name, :ext, :size, :mtime, :sha256)", row)
+
+def update(paths, sha256=None):
+    """Bring the rows for these files in line with the disk (added, rewritten or removed).
+    sha256: {path: digest} for files whose hash the caller already knows."""
+    conn, known = connect(), {}
+    for p, digest in (sha256 or {}).items():
+        rel = _rel(p)
+        if rel:
+            known[rel] = digest
+    with _lock, conn:
+        for path in paths:
+            rel = _rel(path)
+            if not rel:
+                continue
+            try:
+                st = os.stat(os.path.join(REPO_ROOT, rel))
+            except FileNotFoundError:
+                conn.execute("DELETE FROM files WHERE path=?", (rel,))
+                continue
+            _upsert(conn, rel, st, known.get(rel))
+
+# ---- SYNC ----
+def _sync_dir(conn, rel, full):
+    abs_dir = os.path.join(REPO_ROOT, rel)
+    try:
+        mtime_ns = os.stat(abs_dir).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        _forget_dir(conn, rel)
+        return
+    row = conn.execute("SELECT mtime_ns FROM dirs WHERE path=?", (rel,)).fetchone()
+    if row and row[0] == mtime_ns and not full:
+        # same listing as last time: only the sub-folders can have changed
+        for (child,) in conn.execute("SELECT path FROM dirs WHERE parent=?", (rel,)).fetchall():
+            _sync_dir(conn, child, full)
+        return
+    seen_files, seen_dirs = set(), set()
+    with os.scandir(abs_dir) as it:
+        for e in it:
+            child = f"{rel}/{e.name}"
+            if e.is_dir():
+                seen_dirs.add(child)
+                _sync_dir(conn, child, full)
+            elif e.is_file() and not e.name.endswith((".part", ".part.json")):
+                seen_files.add(child)
+                if rel.count("/"):   # files directly under raw_data/ or processed_data/ aren't a bank's
+                    _upsert(conn, child, e.stat())
+    for (path,) in conn.execute("SELECT path FROM files WHERE path LIKE ? ESCAPE '\\'",
+                                (_like_prefix(rel),)).fetchall():
+        if "/" not in path[len(rel) + 1:] and path not in seen_files:
+            conn.execute("DELETE FROM files WHERE path=?", (path,))
+    for (child,) in conn.execute("SELECT path FROM dirs WHERE parent=?", (rel,)).fetchall():
+        if child not in seen_dirs:
+            _forget_dir(conn, child)
+    parent = rel.rsplit("/", 1)[0] if "/" in rel else None
+    conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (rel, parent, mtime_ns))
+
+def _like_prefix(rel):
+    return rel.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+
+def _forget_dir(conn, rel):
+    conn.execute("DELETE FROM files WHERE path LIKE ? ESCAPE '\\'", (_like_prefix(rel),))
+    conn.execute("DELETE FROM dirs WHERE path=? OR path LIKE ? ESCAPE '\\'", (rel, _like_prefix(rel)))
+
+def sync(banks=None, full=False):
+    """Reconcile the catalog with raw_data/ and processed_data/ (only these banks if given).
+    full=True re-stats every file, e.g. after files were edited in place."""
+    conn = connect()
+    with _lock, conn:
+        for root in ROOTS:
+            if banks:
+                for bank in banks:
+                    _sync_dir(conn, f"{root}/{bank}", full)
+            else:
+                _sync_dir(conn, root, full)
+
+# ---- QUERIES ----
+def _where(bank, root=None, **eq):
+    clauses, args = ["bank=?"], [bank]
+    if root:
+        clauses.append("root=?")
+        args.append(root)
+    for col, val in eq.items():
+        if val is None:
+            continue
+        if isinstance(val, (tuple, list, set)):
+            clauses.append(f"{col} IN ({','.join('?' * len(val))})")
+            args.extend(val)
+        else:
+            clauses.append(f"{col}=?")
+            args.append(val)
+    return " AND ".join(clauses), args
+
+def exists(bank, name=None, root=None, period=None, report_type=None, ext=None):
+    """Is there a file for bank matching every given field? (ext may be a tuple)"""
+    where, args = _where(bank, root, name=name, period=period, report_type=report_type, ext=ext)
+    return connect().execute(f"SELECT 1 FROM files WHERE {where} LIMIT 1", args).fetchone() is not None
+
+def report_types(bank, root=None, ext=None):
+    """{period: {report_type, ...}} of the files present for bank."""
+    where, args = _where(bank, root, ext=ext)
+    out = {}
+    for period, rtype in connect().execute(
+            f"SELECT period, report_type FROM files WHERE {where} AND period IS NOT NULL", args):
+        out.setdefault(period, set()).add(rtype)
+    return out
+
+def folder_counts(bank, root):
+    """-> ({folder: (n_pdf, n_excel)}, non_empty, [(top-level file name, mtime)]) for raw_data/<bank>
+    or processed_data/<bank>, the way app.py's status badges look at a bank folder."""
+    conn = connect()
+    folders, top_files = {}, []
+    for folder, name, ext, mtime in conn.execute(
+            "SELECT folder, name, ext, mtime FROM files WHERE bank=? AND root=?", (bank, root)):
+        if not folder:
+            top_files.append((name, mtime))
+            continue
+        n_pdf, n_xl = folders.get(folder, (0, 0))
+        folders[folder] = (n_pdf + (ext == ".pdf"), n_xl + (ext in EXCEL_EXT))
+    # empty period folders still show up (as 0/0), as they did when the folders were scanned
+    for (path,) in conn.execute("SELECT path FROM dirs WHERE parent=?", (f"{root}/{bank}",)):
+        folders.setdefault(path.rsplit("/", 1)[1], (0, 0))
+    return folders, bool(folders or top_files), top_files
+
+if __name__ == "__main__":
+    sync(full="--full" in sys.argv)
+    n = connect().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    print(f"[INFO] {n} file(s) cataloged in {CATALOG_PATH}")
@@ -0,0 +1,113 @@
+import os
+import time
+import random
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import cassette
+
+# ---- SHARED HTTP CLIENT ----
+# Every downloader talks to the banks through new_session():
+#   - keep-alive connection pools per host, sized for fetch_all's parallel downloads
+#   - one browser-like User-Agent and Accept-Encoding (gzip, deflate, and br when brotli is installed)
+#   - retries with exponential backoff + jitter on connection errors and 429/5xx (Retry-After honoured)
+#   - a per-host rate limit: at most HOST_RATE requests per second start against one site
+#   - a default (connect, read) timeout for calls that don't pass one
+# import_browser_cookies() hands a Selenium tab's cookies to the session.
+# Under SCRAPER_CASSETTE=record/replay (see cassette.py) responses are recorded / served offline.
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/124.0 Safari/537.36")
+TIMEOUT = (10, 30)   # connect, read (per chunk when streaming, not the whole body)
+RETRIES = int(os.environ.get("SCRAPER_RETRIES", "4"))
+BACKOFF = 0.5        # 0.5, 1, 2, 4 s ... before jitter
+JITTER = 0.5         # up to +50% of each backoff, so parallel workers don't retry in lockstep
+HOST_RATE = float(os.environ.get("SCRAPER_HOST_RATE", "5"))   # requests/second per host, 0 -> unlimited
+POOL_SIZE = int(os.environ.get("SCRAPER_POOL_SIZE", "10"))    # connections kept per host
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+try:
+    import brotli  # noqa: F401  (urllib3 decodes "br" once it is importable)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+class JitterRetry(Retry):
+    def get_backoff_time(self):
+        base = super().get_backoff_time()
+        return base + random.uniform(0, base * JITTER) if base else 0
+
+class HostRateLimit:
+    """Spaces out request starts per host; thread-safe (fetch_all shares one session)."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_at = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at.get(host, now))
+            self.next_at[host] = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+class ClientSession(requests.Session):
+    def __init__(self, rate=HOST_RATE, timeout=TIMEOUT):
+        super().__init__()
+        self.limiter = HostRateLimit(rate)
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+    def send(self, request, **kwargs):
+        # also runs for every redirect hop
+        self.limiter.wait(request.url)
+        resp = super().send(request, **kwargs)
+        if cassette.RECORDING:
+            cassette.record_response(resp)
+        return resp
+
+def new_session(referer=None, retries=RETRIES, rate=HOST_RATE, timeout=TIMEOUT):
+    if cassette.REPLAYING:
+        session = ClientSession(rate=0, timeout=timeout)
+        adapter = cassette.replay_adapter()
+    else:
+        session = ClientSession(rate=rate, timeout=timeout)
+        retry = JitterRetry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=BACKOFF, status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset({"GET", "HEAD"}), respect_retry_after_header=True,
+            raise_on_status=False,   # the last response is returned; callers check .ok / status_code
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING})
+    if referer:
+        session.headers["Referer"] = referer
+    return session
+
+def _header_safe(value):
+    # http.client sends cookie values as latin-1; drop anything it can't encode
+    if isinstance(value, str):
+        return value.encode("latin-1", "ignore").decode("latin-1")
+    return value
+
+def import_browser_cookies(session, driver):
+    """Copy the tab's cookies (domain/path kept) into session so downloads reuse the browser's state."""
+    for c in driver.get_cookies():
+        session.cookies.set(c["name"], _header_safe(c["value"]),
+                            domain=c.get("domain", ""), path=c.get("path", "/"))
+    return session
@@ -1,16 +1,20 @@
 import os
 import re
-import time
-import requests
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+import file_catalog
+from fetch import download_job, fetch_all, fetched, batch_summary
+from waits import site_timeout, wait_present, wait_dom_quiet, arm_dom_watch
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from collections import defaultdict
-from urllib.parse import unquote, urlparse
+from urllib.parse import unquote, urlparse, urljoin
 
 BASE_URL = "https://www.kapitalbank.az/reports"
 RAW_DATA_DIR = os.path.join("raw_data", "kapital_bank")
 PROCESSED_DIR = os.path.join("processed_data", "kapital_bank")
+WAIT = site_timeout("kapital_bank")
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
@@ -21,11 +25,6 @@ CORE_6 = {
     "other_general_info":[["digər", "ümumi", "məlumat"]],
 }
 
-def clean_for_header(val):
-    if isinstance(val, str):
-        return val.encode("latin-1", "ignore").decode("latin-1")
-    return val
-
 def matches_keywords(text, keyword_sets):
     t = text.lower()
     for keywords in keyword_sets:
@@ -47,131 +46,129 @@ def extract_quarter(label):
     q_map = {"I": "Q1", "II": "Q2", "III": "Q3", "IV": "Q4"}
     return q_map.get(roman), year
 
-def is_real_excel(content):
-    return content[:2] == b'PK'
-
-def is_real_pdf(content):
-    return content[:5] == b'%PDF-'
-
 def file_exists_in_period(period_dir, fname):
     return os.path.exists(os.path.join(period_dir, fname))
 
-def main():
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--no-sandbox")
-    driver = uc.Chrome(options=options)
-    driver.get(BASE_URL)
-    time.sleep(3)
-
-    # Accept cookies if present
-    try:
-        accept_btn = driver.find_element(By.XPATH, "//button[contains(text(), 'Accept')]")
-        accept_btn.click()
-    except Exception:
-        pass
-    time.sleep(2)
-
-    # Prepare requests session with sanitized cookies
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], clean_for_header(cookie['value']))
-
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Referer": BASE_URL
-    }
-
-    accordion_titles = driver.find_elements(By.CSS_SELECTOR, ".accordion--pls--title")
-    per_quarter_files = defaultdict(set)
-
-    for title_elem in accordion_titles:
-        quarter_title = title_elem.text.strip()
-        quarter, year = extract_quarter(quarter_title)
-        if not quarter or not year or int(year) < 2020:
+def panel_entries(quarter_title, links):
+    """One accordion: its title + [(href, link text), ...] -> entries."""
+    quarter, year = extract_quarter(quarter_title)
+    if not quarter or not year or int(year) < 2020:
+        return []
+    period = f"{year}_{quarter}"
+    entries = []
+    for href, text in links:
+        ext = os.path.splitext((href or "").split("?")[0])[-1].lower().replace(".", "")
+        if not href or ext not in ["pdf", "xlsx", "xls"]:
             continue
-        period = f"{year}_{quarter}"
-        period_dir_raw = os.path.join(RAW_DATA_DIR, period)
-        period_dir_proc = os.path.join(PROCESSED_DIR, period)
-        os.makedirs(period_dir_raw, exist_ok=True)
-        os.makedirs(period_dir_proc, exist_ok=True)
+        # Try to match report type by link text first, then by filename
+        en_name = get_en_report_type(text)
+        if not en_name:
+            url_fname = unquote(os.path.basename(urlparse(href).path)).replace("_", " ").lower()
+            en_name = get_en_report_type(url_fname)
+        if en_name:
+            entries.append({"rtype": en_name, "period": period, "url": href, "ext": ext})
+    return entries
+
+def discover_http(session):
+    # collapsed accordions still carry their links in the markup
+    soup = get_soup(session, BASE_URL)
+    entries = []
+    for title in soup.select(".accordion--pls--title"):
+        wrap = title.find_parent(lambda t: t.name == "div" and "border-bottom-2" in (t.get("class") or []))
+        if wrap is None:
+            continue
+        links = [(urljoin(BASE_URL, a["href"]), text_of(a)) for a in wrap.find_all("a", href=True)]
+        entries += panel_entries(text_of(title), links)
+    return entries or None
+
+def discover_browser(session):
+    driver = open_tab("kapital_bank")
+    try:
+        driver.get(BASE_URL)
+        wait_present(driver, (By.CSS_SELECTOR, ".accordion--pls--title"), timeout=WAIT)
 
-        # Expand accordion
+        # Accept cookies if present
         try:
-            driver.execute_script("arguments[0].scrollIntoView();", title_elem)
-            ActionChains(driver).move_to_element(title_elem).perform()
-            if not title_elem.get_attribute("aria-expanded") or title_elem.get_attribute("aria-expanded") == "false":
-                title_elem.click()
-            time.sleep(1.0)
+            accept_btn = driver.find_element(By.XPATH, "//button[contains(text(), 'Accept')]")
+            arm_dom_watch(driver)
+            accept_btn.click()
+            wait_dom_quiet(driver, timeout=WAIT)
         except Exception:
-            continue
+            pass
 
-        # Find links
-        panel_wrap = title_elem.find_element(By.XPATH, "./ancestor::div[contains(@class,'border-bottom-2')]")
-        links = panel_wrap.find_elements(By.XPATH, ".//a[@href]")
-        for a in links:
-            href = a.get_attribute("href")
-            text = a.text.strip()
-            ext = os.path.splitext(href.split("?")[0])[-1].lower().replace(".", "")
-            if not href or ext not in ["pdf", "xlsx", "xls"]:
+        # Hand the cookies to the requests session (sanitized by import_browser_cookies)
+        import_browser_cookies(session, driver)
+
+        entries = []
+        for title_elem in driver.find_elements(By.CSS_SELECTOR, ".accordion--pls--title"):
+            quarter_title = title_elem.text.strip()
+            quarter, year = extract_quarter(quarter_title)
+            if not quarter or not year or int(year) < 2020:
                 continue
 
-            # Try to match report type by link text first, then by filename
-            en_name = get_en_report_type(text)
-            if not en_name:
-                url_fname = unquote(os.path.basename(urlparse(href).path)).replace("_", " ").lower()
-                en_name = get_en_report_type(url_fname)
-            if not en_name:
+            # Expand accordion
+            try:
+                driver.execute_script("arguments[0].scrollIntoView();", title_elem)
+                ActionChains(driver).move_to_element(title_elem).perform()
+                if not title_elem.get_attribute("aria-expanded") or title_elem.get_attribute("aria-expanded") == "false":
+                    arm_dom_watch(driver)
+                    title_elem.click()
+                    wait_dom_quiet(driver, timeout=WAIT)
+            except Exception:
                 continue
 
-            fname = f"{en_name}_{period}.{ext}"
-            if ext in ["xlsx", "xls"]:
-                fpath = os.path.join(period_dir_proc, fname)
-                if file_exists_in_period(period_dir_proc, fname):
-                    print(f"[SKIP] Already exists: {period}/{fname}")
-                    per_quarter_files[period].add(en_name)
-                    continue
-                print(f"Downloading: {period}/{fname}")
-                r = session.get(href, headers=headers, timeout=20)
-                if not is_real_excel(r.content):
-                    print(f"  [!] Not a real Excel (skipped): {href}")
-                    continue
-                with open(fpath, "wb") as out:
-                    out.write(r.content)
+            # Find links
+            panel_wrap = title_elem.find_element(By.XPATH, "./ancestor::div[contains(@class,'border-bottom-2')]")
+            links = [(a.get_attribute("href"), a.text.strip()) for a in panel_wrap.find_elements(By.XPATH, ".//a[@href]")]
+            entries += panel_entries(quarter_title, links)
+        return entries
+    finally:
+        release_tab(driver)
+
+def main():
+    session = new_session(referer=BASE_URL)
+    file_catalog.sync(["kapital_bank"])
+    entries = discover("kapital_bank", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=BASE_URL)
+
+    per_quarter_files = defaultdict(set)
+    jobs = []
+    for e in entries:
+        en_name, period, href, ext = e["rtype"], e["period"], e["url"], e["ext"]
+        period_dir_raw = os.path.join(RAW_DATA_DIR, period)
+        period_dir_proc = os.path.join(PROCESSED_DIR, period)
+        os.makedirs(period_dir_raw, exist_ok=True)
+        os.makedirs(period_dir_proc, exist_ok=True)
+
+        fname = f"{en_name}_{period}.{ext}"
+        if ext in ["xlsx", "xls"]:
+            fpath = os.path.join(period_dir_proc, fname)
+            recheck = file_exists_in_period(period_dir_proc, fname)
+            if recheck:
                 per_quarter_files[period].add(en_name)
-            elif ext == "pdf":
-                fpath = os.path.join(period_dir_raw, fname)
-                if file_exists_in_period(period_dir_raw, fname):
-                    print(f"[SKIP] Already exists: {period}/{fname}")
-                    per_quarter_files[period].add(en_name)
-                    continue
-                print(f"[PDF] {period}/{fname}")
-                r = session.get(href, headers=headers, timeout=20)
-                if not is_real_pdf(r.content):
-                    print(f"  [!] Not a real PDF (skipped): {href}")
-                    continue
-                with open(fpath, "wb") as out:
-                    out.write(r.content)
+            else:
+                print(f"Queued: {period}/{fname}")
+            jobs.append(download_job(href, fpath, "excel", f"{period}/{fname}", period=period, rtype=en_name,
+                                     recheck=recheck))
+        elif ext == "pdf":
+            fpath = os.path.join(period_dir_raw, fname)
+            recheck = file_exists_in_period(period_dir_raw, fname)
+            if recheck:
                 per_quarter_files[period].add(en_name)
-        time.sleep(0.5)
-    driver.quit()
+            else:
+                print(f"[PDF] queued: {period}/{fname}")
+            jobs.append(download_job(href, fpath, "pdf", f"{period}/{fname}", period=period, rtype=en_name,
+                                     recheck=recheck))
+
+    print(f"\nDownloading {batch_summary(jobs)}...")
+    for job in fetched(fetch_all(session, jobs, bank="kapital_bank")):
+        per_quarter_files[job["period"]].add(job["rtype"])
 
     # -- Rebuild per_quarter_files from all files present on disk (future-proof, accurate) --
     per_quarter_files_disk = defaultdict(set)
-    for dirpath, _, files in os.walk(PROCESSED_DIR):
-        for fname in files:
-            m = re.match(r"([a-z_]+)_(20\d{2}_Q[1-4]|20\d{2}_12m)\.(xlsx|xls)", fname)
-            if m:
-                report_type, period, ext = m.groups()
-                per_quarter_files_disk[period].add(report_type)
-    for dirpath, _, files in os.walk(RAW_DATA_DIR):
-        for fname in files:
-            m = re.match(r"([a-z_]+)_(20\d{2}_Q[1-4]|20\d{2}_12m)\.pdf", fname)
-            if m:
-                report_type, period = m.groups()
-                per_quarter_files_disk[period].add(report_type)
+    for root, exts in (("processed_data", (".xlsx", ".xls")), ("raw_data", (".pdf",))):
+        for period, types in file_catalog.report_types("kapital_bank", root=root, ext=exts).items():
+            per_quarter_files_disk[period] |= types
 
     print("\n=== SUMMARY OF MISSING REPORTS PER QUARTER ===")
     core_keys = list(CORE_6.keys())
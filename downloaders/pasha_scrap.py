@@ -1,17 +1,21 @@
 import os
 import re
-import time
 import unidecode
-import requests
 import shutil
 from selenium.webdriver.common.by import By
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+import file_catalog
+from fetch import download_job, fetch_all, report_line, kind_for, batch_summary
+from waits import site_timeout, wait_count_stable, wait_dom_quiet, arm_dom_watch
 from collections import defaultdict
 from urllib.parse import urljoin
 
 BASE_URL = "https://www.pashabank.az/static,95/lang,az/"
 RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'raw_data', 'pasha_bank')
 PROCESSED_ROOT = os.path.join(os.path.dirname(__file__), '..', 'processed_data', 'pasha_bank')
+WAIT = site_timeout("pasha_bank")
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_ROOT, exist_ok=True)
 
@@ -72,62 +76,17 @@ def is_2022_or_after(year, period):
         return period in ["Q1", "Q2", "Q3", "Q4"]
     return False
 
-def file_exists_anywhere(root, fname):
-    for dirpath, _, files in os.walk(root):
-        if fname in files:
-            return True
-    return False
-
-def main():
-    BASE_EXPECTED = [
-        "balance_sheet", "cash_flow", "credit_risk", "currency_risk", "other_data"
-    ]
-    report = []
-    per_quarter_files = defaultdict(set)
-    present_periods = set()
+def file_exists_anywhere(fname, root=None):
+    return file_catalog.exists("pasha_bank", name=fname, root=root)
 
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver = uc.Chrome(options=options)
-    driver.get(BASE_URL)
-    time.sleep(3)
-    try:
-        accept_btn = driver.find_element(By.XPATH, "//button[contains(text(), 'Qəbul et')]")
-        accept_btn.click()
-        time.sleep(1)
-    except Exception:
-        pass
-
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], cookie['value'])
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Referer": BASE_URL
-    }
-
-    links = driver.find_elements(By.TAG_NAME, "a")
-    files_on_site = defaultdict(dict)
-    unmatched_links = []
-
-    for link in links:
-        href = link.get_attribute("href")
-        text = link.text.strip()
+def link_entries(links):
+    """[(href, link text), ...] -> entries for the report links we keep."""
+    entries = []
+    for href, text in links:
         if not href:
             continue
         if not any(href.lower().endswith(ext) for ext in VALID_EXTENSIONS):
             continue
-        if not text:
-            try:
-                text = link.find_element(By.XPATH, ".//strong").text.strip()
-            except:
-                try:
-                    text = link.find_element(By.XPATH, "..").text.strip()
-                except:
-                    text = href
-
         if should_skip(text, href):
             continue
 
@@ -138,7 +97,6 @@ def main():
                 section_type = en
                 break
         if not section_type:
-            unmatched_links.append((text, text_norm, href))
             continue
 
         year, period = get_year_period(text)
@@ -149,43 +107,95 @@ def main():
             continue
         if not href.startswith("http"):
             href = urljoin(BASE_URL, href)
+        entries.append({"rtype": section_type, "year": year, "period": period, "url": href, "ext": ext})
+    return entries
+
+def discover_http(session):
+    soup = get_soup(session, BASE_URL)
+    links = []
+    for a in soup.find_all("a", href=True):
+        # same fallbacks as the browser path: <strong> inside the link, then the parent's text
+        text = text_of(a) or text_of(a.find("strong")) or text_of(a.parent) or a["href"]
+        links.append((urljoin(BASE_URL, a["href"]), text))
+    return link_entries(links) or None
+
+def discover_browser(session):
+    driver = open_tab("pasha_bank")
+    try:
+        driver.get(BASE_URL)
+        wait_count_stable(driver, (By.TAG_NAME, "a"), timeout=WAIT)
+        try:
+            accept_btn = driver.find_element(By.XPATH, "//button[contains(text(), 'Qəbul et')]")
+            arm_dom_watch(driver)
+            accept_btn.click()
+            wait_dom_quiet(driver, timeout=WAIT)
+        except Exception:
+            pass
+
+        import_browser_cookies(session, driver)
+
+        links = []
+        for link in driver.find_elements(By.TAG_NAME, "a"):
+            href = link.get_attribute("href")
+            text = link.text.strip()
+            if not href:
+                continue
+            if not text:
+                try:
+                    text = link.find_element(By.XPATH, ".//strong").text.strip()
+                except:
+                    try:
+                        text = link.find_element(By.XPATH, "..").text.strip()
+                    except:
+                        text = href
+            links.append((href, text))
+        return link_entries(links)
+    finally:
+        release_tab(driver)
 
+def main():
+    BASE_EXPECTED = [
+        "balance_sheet", "cash_flow", "credit_risk", "currency_risk", "other_data"
+    ]
+    report = []
+    per_quarter_files = defaultdict(set)
+    present_periods = set()
+
+    session = new_session(referer=BASE_URL)
+    file_catalog.sync(["pasha_bank"])
+    entries = discover("pasha_bank", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=BASE_URL)
+
+    jobs = []
+    for e in entries:
+        section_type, year, period, href, ext = e["rtype"], e["year"], e["period"], e["url"], e["ext"]
         save_name = f"{section_type}_{year}_{period}{ext}"
         period_dir = os.path.join(RAW_DATA_DIR, f"{year}_{period}")
         os.makedirs(period_dir, exist_ok=True)
         fpath_actual = os.path.join(period_dir, save_name)
 
-        # Check exists in period subfolder or anywhere
-        already_exists = (
-            file_exists_anywhere(period_dir, save_name) or 
-            file_exists_anywhere(RAW_DATA_DIR, save_name) or 
-            file_exists_anywhere(PROCESSED_ROOT, save_name)
-        )
+        # Check exists in period subfolder or anywhere (raw or processed)
+        already_exists = file_exists_anywhere(save_name)
+        # re-check the copy where it normally lives (raw, or processed once arranged)
+        on_disk = next((p for p in (fpath_actual, os.path.join(PROCESSED_ROOT, f"{year}_{period}", save_name))
+                        if os.path.exists(p)), None)
         if already_exists:
-            report.append(f"[SKIP] Already exists: {save_name}")
             per_quarter_files[f"{year}_{period}"].add(section_type)
             present_periods.add((year, period))
-            continue
-
-        # Download and save
-        try:
-            print(f"    Downloading: {save_name}")
-            r = session.get(href, headers=headers, timeout=20)
-            if (save_name.endswith(".pdf") and not r.content.startswith(b'%PDF-')) or (
-                save_name.endswith(".xlsx") and r.content[:2] != b'PK'
-            ):
-                report.append(f"[SKIP_CORRUPT] {save_name}")
+            if not on_disk:
+                report.append(f"[SKIP] Already exists: {save_name}")
                 continue
-            with open(fpath_actual, "wb") as out:
-                out.write(r.content)
-            report.append(f"[OK] {save_name}")
-            per_quarter_files[f"{year}_{period}"].add(section_type)
-            present_periods.add((year, period))
-        except Exception as e:
-            report.append(f"[ERROR] {save_name}: {e}")
-            continue
+        else:
+            print(f"    Queued: {save_name}")
+        jobs.append(download_job(href, on_disk or fpath_actual, kind_for(save_name), save_name,
+                                 year=year, period=period, rtype=section_type, recheck=bool(on_disk)))
 
-    driver.quit()
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="pasha_bank"):
+        report.append(report_line(job))
+        if job["status"] == "ok":
+            per_quarter_files[f"{job['year']}_{job['period']}"].add(job["rtype"])
+            present_periods.add((job["year"], job["period"]))
 
     print("\n=== FULL REPORT ===")
     for line in report:
@@ -201,18 +211,10 @@ def main():
             expected_types = BASE_EXPECTED + ["capital_change"]
         missing = []
         for k in expected_types:
-            fname_pdf = f"{k}_{year}_{period}.pdf"
-            fname_xlsx = f"{k}_{year}_{period}.xlsx"
-            fname_xls = f"{k}_{year}_{period}.xls"
             if not (
-                file_exists_anywhere(os.path.join(RAW_DATA_DIR, f"{year}_{period}"), fname_pdf)
-                or file_exists_anywhere(os.path.join(RAW_DATA_DIR, f"{year}_{period}"), fname_xlsx)
-                or file_exists_anywhere(os.path.join(RAW_DATA_DIR, f"{year}_{period}"), fname_xls)
-                or file_exists_anywhere(RAW_DATA_DIR, fname_pdf)
-                or file_exists_anywhere(RAW_DATA_DIR, fname_xlsx)
-                or file_exists_anywhere(RAW_DATA_DIR, fname_xls)
-                or file_exists_anywhere(PROCESSED_ROOT, fname_xlsx)
-                or file_exists_anywhere(PROCESSED_ROOT, fname_xls)
+                file_exists_anywhere(f"{k}_{year}_{period}.pdf", root="raw_data")
+                or file_exists_anywhere(f"{k}_{year}_{period}.xlsx")
+                or file_exists_anywhere(f"{k}_{year}_{period}.xls")
             ):
                 missing.append(k)
         if missing:
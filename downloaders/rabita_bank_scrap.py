@@ -1,8 +1,10 @@
 import os
 import re
-import requests
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
+from http_client import new_session
+import file_catalog
+from fetch import download_job, fetch_all, fetched, batch_summary
 
 BASE = "https://www.rabitabank.com"
 OUTDIR = os.path.join("processed_data", "rabitabank")
@@ -52,7 +54,7 @@ def extract_year_from_url(url):
     return None
 
 def main():
-    session = requests.Session()
+    session = new_session()
     possible_menus = [
         "https://www.rabitabank.com/other/reports/quarterly-reports/reports-2025",
         "https://www.rabitabank.com/diger/hesabatlar/rubluk-hesabatlar/2025-ci-ilin-hesabatlari"
@@ -60,7 +62,7 @@ def main():
     year_links = set()
     for menu_url in possible_menus:
         try:
-            r = session.get(menu_url, timeout=20)
+            r = session.get(menu_url)
             soup = BeautifulSoup(r.content, "html.parser")
             for a in soup.select("ul.reports-other__filters a"):
                 href = a.get("href")
@@ -71,13 +73,14 @@ def main():
 
     # { period: {core_name: present_bool} }
     status = {}
+    jobs = []
     for year_url in year_links:
         year_full_url = year_url if year_url.startswith("http") else urljoin(BASE, year_url)
         year = extract_year_from_url(year_url)
         if not year or int(year) < 2020:
             continue
         try:
-            rr = session.get(year_full_url, timeout=20)
+            rr = session.get(year_full_url)
         except Exception as e:
             print(f"[ERROR] could not fetch {year_full_url}: {e}")
             continue
@@ -98,41 +101,34 @@ def main():
             period_dir = os.path.join(OUTDIR, period)
             os.makedirs(period_dir, exist_ok=True)
             path = os.path.join(period_dir, fname)
-            if os.path.exists(path):
-                print(f"[SKIP] Already exists: {period}/{fname}")
+            recheck = os.path.exists(path)
+            if recheck:
                 status.setdefault(period, {})[en_name] = True
-                continue
-            # Download
+            # Download (or re-check the copy on disk)
             a = item.find("a", class_="reports-other__link")
             if not a or not a.get("href"):
                 continue
             file_url = urljoin(BASE, a["href"])
-            print(f"Downloading {en_name} for {period} -> {fname}")
-            try:
-                file_r = session.get(file_url, timeout=30)
-                with open(path, "wb") as out:
-                    out.write(file_r.content)
-                status.setdefault(period, {})[en_name] = True
-            except Exception as e:
-                print(f"[ERROR] {file_url}: {e}")
+            if not recheck:
+                print(f"Queued {en_name} for {period} -> {fname}")
+            jobs.append(download_job(file_url, path, None, f"{period}/{fname}", period=period, rtype=en_name,
+                                     recheck=recheck))
+
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetched(fetch_all(session, jobs, bank="rabitabank")):
+        status.setdefault(job["period"], {})[job["rtype"]] = True
 
     # --------- FIX: Now rescan ALL folders for ALL files (even if manually added) ---------
-    for period_folder in os.listdir(OUTDIR):
-        abs_period = os.path.join(OUTDIR, period_folder)
-        if not os.path.isdir(abs_period):
-            continue
+    file_catalog.sync(["rabitabank"])
+    on_disk = file_catalog.report_types("rabitabank", root="processed_data", ext=".xlsx")
+    for period, types in on_disk.items():
         for core in CORE_9:
-            expected = f"{core}_{period_folder}.xlsx"
-            if os.path.exists(os.path.join(abs_period, expected)):
-                status.setdefault(period_folder, {})[core] = True
+            if core in types:
+                status.setdefault(period, {})[core] = True
 
     # Check for all 9 reports in each period
     print("\n=== SUMMARY OF MISSING REPORTS PER QUARTER ===")
-    all_periods = sorted(os.listdir(OUTDIR))
-    for period in all_periods:
-        period_path = os.path.join(OUTDIR, period)
-        if not os.path.isdir(period_path):
-            continue
+    for period in sorted(set(on_disk) | set(status)):
         present = set(status.get(period, {}).keys())
         missing = [c for c in CORE_9.keys() if c not in present]
         if missing:
@@ -1,12 +1,15 @@
 import os
-import re
-import time
-import requests
 from selenium.webdriver.common.by import By
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+import file_catalog
+from fetch import download_job, fetch_all, fetched, report_line, batch_summary
+from waits import site_timeout, wait_present, wait_dom_quiet, arm_dom_watch
 
 BASE_URL = "https://unibank.az/az/documents/quarterlyReports"
 PROCESSED_ROOT = os.path.join("processed_data", "unibank")
+WAIT = site_timeout("unibank")
 os.makedirs(PROCESSED_ROOT, exist_ok=True)
 
 def normalize_quarter(text):
@@ -14,108 +17,129 @@ def normalize_quarter(text):
     text = text.upper().replace("RÜB", "").strip()
     return roman_map.get(text, text.replace(" ", "_"))
 
-def file_exists_anywhere(root, fname):
-    for dirpath, _, files in os.walk(root):
-        if fname in files:
-            return True
-    return False
+def entry_for(year, qtext, href):
+    quarter = normalize_quarter(qtext)   # "I rüb", "II rüb", etc
+    if not href or not href.endswith(".xlsx") or not quarter.startswith("Q"):
+        return None
+    url = "https://unibank.az" + href if href.startswith("/") else href
+    return {"rtype": "unibank", "period": f"{year}_{quarter}", "url": url, "year": year, "quarter": quarter}
 
-def main():
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver = uc.Chrome(options=options)
-    driver.get(BASE_URL)
-    time.sleep(3.5)
-
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], cookie['value'])
-    headers = {"User-Agent": "Mozilla/5.0", "Referer": BASE_URL}
+def years_in(soup):
+    return sorted({int(a["data-year"]) for a in soup.select("a[data-year]") if a["data-year"].isdigit()}, reverse=True)
 
-    report = []
-    total_downloaded = 0
-    years = []
-    # Get all available years dynamically
-    for year_tab in driver.find_elements(By.CSS_SELECTOR, "a[data-year]"):
-        y = year_tab.get_attribute("data-year")
-        if y and y.isdigit():
-            years.append(int(y))
-    years = sorted(list(set(years)), reverse=True)
+def listed_years(session):
+    """Years with a tab on the listing (the page discover() already fetched), [] if unreachable."""
+    try:
+        return years_in(get_soup(session, BASE_URL))
+    except Exception as e:
+        print(f"[WARN] could not read the year tabs: {e}")
+        return []
 
-    # To record what we have on disk later
-    all_quarters = set()
+def discover_http(session):
+    # the year tabs only toggle panes that are already in the page: find each year's pane
+    soup = get_soup(session, BASE_URL)
+    years = years_in(soup)
+    entries = []
     for year in years:
-        try:
-            # Click year tab
-            year_tab = driver.find_element(By.XPATH, f"//a[@data-year='{year}']")
-            driver.execute_script("arguments[0].scrollIntoView(true);", year_tab)
-            year_tab.click()
-            time.sleep(1.4)
-            btn_blocks = driver.find_elements(By.CSS_SELECTOR, "div.document__btn--1")
-            found_any = False
-            for block in btn_blocks:
-                if not block.is_displayed():
-                    continue
-                try:
-                    a = block.find_element(By.CSS_SELECTOR, "a.document__btn[title='Yüklə']")
-                    qtext = a.text.strip()  # "I rüb", "II rüb", etc
-                    quarter = normalize_quarter(qtext)
-                    href = a.get_attribute("href")
-                    if not href or not href.endswith(".xlsx") or not quarter.startswith("Q"):
+        for pane in soup.select(f"[data-year='{year}']"):
+            if pane.name == "a":
+                continue
+            for a in pane.select("div.document__btn--1 a.document__btn[title='Yüklə']"):
+                entry = entry_for(year, text_of(a), a.get("href"))
+                if entry:
+                    entries.append(entry)
+    return entries or None
+
+def discover_browser(session):
+    driver = open_tab("unibank", block=("images", "fonts"))   # keep CSS: blocks are picked by is_displayed()
+    try:
+        driver.get(BASE_URL)
+        wait_present(driver, (By.CSS_SELECTOR, "a[data-year]"), timeout=WAIT)
+        import_browser_cookies(session, driver)
+
+        years = []
+        # Get all available years dynamically
+        for year_tab in driver.find_elements(By.CSS_SELECTOR, "a[data-year]"):
+            y = year_tab.get_attribute("data-year")
+            if y and y.isdigit():
+                years.append(int(y))
+        years = sorted(list(set(years)), reverse=True)
+
+        entries = []
+        for year in years:
+            try:
+                # Click year tab
+                year_tab = driver.find_element(By.XPATH, f"//a[@data-year='{year}']")
+                driver.execute_script("arguments[0].scrollIntoView(true);", year_tab)
+                arm_dom_watch(driver)
+                year_tab.click()
+                wait_dom_quiet(driver, timeout=WAIT)
+                found_any = False
+                for block in driver.find_elements(By.CSS_SELECTOR, "div.document__btn--1"):
+                    if not block.is_displayed():
                         continue
-                    subfolder = f"{year}_{quarter}"
-                    save_name = f"unibank_{year}_{quarter}.xlsx"
-                    period_dir = os.path.join(PROCESSED_ROOT, subfolder)
-                    os.makedirs(period_dir, exist_ok=True)
-                    fpath = os.path.join(period_dir, save_name)
-                    all_quarters.add((year, quarter))
-                    if file_exists_anywhere(PROCESSED_ROOT, save_name):
-                        report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                        found_any = True
+                    try:
+                        a = block.find_element(By.CSS_SELECTOR, "a.document__btn[title='Yüklə']")
+                        entry = entry_for(year, a.text.strip(), a.get_attribute("href"))
+                    except Exception as e:
+                        print(f"[ERROR] {year}: {e}")
                         continue
-                    url = "https://unibank.az" + href if href.startswith("/") else href
-                    print(f"    Downloading: {subfolder}/{save_name}")
-                    r = session.get(url, headers=headers, timeout=25)
-                    if r.status_code == 200 and r.content[:2] == b'PK':
-                        with open(fpath, "wb") as out:
-                            out.write(r.content)
-                        report.append(f"[OK] {subfolder}/{save_name}")
-                        total_downloaded += 1
+                    if entry:
+                        entries.append(entry)
                         found_any = True
-                    else:
-                        report.append(f"[SKIP_CORRUPT] {subfolder}/{save_name}")
-                except Exception as e:
-                    report.append(f"[ERROR] {year} {quarter}: {e}")
-            if not found_any:
-                report.append(f"[SKIP] No reports found for {year}")
-        except Exception as e:
-            report.append(f"[SKIP] Year {year}: {e}")
+                if not found_any:
+                    print(f"[SKIP] No reports found for {year}")
+            except Exception as e:
+                print(f"[SKIP] Year {year}: {e}")
+        return entries
+    finally:
+        release_tab(driver)
+
+def main():
+    session = new_session(referer=BASE_URL)
+    entries = discover("unibank", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=BASE_URL)
+
+    report = []
+    jobs = []
+    # To record what we have on disk later
+    all_quarters = set()
+    file_catalog.sync(["unibank"])
+    for e in entries:
+        year, quarter, subfolder = e["year"], e["quarter"], e["period"]
+        save_name = f"unibank_{year}_{quarter}.xlsx"
+        period_dir = os.path.join(PROCESSED_ROOT, subfolder)
+        os.makedirs(period_dir, exist_ok=True)
+        fpath = os.path.join(period_dir, save_name)
+        all_quarters.add((year, quarter))
+        recheck = os.path.exists(fpath)
+        if not recheck and file_catalog.exists("unibank", name=save_name, root="processed_data"):
+            report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
+            continue
+        if not recheck:
+            print(f"    Queued: {subfolder}/{save_name}")
+        jobs.append(download_job(e["url"], fpath, "excel", f"{subfolder}/{save_name}", recheck=recheck))
+
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="unibank"):
+        report.append(report_line(job))
+    total_downloaded = len(fetched(jobs))
 
     print("\n=== UNIBANK FULL REPORT ===")
     for line in report:
         print(line)
 
-    # Scan all present files on disk for missing report
-    present_files = set()
-    for dirpath, _, files in os.walk(PROCESSED_ROOT):
-        for fname in files:
-            m = re.match(r"unibank_(\d{4})_(Q[1-4])\.xlsx", fname)
-            if m:
-                present_files.add((int(m.group(1)), m.group(2)))
     if not all_quarters:
-        # In case no quarters were found on site, build all combinations for present years
-        for year in years:
+        # In case no quarters were found on site, build all combinations for the listed years
+        for year in listed_years(session):
             for q in ["Q1", "Q2", "Q3", "Q4"]:
                 all_quarters.add((year, q))
 
     print("\n=== SUMMARY OF MISSING REPORTS PER YEAR/QUARTER ===")
     for y, q in sorted(all_quarters, reverse=True):
-        if (y, q) not in present_files:
+        if not file_catalog.exists("unibank", name=f"unibank_{y}_{q}.xlsx", root="processed_data"):
             print(f"{y}_{q}: MISSING unibank_{y}_{q}.xlsx")
     print("Done.\nAll Excels in processed_data/unibank/<year>_<quarter>/")
-    driver.quit()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,109 @@
+import time
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+# ---- CONDITION-BASED WAITS ----
+# Every helper returns as soon as its condition holds and gives up quietly (None/False) at the
+# timeout, like the fixed sleeps they replace: callers carry on with whatever the page has.
+DEFAULT_TIMEOUT = 10
+SITE_TIMEOUTS = {          # slowest page transition seen per site, in seconds
+    "abb_bank": 15,
+    "access_bank": 15,
+    "bank_of_baku": 10,
+    "cbar": 15,
+    "kapital_bank": 12,
+    "pasha_bank": 12,
+    "unibank": 10,
+    "xalq_bank": 12,
+    "yelobank": 10,
+}
+POLL = 0.1
+QUIET = 0.35   # DOM considered settled after this long without mutations
+
+def site_timeout(bank):
+    return SITE_TIMEOUTS.get(bank, DEFAULT_TIMEOUT)
+
+def _until(driver, cond, timeout):
+    try:
+        return WebDriverWait(driver, timeout or DEFAULT_TIMEOUT, poll_frequency=POLL,
+                             ignored_exceptions=(StaleElementReferenceException,)).until(cond)
+    except TimeoutException:
+        return None
+
+def wait_ready(driver, timeout=None):
+    return _until(driver, lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+
+def wait_present(driver, locator, timeout=None):
+    """First element matching locator (By, value) once it is in the DOM."""
+    return _until(driver, EC.presence_of_element_located(locator), timeout)
+
+def wait_clickable(driver, locator_or_el, timeout=None):
+    return _until(driver, EC.element_to_be_clickable(locator_or_el), timeout)
+
+def wait_attr(driver, el, attr, value, timeout=None):
+    return _until(driver, lambda d: el.get_attribute(attr) == value, timeout)
+
+def wait_count_stable(driver, locator, root=None, settle=0.5, timeout=None):
+    """Elements matching locator once their number stopped changing for `settle` seconds."""
+    scope = root or driver
+    state = {"n": -1, "since": time.monotonic()}
+    def stable(_):
+        n = len(scope.find_elements(*locator))
+        now = time.monotonic()
+        if n != state["n"]:
+            state["n"], state["since"] = n, now
+            return False
+        return n > 0 and now - state["since"] >= settle
+    _until(driver, stable, timeout)
+    return scope.find_elements(*locator)
+
+# MutationObserver on root (default: whole document); returns ms since its last mutation
+_MUTATION_JS = """
+const root = arguments[0] || document.documentElement;
+if (!root.__mutObs) {
+  root.__lastMutation = performance.now();
+  root.__mutObs = new MutationObserver(() => { root.__lastMutation = performance.now(); });
+  root.__mutObs.observe(root, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+if (arguments[1]) root.__lastMutation = performance.now();   // re-arm: restart the quiet window
+return performance.now() - root.__lastMutation;
+"""
+
+def wait_dom_quiet(driver, root=None, quiet=QUIET, timeout=None):
+    """Return once root has had no DOM mutations for `quiet` seconds (e.g. after a click)."""
+    return _until(driver, lambda d: d.execute_script(_MUTATION_JS, root, False) >= quiet * 1000, timeout) is not None
+
+def arm_dom_watch(driver, root=None):
+    """Start (or restart) the quiet window now, so a following wait_dom_quiet can't return early."""
+    driver.execute_script(_MUTATION_JS, root, True)
+
+def click_and_settle(driver, el, root=None, header_offset=None, timeout=None):
+    """Scroll el into view, JS-click it, then wait for the DOM under root to settle."""
+    if header_offset is None:
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", el)
+    else:
+        driver.execute_script(
+            "window.scrollTo(0, arguments[0].getBoundingClientRect().top + window.scrollY - arguments[1]);",
+            el, header_offset
+        )
+    arm_dom_watch(driver, root)
+    driver.execute_script("arguments[0].click();", el)
+    return wait_dom_quiet(driver, root, timeout=timeout)
+
+def scroll_until_stable(driver, el=None, max_rounds=30, timeout=None):
+    """Scroll el (or the window) to the bottom until its scrollHeight stops growing (lazy lists)."""
+    height_js = ("return arguments[0].scrollHeight;" if el is not None
+                 else "return document.body.scrollHeight;")
+    scroll_js = ("arguments[0].scrollTop = arguments[0].scrollHeight;" if el is not None
+                 else "window.scrollTo(0, document.body.scrollHeight);")
+    last = -1
+    for _ in range(max_rounds):
+        arm_dom_watch(driver, el)
+        driver.execute_script(scroll_js, el)
+        wait_dom_quiet(driver, el, timeout=timeout)
+        h = driver.execute_script(height_js, el)
+        if h == last:
+            break
+        last = h
+    return last
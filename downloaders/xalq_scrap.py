@@ -1,14 +1,18 @@
 import os
 import re
-import time
 import unidecode
-import requests
+from urllib.parse import urljoin
 from selenium.webdriver.common.by import By
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+from fetch import download_job, fetch_all, fetched, kind_for, report_line, batch_summary
+from waits import site_timeout, wait_present, wait_count_stable, click_and_settle
 
 BASE_URL = "https://xalqbank.az/az/ferdi/bank/bank-haqqinda-melumatlarin-aciqlanmasi/maliyye-gostericileri-tab?include=menu"
 RAW_DATA_DIR = os.path.join("raw_data", "xalq_bank")
 PROCESSED_DATA_DIR = os.path.join("processed_data", "xalq_bank")
+WAIT = site_timeout("xalq_bank")
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
 
@@ -69,90 +73,102 @@ def file_exists_excel(report_type, yyyy, quarter):
     return False
 
 def safe_click(driver, elem, header_offset=120):
-    driver.execute_script(
-        "window.scrollTo(0, arguments[0].getBoundingClientRect().top + window.scrollY - arguments[1]);",
-        elem, header_offset
-    )
-    time.sleep(0.4)
-    driver.execute_script("arguments[0].click();", elem)
-    time.sleep(2.3)
-
-def main():
-    report = []
-    total_downloaded = 0
-    all_year_quarters = set()
-
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver = uc.Chrome(options=options)
-    driver.get(BASE_URL)
-    time.sleep(4)
-
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], cookie['value'])
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Referer": BASE_URL
-    }
+    click_and_settle(driver, elem, header_offset=header_offset, timeout=WAIT)
 
+def section_entries(en_name, links):
+    """[(href, link text), ...] of one section -> entries."""
+    entries = []
+    for href, info_text in links:
+        if not href or not any(href.lower().endswith(ext) for ext in VALID_EXTENSIONS):
+            continue
+        year, quarter = get_year_period(info_text)
+        if not year or quarter == "unknown" or not year.isdigit() or int(year) < 2020:
+            continue
+        entries.append({"rtype": en_name, "period": f"{year}_{quarter}", "url": href,
+                        "year": year, "quarter": quarter})
+    return entries
+
+def discover_http(session):
+    # each section link points at its own page; follow the real hrefs instead of clicking
+    menu = get_soup(session, BASE_URL)
+    entries = []
     for az_title, en_name in REPORT_TYPES:
-        print(f"\n[INFO] Scraping section: {az_title}")
-        try:
-            link_elem = driver.find_element(By.LINK_TEXT, az_title)
-            safe_click(driver, link_elem, header_offset=120)
-        except Exception as e:
-            report.append(f"[MISSING_ON_SITE] {en_name}: cannot find/click section link ({e})")
+        link = next((a for a in menu.find_all("a", href=True) if text_of(a) == az_title), None)
+        href = urljoin(BASE_URL, link["href"]) if link else None
+        if not href or href.split("#")[0] == BASE_URL.split("#")[0] or href.startswith("javascript"):
             continue
+        page = get_soup(session, href)
+        links = [(urljoin(href, a["href"]), text_of(a)) for a in page.select("a.reports__item[href]")]
+        entries += section_entries(en_name, links)
+    return entries or None
+
+def discover_browser(session):
+    driver = open_tab("xalq_bank")
+    try:
+        driver.get(BASE_URL)
+        wait_present(driver, (By.LINK_TEXT, REPORT_TYPES[0][0]), timeout=WAIT)
+        import_browser_cookies(session, driver)
 
-        # Scrape all report links
-        report_links = driver.find_elements(By.CSS_SELECTOR, "a.reports__item")
-        print(f"  [DEBUG] Found {len(report_links)} report link(s)")
-        for link in report_links:
-            href = link.get_attribute("href")
-            info_text = link.text.strip()
-            if not href or not any(href.lower().endswith(ext) for ext in VALID_EXTENSIONS):
+        entries = []
+        for az_title, en_name in REPORT_TYPES:
+            print(f"\n[INFO] Scraping section: {az_title}")
+            try:
+                link_elem = driver.find_element(By.LINK_TEXT, az_title)
+                safe_click(driver, link_elem, header_offset=120)
+            except Exception as e:
+                print(f"[MISSING_ON_SITE] {en_name}: cannot find/click section link ({e})")
                 continue
-            year, quarter = get_year_period(info_text)
-            if not year or quarter == "unknown" or not year.isdigit() or int(year) < 2020:
+
+            # Scrape all report links (once the list stops growing)
+            report_links = wait_count_stable(driver, (By.CSS_SELECTOR, "a.reports__item"), timeout=WAIT)
+            print(f"  [DEBUG] Found {len(report_links)} report link(s)")
+            entries += section_entries(en_name, [(l.get_attribute("href"), l.text.strip()) for l in report_links])
+
+            # Go BACK to menu page for next section
+            driver.get(BASE_URL)
+            wait_present(driver, (By.LINK_TEXT, REPORT_TYPES[0][0]), timeout=WAIT)
+        return entries
+    finally:
+        release_tab(driver)
+
+def main():
+    report = []
+    jobs = []
+
+    session = new_session(referer=BASE_URL)
+    entries = discover("xalq_bank", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=BASE_URL)
+    all_year_quarters = {(e["year"], e["quarter"]) for e in entries}
+
+    for e in entries:
+        en_name, year, quarter, href = e["rtype"], e["year"], e["quarter"], e["url"]
+        ext = os.path.splitext(href.split('?')[0])[1].lower()
+        subfolder = f"{year}_{quarter}"
+        save_name = f"{en_name}_{year}_{quarter}{ext}"
+        if ext == ".pdf":
+            period_dir = os.path.join(RAW_DATA_DIR, subfolder)
+            fpath = os.path.join(period_dir, save_name)
+            if not os.path.exists(fpath) and file_exists_pdf(en_name, year, quarter):
+                report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
                 continue
-            ext = os.path.splitext(href.split('?')[0])[1].lower()
-            subfolder = f"{year}_{quarter}"
-            save_name = f"{en_name}_{year}_{quarter}{ext}"
-            all_year_quarters.add((year, quarter))
-            if ext == ".pdf":
-                period_dir = os.path.join(RAW_DATA_DIR, subfolder)
-                fpath = os.path.join(period_dir, save_name)
-                if file_exists_pdf(en_name, year, quarter):
-                    report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                    continue
-            elif ext in [".xlsx", ".xls"]:
-                period_dir = os.path.join(PROCESSED_DATA_DIR, subfolder)
-                fpath = os.path.join(period_dir, save_name)
-                if file_exists_excel(en_name, year, quarter):
-                    report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
-                    continue
-            else:
+        elif ext in [".xlsx", ".xls"]:
+            period_dir = os.path.join(PROCESSED_DATA_DIR, subfolder)
+            fpath = os.path.join(period_dir, save_name)
+            if not os.path.exists(fpath) and file_exists_excel(en_name, year, quarter):
+                report.append(f"[SKIP] Already exists: {subfolder}/{save_name}")
                 continue
-            os.makedirs(period_dir, exist_ok=True)
-            try:
-                print(f"    Downloading: {subfolder}/{save_name}")
-                r = session.get(href, headers=headers, timeout=20)
-                if (ext == ".pdf" and not r.content.startswith(b'%PDF-')) or (ext in [".xlsx", ".xls"] and r.content[:2] != b'PK'):
-                    report.append(f"[SKIP_CORRUPT] {subfolder}/{save_name}")
-                    continue
-                with open(fpath, "wb") as out:
-                    out.write(r.content)
-                report.append(f"[OK] {subfolder}/{save_name}")
-                total_downloaded += 1
-            except Exception as e:
-                report.append(f"[ERROR] {subfolder}/{save_name}: {e}")
+        else:
+            continue
+        os.makedirs(period_dir, exist_ok=True)
+        recheck = os.path.exists(fpath)   # same name on disk: re-check it against the site
+        if not recheck:
+            print(f"    Queued: {subfolder}/{save_name}")
+        jobs.append(download_job(href, fpath, kind_for(fpath), f"{subfolder}/{save_name}", recheck=recheck))
 
-        # Go BACK to menu page for next section
-        driver.get(BASE_URL)
-        time.sleep(2.3)
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="xalq_bank"):
+        report.append(report_line(job))
+    total_downloaded = len(fetched(jobs))
 
     print("\n=== FULL XALQ BANK REPORT ===")
     for line in report:
@@ -171,7 +187,5 @@ def main():
     print(f"\nDone.\nAll PDFs in raw_data/xalq_bank/<year>_<quarter>/, Excels in processed_data/xalq_bank/<year>_<quarter>/")
     print(f"Total files downloaded: {total_downloaded}")
 
-    driver.quit()
-
 if __name__ == "__main__":
     main()
@@ -1,14 +1,18 @@
 import os
 import re
-import time
 import unidecode
-import requests
+from urllib.parse import urljoin
 from selenium.webdriver.common.by import By
-import undetected_chromedriver as uc
+from browser_pool import open_tab, release_tab
+from discovery import discover, get_soup, text_of
+from http_client import new_session, import_browser_cookies
+from fetch import download_job, fetch_all, fetched, kind_for, report_line, batch_summary
+from waits import site_timeout, wait_present
 
 BASE_URL = "https://www.yelo.az/en/about-bank/reports/quarter/"
 RAW_DATA_DIR = os.path.join("raw_data", "yelobank")
 PROCESSED_DATA_DIR = os.path.join("processed_data", "yelobank")
+WAIT = site_timeout("yelobank")
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
 
@@ -68,83 +72,100 @@ def file_exists_excel(report_type, yyyy, quarter):
             return True
     return False
 
-def main():
-    report = []
-    total_downloaded = 0
-    all_year_quarters = set()
-
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver = uc.Chrome(options=options)
-    driver.get(BASE_URL)
-    time.sleep(2.7)
-
-    session = requests.Session()
-    for cookie in driver.get_cookies():
-        session.cookies.set(cookie['name'], cookie['value'])
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Referer": BASE_URL
-    }
-
-    h2s = driver.find_elements(By.CSS_SELECTOR, ".main_wrap > h2")
-    year_items = driver.find_elements(By.CSS_SELECTOR, ".main_wrap > .year_item")
-    if not h2s or not year_items or len(h2s) != len(year_items):
-        print("[ERROR] Could not match quarter titles with report blocks")
-        driver.quit()
-        return
-
-    for idx, h2 in enumerate(h2s):
-        quarter_text = h2.text.strip()
+def entries_from_blocks(blocks):
+    """[(quarter title, [(href, description), ...]), ...] -> entries for the core reports."""
+    entries = []
+    for quarter_text, links in blocks:
         yyyy, quarter = get_year_period(quarter_text)
-        if not yyyy or not quarter:
-            continue
-        if int(yyyy) < 2020:
+        if not yyyy or not quarter or int(yyyy) < 2020:
             continue
-        period = f"{yyyy}_{quarter}"
-        all_year_quarters.add((yyyy, quarter))
-        docs_block = year_items[idx].find_element(By.CSS_SELECTOR, ".list_of_documents")
-        lis = docs_block.find_elements(By.TAG_NAME, "li")
-        for li in lis:
-            try:
-                a = li.find_element(By.TAG_NAME, "a")
-                href = a.get_attribute("href")
-                desc_el = a.find_element(By.CSS_SELECTOR, ".file_desc b")
-                b_text = desc_el.text.strip()
-                report_type = match_report_type(b_text)
-                if not report_type or report_type not in CORE_REPORTS:
+        for href, b_text in links:
+            report_type = match_report_type(b_text)
+            if not href or not report_type or report_type not in CORE_REPORTS:
+                continue
+            entries.append({"rtype": report_type, "period": f"{yyyy}_{quarter}", "url": href,
+                            "year": yyyy, "quarter": quarter})
+    return entries
+
+def discover_http(session):
+    soup = get_soup(session, BASE_URL)
+    h2s = soup.select(".main_wrap > h2")
+    year_items = soup.select(".main_wrap > .year_item")
+    if not h2s or len(h2s) != len(year_items):
+        return None
+    blocks = []
+    for h2, item in zip(h2s, year_items):
+        links = []
+        for a in item.select(".list_of_documents li a[href]"):
+            links.append((urljoin(BASE_URL, a["href"]), text_of(a.select_one(".file_desc b"))))
+        blocks.append((text_of(h2), links))
+    return entries_from_blocks(blocks)
+
+def discover_browser(session):
+    driver = open_tab("yelobank")
+    try:
+        driver.get(BASE_URL)
+        wait_present(driver, (By.CSS_SELECTOR, ".main_wrap > .year_item"), timeout=WAIT)
+        import_browser_cookies(session, driver)
+
+        h2s = driver.find_elements(By.CSS_SELECTOR, ".main_wrap > h2")
+        year_items = driver.find_elements(By.CSS_SELECTOR, ".main_wrap > .year_item")
+        if not h2s or not year_items or len(h2s) != len(year_items):
+            print("[ERROR] Could not match quarter titles with report blocks")
+            return []
+        blocks = []
+        for idx, h2 in enumerate(h2s):
+            links = []
+            docs_block = year_items[idx].find_element(By.CSS_SELECTOR, ".list_of_documents")
+            for li in docs_block.find_elements(By.TAG_NAME, "li"):
+                try:
+                    a = li.find_element(By.TAG_NAME, "a")
+                    links.append((a.get_attribute("href"), a.find_element(By.CSS_SELECTOR, ".file_desc b").text.strip()))
+                except Exception:
                     continue
-                ext = os.path.splitext(href.split('?')[0])[1].lower()
-                if ext == ".pdf":
-                    period_dir = os.path.join(RAW_DATA_DIR, period)
-                    fname = f"{report_type}_{yyyy}_{quarter}.pdf"
-                    fpath = os.path.join(period_dir, fname)
-                    if file_exists_pdf(report_type, yyyy, quarter):
-                        report.append(f"[SKIP] Already exists: {period}/{fname}")
-                        continue
-                elif ext in [".xlsx", ".xls"]:
-                    period_dir = os.path.join(PROCESSED_DATA_DIR, period)
-                    fname = f"{report_type}_{yyyy}_{quarter}{ext}"
-                    fpath = os.path.join(period_dir, fname)
-                    if file_exists_excel(report_type, yyyy, quarter):
-                        report.append(f"[SKIP] Already exists: {period}/{fname}")
-                        continue
-                else:
-                    continue
-                os.makedirs(period_dir, exist_ok=True)
-                print(f"    Downloading: {period}/{fname}")
-                r = session.get(href, headers=headers, timeout=20)
-                if (ext == ".pdf" and not r.content.startswith(b'%PDF-')) or (ext in [".xlsx", ".xls"] and r.content[:2] != b'PK'):
-                    report.append(f"[SKIP_CORRUPT] {period}/{fname}")
-                    continue
-                with open(fpath, "wb") as out:
-                    out.write(r.content)
-                report.append(f"[OK] {period}/{fname}")
-                total_downloaded += 1
-            except Exception as e:
-                report.append(f"[ERROR] {period}/{fname}: {e}")
+            blocks.append((h2.text.strip(), links))
+        return entries_from_blocks(blocks)
+    finally:
+        release_tab(driver)
+
+def main():
+    report = []
+    jobs = []
+
+    session = new_session(referer=BASE_URL)
+    entries = discover("yelobank", lambda: discover_http(session), lambda: discover_browser(session),
+                       session=session, listing=BASE_URL)
+    all_year_quarters = {(e["year"], e["quarter"]) for e in entries}
+
+    for e in entries:
+        yyyy, quarter, period, report_type, href = e["year"], e["quarter"], e["period"], e["rtype"], e["url"]
+        ext = os.path.splitext(href.split('?')[0])[1].lower()
+        if ext == ".pdf":
+            period_dir = os.path.join(RAW_DATA_DIR, period)
+            fname = f"{report_type}_{yyyy}_{quarter}.pdf"
+            fpath = os.path.join(period_dir, fname)
+            if not os.path.exists(fpath) and file_exists_pdf(report_type, yyyy, quarter):
+                report.append(f"[SKIP] Already exists: {period}/{fname}")
+                continue
+        elif ext in [".xlsx", ".xls"]:
+            period_dir = os.path.join(PROCESSED_DATA_DIR, period)
+            fname = f"{report_type}_{yyyy}_{quarter}{ext}"
+            fpath = os.path.join(period_dir, fname)
+            if not os.path.exists(fpath) and file_exists_excel(report_type, yyyy, quarter):
+                report.append(f"[SKIP] Already exists: {period}/{fname}")
+                continue
+        else:
+            continue
+        os.makedirs(period_dir, exist_ok=True)
+        recheck = os.path.exists(fpath)   # same name on disk: re-check it against the site
+        if not recheck:
+            print(f"    Queued: {period}/{fname}")
+        jobs.append(download_job(href, fpath, kind_for(fpath), f"{period}/{fname}", recheck=recheck))
+
+    print(f"\n[INFO] Downloading {batch_summary(jobs)}...")
+    for job in fetch_all(session, jobs, bank="yelobank"):
+        report.append(report_line(job))
+    total_downloaded = len(fetched(jobs))
 
     print("\n=== YELOBANK FULL REPORT ===")
     for line in report:
@@ -162,7 +183,5 @@ def main():
     print(f"\nDone.\nAll PDFs in raw_data/yelobank/<year>_<quarter>/, Excels in processed_data/yelobank/<year>_<quarter>/")
     print(f"Total files downloaded: {total_downloaded}")
 
-    driver.quit()
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,133 @@
+import os
+import time
+import uuid
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ---- Server-wide background jobs ----
+# Streamlit reruns app.py on every interaction but imports this module once per server
+# process, so the job table, the pool and the resource locks below are shared by every
+# browser session. A session that reruns (or a second session) simply reads the table again.
+#
+# job dict: id, name, kind, resources, status (queued/running/done/failed/timeout),
+#           returncode, log (deque of lines), result, submitted, started, finished
+
+MAX_JOBS = int(os.environ.get("APP_MAX_JOBS", "3"))   # jobs running at the same time
+LOG_LINES = 2000                                        # tail kept per job
+KEEP_FINISHED = 50                                      # finished jobs kept for display
+
+ACTIVE = ("queued", "running")
+
+_lock = threading.Lock()
+_jobs = {}    # id -> job, in submission order
+_held = {}    # resource (bank folder, "processed_data", ...) -> job id
+_finished = 0 # bumped whenever a job ends; lets the UI notice completions between polls
+_pool = ThreadPoolExecutor(max_workers=MAX_JOBS, thread_name_prefix="job")
+
+def _new_job(name, kind, resources):
+    # claims every resource or none; None when another active job holds one of them
+    with _lock:
+        if any(r in _held for r in resources):
+            return None
+        job = {
+            "id": uuid.uuid4().hex[:12], "name": name, "kind": kind, "resources": list(resources),
+            "status": "queued", "returncode": None, "log": deque(maxlen=LOG_LINES), "result": None,
+            "submitted": time.time(), "started": None, "finished": None,
+        }
+        for r in resources:
+            _held[r] = job["id"]
+        _jobs[job["id"]] = job
+        done = [j for j in _jobs.values() if j["status"] not in ACTIVE]
+        for old in done[:max(0, len(done) - KEEP_FINISHED)]:
+            del _jobs[old["id"]]
+        return job
+
+def _finish(job, status, returncode=None):
+    global _finished
+    with _lock:
+        _finished += 1
+        job["status"] = status
+        job["returncode"] = returncode
+        job["finished"] = time.time()
+        for r in job["resources"]:
+            if _held.get(r) == job["id"]:
+                del _held[r]
+
+def _kill(job, proc):
+    job["timed_out"] = True
+    job["log"].append("[ERROR] timed out, killing the process")
+    proc.kill()
+
+def _run_command(job, cmd, cwd, timeout):
+    job["status"], job["started"] = "running", time.time()
+    status, rc = "failed", None
+    try:
+        env = dict(os.environ, PYTHONUNBUFFERED="1")   # child prints reach the log line by line
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, bufsize=1, errors="replace")
+        timer = threading.Timer(timeout, _kill, (job, proc)) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        for line in proc.stdout:
+            job["log"].append(line.rstrip("\n"))
+        rc = proc.wait()
+        if timer:
+            timer.cancel()
+        status = "timeout" if job.get("timed_out") else "done" if rc == 0 else "failed"
+    except Exception as e:
+        job["log"].append(f"[ERROR] {e}")
+    finally:
+        _finish(job, status, rc)
+
+def _run_function(job, fn):
+    job["status"], job["started"] = "running", time.time()
+    status = "failed"
+    try:
+        job["result"] = fn(job["log"].append)
+        status = "done"
+    except Exception as e:
+        job["log"].append(f"[ERROR] {e}")
+    finally:
+        _finish(job, status)
+
+# ---- API ----
+def submit_command(name, cmd, resources=(), kind="command", cwd=None, timeout=None):
+    """Queue a subprocess; stdout+stderr stream into job['log']. None if a resource is busy."""
+    job = _new_job(name, kind, resources)
+    if job:
+        _pool.submit(_run_command, job, cmd, cwd, timeout)
+    return job
+
+def submit_function(name, fn, resources=(), kind="function"):
+    """Queue fn(log) in-process; its return value lands in job['result']. None if a resource is busy."""
+    job = _new_job(name, kind, resources)
+    if job:
+        _pool.submit(_run_function, job, fn)
+    return job
+
+def busy(resource):
+    """The active job holding resource, or None."""
+    with _lock:
+        job_id = _held.get(resource)
+        return _jobs.get(job_id) if job_id else None
+
+def list_jobs(active_only=False):
+    with _lock:
+        jobs = list(_jobs.values())
+    return [j for j in jobs if j["status"] in ACTIVE] if active_only else jobs
+
+def finished_count():
+    return _finished
+
+def latest(kind):
+    """Most recent job of a kind, active or not."""
+    jobs = [j for j in list_jobs() if j["kind"] == kind]
+    return jobs[-1] if jobs else None
+
+def clear_finished():
+    with _lock:
+        for job_id in [i for i, j in _jobs.items() if j["status"] not in ACTIVE]:
+            del _jobs[job_id]
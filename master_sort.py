@@ -1,65 +1,91 @@
+import os
+import argparse
+import numpy as np
 import pandas as pd
-import re
+from bank_etl_v3.etl.excel_out import write_xlsx
 
-# ---- Load Excel ----
-df = pd.read_excel("master.xlsx")
+REQUIRED_COLS = ["Period", "Bank", "Indicator table", "Element"]
+GROUP_COLS = ["Period", "Bank", "Indicator table"]
 
-# ---- Ensure columns exist ----
-required_cols = ["Period", "Bank", "Indicator table", "Element"]
-for col in required_cols:
-    if col not in df.columns:
-        raise ValueError(f"Missing required column: {col}")
+# 1.5.2 -> 1.5.5 for every 2nd, 4th, ... occurrence in a group; same for 1.5.3 -> 1.5.6
+DUPE_REMAP = {"1.5.2": "1.5.5", "1.5.3": "1.5.6"}
 
-# ---- Period parser: 'YYYY Qn' -> (year, quarter) ----
-def parse_period(period_str):
-    match = re.match(r"(\d{4})\s*[Qq](\d)", str(period_str))
-    if match:
-        year, quarter = match.groups()
-        return int(year), int(quarter)
-    return (9999, 9)  # unknown format at end
+PERIOD_RX = r"^(\d{4})[\s_\-]*[Qq](\d)"      # 'YYYY Qn' / 'YYYY_Qn'
+UNKNOWN_PERIOD = (9999, 9)                  # unknown format at end
+UNKNOWN_ELEMENT = 9999
 
-# ---- Element parser: '3.1.2' -> (3,1,2) ----
-def parse_element(el):
-    parts = str(el).strip().split(".")
-    try:
-        return tuple(int(p) for p in parts)
-    except ValueError:
-        return (9999,)
+# ---- IO ----
+def read_any(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path, dtype={"Element": str}, encoding="utf-8-sig")
+    if ext in (".parquet", ".pq"):
+        return pd.read_parquet(path)
+    return pd.read_excel(path, dtype={"Element": str})
 
-# ---- First sort ----
-df["Period_Sort"]  = df["Period"].apply(parse_period)
-df["Element_Sort"] = df["Element"].apply(parse_element)
-df.sort_values(
-    by=["Period_Sort", "Bank", "Indicator table", "Element_Sort"],
-    ascending=[True, True, True, True],
-    inplace=True
-)
+def write_any(df: pd.DataFrame, path: str) -> None:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+    elif ext in (".parquet", ".pq"):
+        df.to_parquet(path, index=False)
+    else:
+        write_xlsx(df, path, sheet_name="Sheet1")
 
-# ---- Fix duplicates (1.5.2 -> 1.5.5 for every 2nd, 4th, ... occurrence; same for 1.5.3 -> 1.5.6)
-def fix_dupes(group):
-    for target, newval in [("1.5.2", "1.5.5"), ("1.5.3", "1.5.6")]:
-        mask = group["Element"].astype(str).str.strip().eq(target)
-        # cumulative count over matches; even occurrences -> rename
-        counts = mask.cumsum()
-        even_mask = mask & (counts % 2 == 0)
-        group.loc[even_mask, "Element"] = newval
-    return group
+# ---- Sort keys (vectorized) ----
+def period_keys(period: pd.Series) -> pd.DataFrame:
+    # 'YYYY Qn' -> integer (year, quarter) columns
+    m = period.astype(str).str.extract(PERIOD_RX)
+    return pd.DataFrame({
+        "__py__": pd.to_numeric(m[0], errors="coerce").fillna(UNKNOWN_PERIOD[0]).astype(int),
+        "__pq__": pd.to_numeric(m[1], errors="coerce").fillna(UNKNOWN_PERIOD[1]).astype(int),
+    }, index=period.index)
 
-df = df.groupby(["Period", "Bank", "Indicator table"], group_keys=False).apply(fix_dupes)
+def element_keys(element: pd.Series) -> pd.DataFrame:
+    # '3.1.2' -> integer columns (3, 1, 2, -1, ...); shorter codes sort before their children,
+    # anything non-numeric goes to the end like (9999,)
+    el = element.astype(str).str.strip()
+    valid = el.str.fullmatch(r"\d+(?:\.\d+)*")
+    parts = el.where(valid, str(UNKNOWN_ELEMENT)).str.split(".", expand=True)
+    keys = parts.apply(pd.to_numeric, errors="coerce").fillna(-1).astype(np.int64)
+    keys.columns = [f"__e{i}__" for i in range(keys.shape[1])]
+    return keys
 
-# ---- Recompute Element sort key and sort again ----
-df["Element_Sort"] = df["Element"].apply(parse_element)
-df.sort_values(
-    by=["Period_Sort", "Bank", "Indicator table", "Element_Sort"],
-    ascending=[True, True, True, True],
-    inplace=True
-)
+def fix_dupes(df: pd.DataFrame) -> pd.DataFrame:
+    el = df["Element"].astype(str).str.strip()
+    hit = el.isin(list(DUPE_REMAP))
+    if not hit.any():
+        return df
+    # occurrence number of each target code inside its Period/Bank/Indicator group, in file order
+    nth = df.loc[hit].groupby(GROUP_COLS + [el[hit]], dropna=False, sort=False).cumcount() + 1
+    even = nth.index[nth.to_numpy() % 2 == 0]
+    df.loc[even, "Element"] = el.loc[even].map(DUPE_REMAP)
+    return df
 
-# ---- Clean up helper cols ----
-df.drop(columns=["Period_Sort", "Element_Sort"], inplace=True)
+def sort_master(df: pd.DataFrame) -> pd.DataFrame:
+    for col in REQUIRED_COLS:
+        if col not in df.columns:
+            raise ValueError(f"Missing required column: {col}")
+    df = df.reset_index(drop=True)
+    before = element_keys(df["Element"]).add_prefix("__was")   # ties keep their pre-fix element order
+    df = fix_dupes(df)
+    keys = pd.concat([period_keys(df["Period"]), element_keys(df["Element"]), before,
+                      df[["Bank", "Indicator table"]]], axis=1)
+    by = (["__py__", "__pq__", "Bank", "Indicator table"]
+          + [c for c in keys.columns if c.startswith("__e")]
+          + list(before.columns))
+    order = keys.sort_values(by=by, kind="stable", na_position="last").index
+    return df.loc[order].reset_index(drop=True)
 
-# ---- Save to new file (single sheet) ----
-with pd.ExcelWriter("master_sorted.xlsx", engine="openpyxl", mode="w") as writer:
-    df.to_excel(writer, index=False, sheet_name="Sheet1")
+def main():
+    ap = argparse.ArgumentParser(description="Sort the ETL master by period, bank, table and element.")
+    ap.add_argument("input", nargs="?", default="master.xlsx", help="master as .xlsx, .csv or .parquet")
+    ap.add_argument("output", nargs="?", default="master_sorted.xlsx", help="sorted output (.xlsx, .csv or .parquet)")
+    args = ap.parse_args()
 
-print("master_sorted.xlsx created successfully.")
\ No newline at end of file
+    df = sort_master(read_any(args.input))
+    write_any(df, args.output)
+    print(f"{args.output} created successfully.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import importlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+DOWNLOADERS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "downloaders")
+# read their env configuration at import time, so every test imports them afresh
+DOWNLOADER_MODULES = ("cassette", "file_catalog", "http_client", "fetch", "discovery")
+
+
+@pytest.fixture
+def downloaders(tmp_path, monkeypatch):
+    """importlib.import_module for downloaders/ modules, with .cache and the data roots in tmp_path."""
+    for var in ("SCRAPER_CASSETTE", "SCRAPER_RECHECK", "SCRAPER_CATALOG", "SCRAPER_HTTP_FIRST"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setenv("SCRAPER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("SCRAPER_DATA_ROOT", str(tmp_path))
+    monkeypatch.setenv("SCRAPER_CASSETTE_DIR", str(tmp_path / "cassette"))
+    monkeypatch.syspath_prepend(DOWNLOADERS)
+    unload = lambda: [sys.modules.pop(m, None) for m in DOWNLOADER_MODULES]
+    unload()
+    yield importlib.import_module
+    unload()
+
+
+class Site:
+    """What the test server serves: path -> {body, etag, last_modified, content_type, fail}.
+    fail: status codes answered (one per request) before the body is served."""
+    def __init__(self):
+        self.routes = {}
+        self.requests = []      # (method, path, headers)
+        self.delay = 0
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    def add(self, path, body, etag=None, last_modified=None, content_type="application/octet-stream", fail=()):
+        self.routes[path] = {"body": body, "etag": etag, "last_modified": last_modified,
+                             "content_type": content_type, "fail": list(fail)}
+
+    def seen(self, method=None, path=None):
+        return [r for r in self.requests if (method in (None, r[0])) and (path in (None, r[1]))]
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.answer(send_body=False)
+
+    def do_GET(self):
+        self.answer(send_body=True)
+
+    def answer(self, send_body):
+        site = self.server.site
+        with site.lock:
+            site.requests.append((self.command, self.path, dict(self.headers)))
+            site.active += 1
+            site.peak = max(site.peak, site.active)
+        try:
+            time.sleep(site.delay)
+            self.respond(site, send_body)
+        finally:
+            with site.lock:
+                site.active -= 1
+
+    def respond(self, site, send_body):
+        route = site.routes.get(self.path)
+        if route is None:
+            return self.send(404, b"not found", {})
+        if route["fail"]:
+            return self.send(route["fail"].pop(0), b"try again", {})
+        body, etag = route["body"], route["etag"]
+        headers = {"Content-Type": route["content_type"]}
+        if etag:
+            headers["ETag"] = etag
+        if route["last_modified"]:
+            headers["Last-Modified"] = route["last_modified"]
+        if etag and self.headers.get("If-None-Match") == etag:
+            return self.send(304, b"", headers)
+        rng = self.headers.get("Range", "")
+        if rng.startswith("bytes=") and self.headers.get("If-Range") in (None, etag, route["last_modified"]):
+            start = int(rng[6:].rstrip("-"))
+            if start >= len(body):
+                return self.send(416, b"", {"Content-Range": f"bytes */{len(body)}"})
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            return self.send(206, body[start:], headers, send_body)
+        self.send(200, body, headers, send_body)
+
+    def send(self, status, body, headers, send_body=True):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    """A local HTTP server; site.url(path) is where a route added with site.add(path, ...) lives."""
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    srv.daemon_threads = True
+    srv.site = Site()
+    srv.site.url = lambda path="/": f"http://127.0.0.1:{srv.server_port}{path}"
+    threading.Thread(target=srv.serve_forever, args=(0.05,), daemon=True).start()
+    yield srv.site
+    srv.shutdown()
+    srv.server_close()
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from balance_process import tidy_sheet_cellwise
+
+
+def test_non_ascii_total_rows_are_dropped():
+    raw = pd.DataFrame([
+        ["Maddə", "Cari dövr", "Əvvəlki dövr"],
+        ["Kreditlər", 10, 20],
+        ["Ümumi ehtiyatlar:", 1, 2],
+        ["16. Ümumi ehtiyatlar, cəmi", 3, 4],
+        ["Итог", 5, 6],
+        ["всего активов", 7, 8],
+        ["Depozitlər", np.nan, 30],
+    ])
+    tidy = tidy_sheet_cellwise(raw)
+    assert tidy.to_dict("records") == [
+        {"Metric": "Kreditlər", "Descriptor": "Cari dövr", "Value": "10"},
+        {"Metric": "Kreditlər", "Descriptor": "Əvvəlki dövr", "Value": "20"},
+        {"Metric": "Depozitlər", "Descriptor": "Əvvəlki dövr", "Value": "30"},
+    ]
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import urllib.request
+
+from conftest import DOWNLOADERS, DOWNLOADER_MODULES
+
+
+def in_mode(downloaders, monkeypatch, mode, name="http_client"):
+    monkeypatch.setenv("SCRAPER_CASSETTE", mode)
+    for m in DOWNLOADER_MODULES:
+        sys.modules.pop(m, None)
+    return downloaders(name)
+
+
+def record_site(downloaders, monkeypatch, site):
+    site.add("/reports", b"<html><body>listing</body></html>", content_type="text/html")
+    site.add("/r.pdf", b"%PDF-1.4 report", etag='"v1"', content_type="application/pdf")
+    http_client = in_mode(downloaders, monkeypatch, "record")
+    session = http_client.new_session(rate=0)
+    for path in ("/reports", "/r.pdf"):
+        assert session.get(site.url(path)).ok
+    downloaders("cassette").save()
+    site.requests.clear()
+
+
+def test_replay_answers_from_the_cassette(downloaders, monkeypatch, site, tmp_path):
+    record_site(downloaders, monkeypatch, site)
+    assert os.listdir(tmp_path / "cassette" / "bodies")
+    session = in_mode(downloaders, monkeypatch, "replay").new_session()
+    resp = session.get(site.url("/r.pdf"))
+    assert (resp.status_code, resp.content, resp.headers["ETag"]) == (200, b"%PDF-1.4 report", '"v1"')
+    assert session.head(site.url("/r.pdf")).headers["ETag"] == '"v1"'
+    assert session.get(site.url("/r.pdf"), headers={"If-None-Match": '"v1"'}).status_code == 304
+    assert session.get(site.url("/other.pdf")).status_code == 404
+    assert site.requests == []
+
+
+def test_partial_answers_do_not_replace_a_recording(downloaders, monkeypatch):
+    cassette = in_mode(downloaders, monkeypatch, "record", "cassette")
+    cassette.record("GET", "https://bank.az/r.pdf", 200, {"ETag": '"v1"', "Content-Length": "5"}, b"%PDF1")
+    cassette.record("GET", "https://bank.az/r.pdf", 304, {"ETag": '"v1"'}, b"")
+    cassette.record("GET", "https://bank.az/r.pdf", 206, {"ETag": '"v1"'}, b"F1")
+    entry = cassette.lookup("GET", "https://bank.az/r.pdf")
+    assert (entry["status"], cassette.body_of(entry), entry["headers"]) == (200, b"%PDF1", {"ETag": '"v1"'})
+
+
+def test_standin_serves_dom_snapshots_without_scripts(downloaders, monkeypatch):
+    cassette = in_mode(downloaders, monkeypatch, "record", "cassette")
+    cassette.record_dom("https://bank.az/reports?y=2024",
+                        "<html><head><script>load()</script></head><body>clicked open</body></html>")
+    cassette.ensure_server()
+    url = cassette.standin_url("https://bank.az/reports?y=2024")
+    assert url.startswith("http://127.0.0.1:")
+    with urllib.request.urlopen(url) as r:
+        assert r.read() == (b'<html><head><base href="https://bank.az/reports?y=2024"></head>'
+                            b"<body>clicked open</body></html>")
+    cassette._server.shutdown()
+    cassette._server.server_close()
+
+
+SCRAPER = """
+import os, sys, json
+import fetch, file_catalog, http_client
+job = fetch.download_job(sys.argv[1], os.path.join("raw_data", "bank", "r.pdf"), "pdf")
+status = fetch.fetch_all(http_client.new_session(), [job], bank="bank")[0]["status"]
+with open(sys.argv[2], "w") as f:
+    json.dump({"status": status, "cwd": os.getcwd(), "manifest": fetch.manifest_path("bank"),
+               "retry": fetch.RETRY_DIR, "catalog": file_catalog.CATALOG_PATH,
+               "saved": os.path.exists(os.path.join("raw_data", "bank", "r.pdf"))}, f)
+"""
+
+
+def test_replay_run_stays_in_a_scratch_directory(downloaders, monkeypatch, site, tmp_path):
+    record_site(downloaders, monkeypatch, site)
+    cassette = downloaders("cassette")
+    script, report = tmp_path / "scraper.py", tmp_path / "report.json"
+    script.write_text(SCRAPER, encoding="utf-8")
+    monkeypatch.setenv("PYTHONPATH", DOWNLOADERS)
+    assert cassette.run(str(script), site.url("/r.pdf"), str(report)) == 0
+    with open(report, encoding="utf-8") as f:
+        seen = json.load(f)
+    assert seen["status"] == "ok" and seen["saved"]
+    assert os.path.basename(seen["cwd"]).startswith("replay-") and not os.path.exists(seen["cwd"])
+    for path in ("manifest", "retry", "catalog"):
+        assert seen[path].startswith(seen["cwd"] + os.sep)
+    assert site.requests == []
+    assert sorted(os.listdir(tmp_path)) == ["cassette", "report.json", "scraper.py"]
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from bank_etl_v3.etl.extractors import credit_numbers
+from bank_etl_v3.etl.utils import CREDIT_SHARES, recompute_credit_shares
+
+
+def credit_rows(bank, period, shares):
+    """Two sectors, Total 1000 and buckets 50/20/10 -> 5%, 2%, 1% of the portfolio."""
+    return pd.DataFrame({
+        "Bank": bank, "Period": period, "Element": ["Biznes", "İstehlak"],
+        "Total": [1000.0, 1000.0], "31-60 days": [50.0, 50.0], "61-90 days": [20.0, 20.0],
+        "91+ days": [10.0, 10.0],
+        "31-60 days_share%inLP": [shares[0]] * 2, "61-90 days_share%inLP": [shares[1]] * 2,
+        "91+ days_share%inLP": [shares[2]] * 2,
+    })
+
+
+def test_share_scale_is_settled_per_bank_and_period():
+    df = pd.concat([credit_rows("a", "2024_Q1", [0.05, 0.02, 0.01]),    # fractions
+                    credit_rows("b", "2024_Q1", [5.0, 2.0, 1.0]),       # percents
+                    credit_rows("a", "2024_Q2", [5.0, 2.0, 1.0])], ignore_index=True)
+    out, flagged = recompute_credit_shares(df)
+    assert flagged.empty
+    assert out[CREDIT_SHARES].to_numpy().tolist() == [[5.0, 2.0, 1.0]] * 6
+
+
+def test_published_share_off_by_more_than_tol_is_rejected():
+    df = pd.concat([credit_rows("a", "2024_Q1", [5.0, 2.0, 1.0]),
+                    credit_rows("b", "2024_Q1", [5.0, 2.0, 1.0])], ignore_index=True)
+    df.loc[3, "91+ days_share%inLP"] = 3.0
+    out, flagged = recompute_credit_shares(df, tol=0.5)
+    assert flagged[["Bank", "Element"]].values.tolist() == [["b", "İstehlak"]]
+    assert flagged["91+ days_share%inLP_published"].tolist() == [3.0]
+    assert flagged["reason"].str.startswith("share deviation").all()
+    assert out.loc[3, "91+ days_share%inLP"] == 1.0     # the recomputed share is kept
+
+
+def test_published_share_is_kept_without_total():
+    df = credit_rows("a", "2024_Q1", [0.05, 0.02, 0.01])
+    df["Total"] = np.nan
+    out, flagged = recompute_credit_shares(df)
+    assert flagged.empty
+    assert np.allclose(out[CREDIT_SHARES].to_numpy(), [[5.0, 2.0, 1.0]] * 2)
+
+
+def test_empty_input():
+    out, flagged = recompute_credit_shares(pd.DataFrame())
+    assert out.empty and flagged.empty
+    assert set(CREDIT_SHARES) <= set(out.columns)
+
+
+def test_credit_numbers_reads_report_cells():
+    col = pd.Series([1234.5, "2,753,791", "1 234,5", "-", "(42 653)", "1.234.567", np.nan, "Cəmi"],
+                    dtype=object)
+    assert credit_numbers(col).tolist()[:6] == [1234.5, 2753791.0, 1234.5, 0.0, -42653.0, 1234567.0]
+    assert credit_numbers(col).iloc[6:].isna().all()
@@ -0,0 +1,178 @@
+import os
+import json
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def discovery(downloaders):
+    return downloaders("discovery")
+
+
+def entries(quarters, rtypes=("balance_sheet",)):
+    return [{"rtype": r, "year": y, "quarter": f"Q{q}", "url": f"https://bank.az/{r}_{y}_Q{q}.pdf"}
+            for y, q in quarters for r in rtypes]
+
+
+def before(quarter, n=1):
+    y, q = quarter
+    i = y * 4 + q - 1 - n
+    return i // 4, i % 4 + 1
+
+
+def browser_never_runs():
+    raise AssertionError("the browser should not have been needed")
+
+
+def test_expected_quarter_waits_for_the_report_lag(discovery):
+    at = lambda *d: datetime.datetime(*d).timestamp()
+    assert discovery.expected_quarter(at(2024, 5, 20, 12)) == ((2024, 1), at(2024, 5, 16))
+    assert discovery.expected_quarter(at(2024, 5, 10, 12)) == ((2023, 4), at(2024, 2, 15))
+    assert discovery.expected_quarter(at(2024, 1, 20, 12)) == ((2023, 3), at(2023, 11, 15))
+
+
+def test_incomplete(discovery):
+    due_q, due = discovery.expected_quarter()
+    latest = entries([before(due_q), due_q], ("balance_sheet", "income"))
+    assert discovery.incomplete(latest, None) is None
+    assert discovery.incomplete([{"rtype": "bulletin", "period": "March 2024"}], None) is None
+
+    stale = entries([before(due_q, 2), before(due_q)], ("balance_sheet", "income"))
+    assert discovery.incomplete(stale, None).startswith("newest period")
+
+    reference = dict(discovery.coverage(latest), at=due + 1)
+    gap = discovery.incomplete(entries([before(due_q), due_q]), reference)
+    assert gap == "missing rtypes the last browser run found: income"
+    assert discovery.incomplete(latest[2:], reference).startswith("missing periods")
+
+    # the browser ran after the due date and didn't find that quarter either: not out yet
+    reference = dict(discovery.coverage(stale), at=due + 1)
+    assert discovery.incomplete(stale, reference) is None
+    assert discovery.incomplete(stale, dict(reference, at=due - 1)).startswith("newest period")
+
+
+def test_discover_takes_the_static_html_when_it_is_complete(discovery):
+    found = entries([discovery.expected_quarter()[0]])
+    assert discovery.discover("bank", lambda: found, browser_never_runs) == found
+    record = discovery.last_run("bank")
+    assert (record["path"], record["entries"], record["shell"]) == ("http", 1, False)
+    assert "browser" not in record
+
+
+def test_discover_falls_back_to_the_browser(discovery):
+    due_q = discovery.expected_quarter()[0]
+    crawled = entries([before(due_q), due_q], ("balance_sheet", "income"))
+    assert discovery.discover("bank", lambda: crawled[:1], lambda: crawled) == crawled   # stale http
+    record = discovery.last_run("bank")
+    assert (record["path"], record["shell"]) == ("browser", True)
+    assert record["browser"]["rtypes"] == ["balance_sheet", "income"]
+
+    # now the browser's coverage is the yardstick: an http parse without "income" isn't enough
+    assert discovery.discover("bank", lambda: entries([due_q]), lambda: crawled) == crawled
+    assert discovery.discover("bank", lambda: crawled, browser_never_runs) == crawled
+    assert discovery.last_run("bank")["path"] == "http"
+
+
+def test_discover_survives_a_failing_http_path(discovery):
+    found = entries([discovery.expected_quarter()[0]])
+    def blocked():
+        raise ConnectionError("403")
+    assert discovery.discover("bank", blocked, lambda: found) == found
+    assert discovery.discover("bank", None, lambda: found) == found
+    assert discovery.last_run("bank")["path"] == "browser"
+
+
+# ---- catalog cache ----
+LISTING = b"""<html><head><meta name="csrf" content="%s"><script>var nonce = "%s";</script></head>
+<body><a href="/balance_sheet_2024_Q1.pdf">Q1</a> %s</body></html>"""
+
+
+def listing(token, extra=b""):
+    return LISTING % (token, token, extra)
+
+
+class Crawl:
+    def __init__(self, found):
+        self.found, self.calls = found, 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.found
+
+
+def rewrite_record(discovery, **changes):
+    path = os.path.join(discovery.DISCOVERY_DIR, "bank.json")
+    with open(path, encoding="utf-8") as f:
+        record = json.load(f)
+    record.update(changes)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+
+
+@pytest.fixture
+def catalog_run(discovery, downloaders, site):
+    session = downloaders("http_client").new_session(retries=0, rate=0)
+    def run(page, crawl, browser=browser_never_runs):
+        site.add("/reports", page, content_type="text/html")
+        discovery._pages.clear()    # a new run
+        return discovery.discover("bank", crawl, browser, session=session, listing=site.url("/reports"))
+    return run
+
+
+def test_fingerprint_ignores_per_request_noise(discovery):
+    assert discovery.fingerprint(listing(b"a1")) == discovery.fingerprint(listing(b"b2").replace(b"> <", b">\n  <"))
+    assert discovery.fingerprint(listing(b"a1")) != discovery.fingerprint(listing(b"a1", b'<a href="/q2.pdf">Q2</a>'))
+
+
+def test_unchanged_listing_reuses_the_catalog(discovery, catalog_run):
+    crawl = Crawl(entries([discovery.expected_quarter()[0]]))
+    assert catalog_run(listing(b"a1"), crawl) == crawl.found
+    cataloged = discovery.last_run("bank")["cataloged"]
+    assert catalog_run(listing(b"b2"), crawl) == crawl.found
+    assert crawl.calls == 1
+    record = discovery.last_run("bank")
+    assert (record["path"], record["cataloged"]) == ("cache", cataloged)
+
+    assert catalog_run(listing(b"b2", b'<a href="/q2.pdf">Q2</a>'), crawl) == crawl.found
+    assert crawl.calls == 2
+
+
+def test_catalog_expires(discovery, catalog_run, monkeypatch):
+    crawl = Crawl(entries([discovery.expected_quarter()[0]]))
+    catalog_run(listing(b"a1"), crawl)
+    rewrite_record(discovery, cataloged=discovery.last_run("bank")["at"] - discovery.CATALOG_MAX_AGE - 60)
+    catalog_run(listing(b"a1"), crawl)
+    assert crawl.calls == 2
+
+    # a script-rendered shell page says nothing about new reports: it expires much sooner
+    age = discovery.CATALOG_SHELL_MAX_AGE + 60
+    rewrite_record(discovery, cataloged=discovery.last_run("bank")["at"] - age, shell=False)
+    catalog_run(listing(b"a1"), crawl)
+    assert crawl.calls == 2
+    rewrite_record(discovery, cataloged=discovery.last_run("bank")["at"] - age, shell=True)
+    catalog_run(listing(b"a1"), crawl)
+    assert crawl.calls == 3
+
+    monkeypatch.setattr(discovery, "CATALOG", False)
+    catalog_run(listing(b"a1"), crawl)
+    assert crawl.calls == 4
+
+
+def test_catalog_short_of_the_due_quarter_is_crawled_again(discovery, catalog_run):
+    due_q = discovery.expected_quarter()[0]
+    crawl = Crawl(entries([due_q]))
+    catalog_run(listing(b"a1"), crawl)
+    rewrite_record(discovery, catalog=entries([before(due_q)]))
+    assert catalog_run(listing(b"a1"), crawl) == crawl.found
+    assert crawl.calls == 2
+
+
+def test_browser_fallback_marks_the_listing_as_a_shell(discovery, catalog_run):
+    due_q = discovery.expected_quarter()[0]
+    rendered = entries([before(due_q), due_q])
+    catalog_run(listing(b"a1"), Crawl([]), browser=lambda: rendered)
+    record = discovery.last_run("bank")
+    assert (record["path"], record["shell"], record["catalog"]) == ("browser", True, rendered)
+    assert catalog_run(listing(b"a1"), Crawl([])) == rendered
+    assert discovery.last_run("bank")["shell"] is True
@@ -0,0 +1,224 @@
+import os
+import json
+
+import pytest
+
+
+def pdf(n, size=1000):
+    return b"%PDF-1.4 " + str(n).encode() * size
+
+
+@pytest.fixture
+def fetch(downloaders):
+    return downloaders("fetch")
+
+
+@pytest.fixture
+def session(downloaders):
+    return downloaders("http_client").new_session(retries=0, rate=0)
+
+
+def job(fetch, site, tmp_path, name, **extra):
+    return fetch.download_job(site.url(f"/{name}"), str(tmp_path / "raw_data" / "bank" / name), "pdf", **extra)
+
+
+def test_fetch_all_downloads_in_parallel_within_the_host_limit(fetch, session, site, tmp_path):
+    for i in range(8):
+        site.add(f"/r{i}.pdf", pdf(i))
+    site.delay = 0.05
+    jobs = [job(fetch, site, tmp_path, f"r{i}.pdf") for i in range(8)]
+    jobs.append(job(fetch, site, tmp_path, "r0.pdf"))    # same path again
+    out = fetch.fetch_all(session, jobs, bank="bank", workers=8, per_host=3)
+    assert [j["status"] for j in out] == ["ok"] * 8 + ["duplicate"]
+    assert 1 < site.peak <= 3
+    assert len(site.seen("GET")) == 8
+    for i in range(8):
+        with open(tmp_path / "raw_data" / "bank" / f"r{i}.pdf", "rb") as f:
+            assert f.read() == pdf(i)
+    manifest = fetch.load_manifest("bank")
+    assert sorted(manifest) == sorted(site.url(f"/r{i}.pdf") for i in range(8))
+    assert all(e["size"] == len(pdf(0)) for e in manifest.values())
+
+
+def test_fetched_files_are_cataloged(fetch, downloaders, session, site, tmp_path):
+    site.add("/balance_sheet_2024_Q1.pdf", pdf(1))
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "balance_sheet_2024_Q1.pdf")], bank="bank")
+    catalog = downloaders("file_catalog")
+    assert catalog.exists("bank", period="2024_Q1", report_type="balance_sheet", ext=".pdf")
+
+
+def test_failures_are_reported_per_job(fetch, session, site, tmp_path):
+    site.add("/good.pdf", pdf(1))
+    site.add("/page.pdf", b"<html>not here</html>", content_type="text/html")
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, n) for n in ("good.pdf", "page.pdf", "gone.pdf")],
+                          bank="bank")
+    assert [(j["status"], j["error"]) for j in out] == [
+        ("ok", None), ("corrupt", "not a real pdf"), ("http_error", "HTTP 404")]
+    assert sorted(os.listdir(tmp_path / "raw_data" / "bank")) == ["good.pdf"]
+    with open(fetch.manifest_path("bank"), encoding="utf-8") as f:
+        assert list(json.load(f)) == [site.url("/good.pdf")]
+
+
+def test_recheck_sends_validators_and_keeps_the_file_on_304(fetch, session, site, tmp_path):
+    site.add("/r.pdf", pdf(1), etag='"v1"', last_modified="Mon, 01 Apr 2024 10:00:00 GMT")
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    checked = fetch.load_manifest("bank")[site.url("/r.pdf")]["checked"]
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)], bank="bank")
+    assert out[0]["status"] == "unchanged"
+    method, _, headers = site.requests[-1]
+    assert method == "GET"
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Mon, 01 Apr 2024 10:00:00 GMT"
+    assert fetch.load_manifest("bank")[site.url("/r.pdf")]["checked"] > checked
+
+
+def test_recheck_replaces_a_restated_file(fetch, session, site, tmp_path):
+    site.add("/r.pdf", pdf(1), etag='"v1"')
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    site.add("/r.pdf", pdf(2), etag='"v2"')
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)], bank="bank")
+    assert out[0]["status"] == "updated"
+    with open(tmp_path / "raw_data" / "bank" / "r.pdf", "rb") as f:
+        assert f.read() == pdf(2)
+    assert fetch.load_manifest("bank")[site.url("/r.pdf")]["etag"] == '"v2"'
+
+
+def test_recheck_without_validators_compares_sizes_with_head(fetch, session, site, tmp_path):
+    # a file that was on disk before the manifest existed, on a server that sends no validators
+    path = tmp_path / "raw_data" / "bank" / "r.pdf"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(pdf(1))
+    site.add("/r.pdf", pdf(1))
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)], bank="bank")
+    assert out[0]["status"] == "unchanged"
+    assert [r[0] for r in site.requests] == ["HEAD"]
+    assert fetch.load_manifest("bank")[site.url("/r.pdf")]["size"] == len(pdf(1))
+
+    site.add("/r.pdf", pdf(2, size=1200))
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)], bank="bank")
+    assert out[0]["status"] == "updated"
+    assert [r[0] for r in site.requests] == ["HEAD", "HEAD", "GET"]
+    assert path.read_bytes() == pdf(2, size=1200)
+
+
+def test_recheck_is_skipped_without_a_bank_or_with_recheck_off(fetch, session, site, tmp_path, monkeypatch):
+    site.add("/r.pdf", pdf(1))
+    assert fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)])[0]["status"] == "unchanged"
+    monkeypatch.setattr(fetch, "RECHECK", False)
+    assert fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)],
+                           bank="bank")[0]["status"] == "unchanged"
+    assert site.requests == []
+
+
+def leave_part(fetch, tmp_path, name, data, url, etag):
+    """What an interrupted download leaves behind next to the target."""
+    part, meta = fetch._part_paths(str(tmp_path / "raw_data" / "bank" / name))
+    os.makedirs(os.path.dirname(part), exist_ok=True)
+    with open(part, "wb") as f:
+        f.write(data)
+    with open(meta, "w", encoding="utf-8") as f:
+        json.dump({"url": url, "etag": etag, "last_modified": None}, f)
+    return part, meta
+
+
+def test_interrupted_download_resumes_with_range_and_if_range(fetch, session, site, tmp_path):
+    body = pdf(1)
+    site.add("/r.pdf", body, etag='"v1"')
+    part, meta = leave_part(fetch, tmp_path, "r.pdf", body[:400], site.url("/r.pdf"), '"v1"')
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    assert out[0]["status"] == "ok"
+    headers = site.requests[-1][2]
+    assert (headers["Range"], headers["If-Range"]) == ("bytes=400-", '"v1"')
+    assert (tmp_path / "raw_data" / "bank" / "r.pdf").read_bytes() == body
+    assert not os.path.exists(part) and not os.path.exists(meta)
+    entry = fetch.load_manifest("bank")[site.url("/r.pdf")]
+    assert entry["size"] == len(body) and entry["sha256"] == fetch._sha256_file(tmp_path / "raw_data" / "bank" / "r.pdf")
+
+
+def test_resume_starts_over_when_the_file_changed(fetch, session, site, tmp_path):
+    # If-Range no longer matches: the server answers 200 with the whole new file
+    site.add("/r.pdf", pdf(2), etag='"v2"')
+    leave_part(fetch, tmp_path, "r.pdf", pdf(1)[:400], site.url("/r.pdf"), '"v1"')
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    assert site.requests[-1][2]["If-Range"] == '"v1"'
+    assert (tmp_path / "raw_data" / "bank" / "r.pdf").read_bytes() == pdf(2)
+
+
+def test_resume_restarts_on_416(fetch, session, site, tmp_path):
+    body = pdf(1)
+    site.add("/r.pdf", body, etag='"v1"')
+    leave_part(fetch, tmp_path, "r.pdf", body + b"junk", site.url("/r.pdf"), '"v1"')
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    assert out[0]["status"] == "ok"
+    assert ["Range" in r[2] for r in site.requests] == [True, False]
+    assert (tmp_path / "raw_data" / "bank" / "r.pdf").read_bytes() == body
+
+
+def test_part_of_another_url_is_not_resumed(fetch, session, site, tmp_path):
+    site.add("/r.pdf", pdf(1), etag='"v1"')
+    leave_part(fetch, tmp_path, "r.pdf", b"%PDF-other", site.url("/old.pdf"), '"v1"')
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    assert "Range" not in site.requests[-1][2]
+    assert (tmp_path / "raw_data" / "bank" / "r.pdf").read_bytes() == pdf(1)
+
+
+def test_rejected_body_never_reaches_the_target(fetch, session, site, tmp_path):
+    path = tmp_path / "raw_data" / "bank" / "r.pdf"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(pdf(1))
+    site.add("/r.pdf", b"<html>maintenance</html>" * 100, etag='"v2"', content_type="text/html")
+    out = fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf", recheck=True)], bank="bank")
+    assert out[0]["status"] == "corrupt"
+    assert path.read_bytes() == pdf(1)
+    assert os.listdir(path.parent) == ["r.pdf"]
+
+
+def test_failed_downloads_are_queued_with_backoff(fetch, session, site, tmp_path):
+    session.headers["Referer"] = site.url("/reports")
+    key = str(tmp_path / "raw_data" / "bank" / "r.pdf")
+    base = fetch.RETRY_BASE
+    for attempt, delay in ((1, base), (2, 2 * base)):
+        t0 = fetch.time.time()
+        assert fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")[0]["status"] == "http_error"
+        entry = fetch.load_retry_queue("bank")[key]
+        assert (entry["attempts"], entry["error_class"], entry["error"]) == (attempt, "http_error", "HTTP 404")
+        assert delay <= entry["next_at"] - t0 <= 1.5 * delay + 1
+    assert entry["referer"] == site.url("/reports")
+    assert entry["first_failed"] < t0
+
+    site.add("/r.pdf", pdf(1))
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "r.pdf")], bank="bank")
+    assert fetch.load_retry_queue("bank") == {}
+    assert not os.path.exists(fetch.retry_queue_path("bank"))
+
+
+def test_rechecks_and_opted_out_jobs_are_not_queued(fetch, session, site, tmp_path):
+    path = tmp_path / "raw_data" / "bank" / "kept.pdf"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(pdf(1))
+    fetch.fetch_all(session, [job(fetch, site, tmp_path, "kept.pdf", recheck=True),
+                              job(fetch, site, tmp_path, "optional.pdf", retry=False)], bank="bank")
+    assert fetch.load_retry_queue("bank") == {}
+
+
+def test_retry_fetches_only_what_is_due(fetch, session, site, tmp_path):
+    session.headers["Referer"] = site.url("/reports")
+    for name in ("due.pdf", "later.pdf", "spent.pdf"):
+        fetch.fetch_all(session, [job(fetch, site, tmp_path, name)], bank="bank")
+        site.add(f"/{name}", pdf(1))
+    queue = fetch.load_retry_queue("bank")
+    now = fetch.time.time()
+    for key, entry in queue.items():
+        name = os.path.basename(key)
+        entry["next_at"] = now + 3600 if name == "later.pdf" else now - 1
+        entry["attempts"] = fetch.RETRY_MAX_ATTEMPTS if name == "spent.pdf" else 1
+    fetch.save_retry_queue("bank", queue)
+
+    assert fetch.retry(["bank"]) == 0
+    assert [os.path.basename(p) for p in fetch.load_retry_queue("bank")] == ["later.pdf", "spent.pdf"]
+    assert sorted(os.listdir(tmp_path / "raw_data" / "bank")) == ["due.pdf"]
+    assert site.seen("GET", "/due.pdf")[-1][2]["Referer"] == site.url("/reports")
+
+    assert fetch.retry(force=True) == 0
+    assert fetch.load_retry_queue("bank") == {}
+    assert sorted(os.listdir(tmp_path / "raw_data" / "bank")) == ["due.pdf", "later.pdf", "spent.pdf"]
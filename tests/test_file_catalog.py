@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def catalog(downloaders):
+    return downloaders("file_catalog")
+
+
+def put(tmp_path, rel, data=b"x"):
+    path = tmp_path / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def touch_dir(path, seconds=10):
+    """Move a folder's mtime on, as the next listing change would (some filesystems are coarse)."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 10**9))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    put(tmp_path, "raw_data/abb_bank/2024_Q1/balance_sheet_2024_Q1.pdf")
+    put(tmp_path, "raw_data/abb_bank/2024_Q1/balance_sheet_2024_Q1.xlsx")
+    put(tmp_path, "raw_data/abb_bank/income_statement_2024_Q2.pdf.part")
+    put(tmp_path, "raw_data/bank_of_baku/bank_of_baku_cash_flow_2023_12m.xlsx")
+    put(tmp_path, "processed_data/abb_bank/2024_Q1/balance_sheet_2024_Q1.xlsx")
+    (tmp_path / "processed_data" / "abb_bank" / "2024_Q2").mkdir()
+    return tmp_path
+
+
+def count_scans(catalog, monkeypatch):
+    scanned, real = [], os.scandir
+    def scandir(path):
+        scanned.append(os.path.relpath(path, catalog.REPO_ROOT).replace(os.sep, "/"))
+        return real(path)
+    monkeypatch.setattr(catalog.os, "scandir", scandir)
+    return scanned
+
+
+def test_describe(catalog):
+    row = catalog.describe("raw_data/bank_of_baku/2024_Q1/bank_of_baku_balance_sheet_2024_Q1.xlsx")
+    assert {k: row[k] for k in ("root", "bank", "folder", "period", "report_type", "ext")} == {
+        "root": "raw_data", "bank": "bank_of_baku", "folder": "2024_Q1", "period": "2024_Q1",
+        "report_type": "balance_sheet", "ext": ".xlsx"}
+    assert catalog.describe("raw_data/xalq_bank/report.pdf")["period"] is None
+
+
+def test_sync_indexes_the_tree(catalog, tree):
+    catalog.sync()
+    assert catalog.exists("abb_bank", root="raw_data", period="2024_Q1", report_type="balance_sheet", ext=".pdf")
+    assert not catalog.exists("abb_bank", report_type="income_statement")    # .part: still downloading
+    assert catalog.report_types("bank_of_baku") == {"2023_12m": {"cash_flow"}}
+    assert catalog.folder_counts("abb_bank", "raw_data") == ({"2024_Q1": (1, 1)}, True, [])
+    assert catalog.folder_counts("abb_bank", "processed_data") == ({"2024_Q1": (0, 1), "2024_Q2": (0, 0)}, True, [])
+
+
+def test_sync_only_lists_folders_that_changed(catalog, tree, monkeypatch):
+    catalog.sync()
+    scanned = count_scans(catalog, monkeypatch)
+    catalog.sync()
+    assert scanned == []
+
+    put(tree, "raw_data/abb_bank/2024_Q1/income_statement_2024_Q1.pdf")
+    touch_dir(tree / "raw_data" / "abb_bank" / "2024_Q1")
+    catalog.sync()
+    assert scanned == ["raw_data/abb_bank/2024_Q1"]
+    assert catalog.exists("abb_bank", report_type="income_statement", period="2024_Q1")
+
+    scanned.clear()
+    os.remove(tree / "raw_data" / "abb_bank" / "2024_Q1" / "balance_sheet_2024_Q1.pdf")
+    touch_dir(tree / "raw_data" / "abb_bank" / "2024_Q1")
+    catalog.sync(["abb_bank"])
+    assert scanned == ["raw_data/abb_bank/2024_Q1"]
+    assert not catalog.exists("abb_bank", root="raw_data", ext=".pdf", report_type="balance_sheet")
+
+
+def test_removed_folder_drops_its_files(catalog, tree):
+    catalog.sync()
+    for name in os.listdir(tree / "raw_data" / "bank_of_baku"):
+        os.remove(tree / "raw_data" / "bank_of_baku" / name)
+    os.rmdir(tree / "raw_data" / "bank_of_baku")
+    catalog.sync(["bank_of_baku"])
+    assert catalog.report_types("bank_of_baku") == {}
+    assert catalog.connect().execute("SELECT COUNT(*) FROM dirs WHERE path LIKE '%bank_of_baku%'").fetchone()[0] == 0
+
+
+def test_full_sync_sees_files_edited_in_place(catalog, tree):
+    catalog.sync()
+    path = tree / "raw_data" / "abb_bank" / "2024_Q1" / "balance_sheet_2024_Q1.xlsx"
+    mtime = os.stat(path.parent).st_mtime_ns
+    path.write_bytes(b"restated")
+    os.utime(path.parent, ns=(mtime, mtime))     # the listing itself didn't change
+    size = "SELECT size FROM files WHERE path='raw_data/abb_bank/2024_Q1/balance_sheet_2024_Q1.xlsx'"
+    catalog.sync()
+    assert catalog.connect().execute(size).fetchone()[0] == 1
+    catalog.sync(full=True)
+    assert catalog.connect().execute(size).fetchone()[0] == len(b"restated")
+
+
+def test_update_adds_and_removes_rows(catalog, tmp_path):
+    path = put(tmp_path, "raw_data/xalq_bank/2024_Q3/balance_sheet_2024_Q3.pdf")
+    catalog.update([str(path), str(tmp_path / "elsewhere" / "note.txt")], sha256={str(path): "known"})
+    rows = catalog.connect().execute("SELECT bank, period, sha256 FROM files").fetchall()
+    assert rows == [("xalq_bank", "2024_Q3", "known")]
+    os.remove(path)
+    catalog.update([str(path)])
+    assert not catalog.exists("xalq_bank")
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+import requests
+
+
+@pytest.fixture
+def http_client(downloaders, monkeypatch):
+    module = downloaders("http_client")
+    monkeypatch.setattr(module, "BACKOFF", 0)
+    return module
+
+
+def test_retries_transient_errors(http_client, site):
+    site.add("/r.pdf", b"%PDF", fail=[503, 502])
+    resp = http_client.new_session(retries=3, rate=0).get(site.url("/r.pdf"))
+    assert (resp.status_code, resp.content) == (200, b"%PDF")
+    assert len(site.seen("GET")) == 3
+
+
+def test_gives_up_with_the_last_response(http_client, site):
+    site.add("/r.pdf", b"%PDF", fail=[503] * 5)
+    assert http_client.new_session(retries=2, rate=0).get(site.url("/r.pdf")).status_code == 503
+    assert len(site.seen("GET")) == 3
+    assert http_client.new_session(retries=2, rate=0).get(site.url("/missing.pdf")).status_code == 404
+    assert len(site.seen("GET", "/missing.pdf")) == 1
+
+
+def test_session_headers(http_client, site):
+    site.add("/", b"<html></html>")
+    http_client.new_session(referer="https://bank.az/reports", rate=0).get(site.url("/"))
+    headers = site.requests[-1][2]
+    assert headers["User-Agent"] == http_client.USER_AGENT
+    assert headers["Accept-Encoding"] == http_client.ACCEPT_ENCODING
+    assert headers["Referer"] == "https://bank.az/reports"
+
+
+def test_requests_to_one_host_are_spaced_out(http_client, site):
+    site.add("/", b"ok")
+    session = http_client.new_session(rate=20)
+    t0 = time.perf_counter()
+    for _ in range(4):
+        session.get(site.url("/"))
+    assert time.perf_counter() - t0 >= 3 / 20 * 0.9
+    limiter = http_client.HostRateLimit(20)
+    limiter.wait("https://a.az/x")
+    t0 = time.perf_counter()
+    limiter.wait("https://b.az/x")   # another host: no wait
+    assert time.perf_counter() - t0 < 0.04
+
+
+def test_default_timeout_applies_when_none_is_passed(http_client, site):
+    site.add("/", b"ok")
+    site.delay = 0.5
+    session = http_client.new_session(retries=0, rate=0, timeout=(2, 0.1))
+    with pytest.raises(requests.exceptions.RequestException):
+        session.get(site.url("/"))
+    assert session.get(site.url("/"), timeout=2).content == b"ok"
+
+
+class Tab:
+    def get_cookies(self):
+        return [{"name": "session", "value": "abc", "domain": "127.0.0.1", "path": "/"},
+                {"name": "lang", "value": "az-Ə", "domain": "127.0.0.1", "path": "/"}]
+
+
+def test_browser_cookies_are_sent(http_client, site):
+    site.add("/", b"ok")
+    session = http_client.import_browser_cookies(http_client.new_session(rate=0), Tab())
+    session.get(site.url("/"))
+    assert sorted(site.requests[-1][2]["Cookie"].split("; ")) == ["lang=az-", "session=abc"]